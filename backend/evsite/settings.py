@@ -113,6 +113,16 @@ else:
         }
     }
 
+# Cache
+# https://docs.djangoproject.com/en/dev/topics/cache/
+# e.g. CACHE_URL=filecache:///var/tmp/evsite_cache or rediscache://redis:6379/1. Cached responses are keyed
+# by the version stamps kept in the database, so any backend stays correct; a shared one lets gunicorn
+# workers, cron jobs and commands reuse each other's bodies. The Docker images default to a file cache.
+
+CACHES = {
+    'default': env.cache("CACHE_URL", default="locmemcache://"),
+}
+
 AUTH_USER_MODEL = "user.User"
 API_HEADER = "api-auth"
 
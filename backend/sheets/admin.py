@@ -4,7 +4,8 @@ from django.db.models.functions import Coalesce
 
 from .models import Manufacturer, Team, Tank, UpgradePath, TeamTank, Match, TeamMatch, default_upgrade_kits, \
     MatchResult, Substitute, TankLost, TeamResult, TeamLog, TankBox, TeamBox, ImportTank, ImportCriteria, Booster, \
-    UpgradeTree, Interchange, InterchangeGroup, Alliance, Bounty, BountyTier, MatchRewardRates
+    UpgradeTree, Interchange, InterchangeGroup, Alliance, Bounty, BountyTier, MatchRewardRates, \
+    WeeklyQuota, LedgerEntry
 
 
 class ManufacturerAdmin(admin.ModelAdmin):
@@ -197,6 +198,20 @@ class MatchRewardRateAdmin(admin.ModelAdmin):
     list_display = ('even_split_kill_reward', "even_split_repair_cost", 'money_rule_kill_reward', 'money_rule_repair_cost', 'no_rule_kill_reward', 'no_rule_repair_cost')
 
 
+class WeeklyQuotaAdmin(admin.ModelAdmin):
+    list_display = ('team', 'week', 'kind', 'count')
+    list_filter = ('kind', 'week')
+    search_fields = ('team__name',)
+    raw_id_fields = ('team',)
+
+
+class LedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ('team', 'timestamp', 'reason', 'amount', 'score', 'balance_after', 'score_after')
+    list_filter = ('reason',)
+    search_fields = ('team__name',)
+    raw_id_fields = ('team', 'match', 'tank', 'box')
+
+
 admin.site.register(Booster, BoosterAdmin)
 admin.site.register(MatchResult, MatchResultAdmin)
 admin.site.register(Manufacturer, ManufacturerAdmin)
@@ -218,4 +233,5 @@ admin.site.register(Alliance, AllianceAdmin)
 admin.site.register(Bounty, BountyAdmin)
 admin.site.register(BountyTier, BountyTierAdmin)
 admin.site.register(MatchRewardRates, MatchRewardRateAdmin)
-
+admin.site.register(WeeklyQuota, WeeklyQuotaAdmin)
+admin.site.register(LedgerEntry, LedgerEntryAdmin)
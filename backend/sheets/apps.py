@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class SheetsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'sheets'
\ No newline at end of file
+    name = 'sheets'
+
+    def ready(self):
+        from . import signals
@@ -0,0 +1,50 @@
+from .versioning import VersionedSnapshot
+
+
+class ManufacturerIndex:
+    """
+    Team and tank manufacturer sets held as integer bitsets, one bit per manufacturer.
+
+    A tank is native for a team when the two bitsets intersect.
+    """
+
+    def __init__(self, team_links, tank_links):
+        self.bits = {}
+        self.team_bits = self._collect(team_links)
+        self.tank_bits = self._collect(tank_links)
+        self._native_tank_ids = {}
+
+    def _collect(self, links):
+        bitsets = {}
+        for owner_id, manufacturer_id in links:
+            bit = self.bits.setdefault(manufacturer_id, 1 << len(self.bits))
+            bitsets[owner_id] = bitsets.get(owner_id, 0) | bit
+        return bitsets
+
+    def is_native(self, team_id, tank_id):
+        return bool(self.team_bits.get(team_id, 0) & self.tank_bits.get(tank_id, 0))
+
+    def native_tank_ids(self, team_id):
+        native = self._native_tank_ids.get(team_id)
+        if native is None:
+            team_bits = self.team_bits.get(team_id, 0)
+            native = frozenset(tank_id for tank_id, tank_bits in self.tank_bits.items() if tank_bits & team_bits)
+            self._native_tank_ids[team_id] = native
+        return native
+
+
+def _build_manufacturer_index():
+    from .models import Team, Tank
+
+    team_links = Team.manufacturers.through.objects.values_list('team_id', 'manufacturer_id')
+    tank_links = Tank.manufacturers.through.objects.values_list('tank_id', 'manufacturer_id')
+    return ManufacturerIndex(team_links, tank_links)
+
+
+manufacturer_index = VersionedSnapshot(
+    ('sheets.team_manufacturers', 'sheets.tank_manufacturers'), _build_manufacturer_index
+)
+
+
+def get_manufacturer_index():
+    return manufacturer_index.get()
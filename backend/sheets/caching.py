@@ -0,0 +1,68 @@
+import hashlib
+
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+from .versioning import get_versions
+
+RESPONSE_KEY = 'sheets:response:{}'
+
+
+class ConditionalGetMixin:
+    """Answer GETs with an ETag from the stored versions of ``cache_models``, and 304 before building."""
+    cache_models = ()
+    cache_headers = ()
+
+    def get_cache_models(self, request):
+        return self.cache_models
+
+    def response_tag(self, request):
+        parts = [request.get_full_path(), request.accepted_renderer.format]
+        parts += [request.headers.get(header, '') for header in self.cache_headers]
+        parts += map(str, get_versions(*self.get_cache_models(request)))
+        return hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method == 'GET':
+            handler = self.get
+            # looked up from the instance by APIView.dispatch, after authentication and permission checks
+            self.get = lambda request, *args, **kwargs: self.versioned_get(handler, request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
+
+    def versioned_get(self, handler, request, *args, **kwargs):
+        # the versions are read before building, so a write made meanwhile leaves the body under an old tag
+        tag = self.response_tag(request)
+        etag = f'"{tag}"'
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            response = self.build_response(tag, handler, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        # browsers keep the body but check the tag on every poll
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    def build_response(self, tag, handler, request, *args, **kwargs):
+        return handler(request, *args, **kwargs)
+
+
+class CachedResponseMixin(ConditionalGetMixin):
+    """ConditionalGetMixin that also caches the rendered JSON of 200 responses under their tag."""
+    cache_timeout = 60 * 60 * 24
+
+    def build_response(self, tag, handler, request, *args, **kwargs):
+        key = RESPONSE_KEY.format(tag)
+        content = cache.get(key)
+        if content is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            content = JSONRenderer().render(response.data)
+            cache.set(key, content, self.cache_timeout)
+        return HttpResponse(content, content_type='application/json')
@@ -1,7 +1,9 @@
 import pytz
 import datetime
+import threading
 from .models import TeamMatch, TeamTank, Match, Substitute, MatchResult, Team
 from django.conf import settings
+from django.db import connection, transaction
 
 
 def discord_message_url(channel_id, message_id):
@@ -325,6 +327,68 @@ def format_match_calc_message(match, rewards_summary):
 
 import requests
 
+def send_calc_notification(match, rewards):
+    if match.webhook_id_calc:
+        edit_calc_notification(match, rewards)
+    else:
+        post_calc_notification(match, rewards)
+
+
+def post_calc_notification(match, rewards):
+    if not settings.DISCORD_WEBHOOK_URL_CALC:
+        return
+    webhook_url = settings.DISCORD_WEBHOOK_URL_CALC + '?wait=true'
+
+    message = format_match_calc_message(match, rewards)
+
+    try:
+        response = requests.post(webhook_url, json={"content": message})
+        response_data = response.json()
+        match.webhook_id_calc = response_data.get("id")
+        match.channel_id_calc = response_data.get("channel_id")
+        match.save()
+
+    except Exception as e:
+        print(f"Error sending Discord webhook: {e}")
+
+
+def edit_calc_notification(match, rewards):
+    webhook_url = settings.DISCORD_WEBHOOK_URL_CALC
+    if not webhook_url or not match.webhook_id_calc:
+        return
+
+    message_url = f"{webhook_url}/messages/{match.webhook_id_calc}"
+    message = format_match_calc_message(match, rewards)
+
+    try:
+        response = requests.patch(message_url, json={"content": message})
+        if response.status_code not in [200, 204]:
+            print(f"Error editing Discord webhook: {response.status_code} - {response.text}")
+    except Exception as e:
+        print(f"Error editing Discord webhook: {e}")
+
+
+def queue_calc_notifications(notifications):
+    """
+    Send calc messages for (match, rewards) pairs one after another on a background thread, once the
+    current transaction commits. Returns the thread so short-lived callers can wait for it.
+    """
+    thread = threading.Thread(target=_send_calc_notifications, args=(list(notifications),), daemon=True)
+    transaction.on_commit(thread.start)
+    return thread
+
+
+def _send_calc_notifications(notifications):
+    try:
+        for match, rewards in notifications:
+            try:
+                send_calc_notification(match, rewards)
+            except Exception as e:
+                print(f"Error sending Discord webhook: {e}")
+    finally:
+        connection.close()
+
+
 def send_transaction_log(team_name, action_type, details, amount, new_balance):
     webhook_url = getattr(settings, 'DISCORD_WEBHOOK_URL_TRANSACTIONS', None)
     print(team_name, action_type, details, amount, new_balance, flush=True)
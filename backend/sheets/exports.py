@@ -0,0 +1,108 @@
+import csv
+import json
+from itertools import chain
+
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+
+from .teamlogs import unpack
+
+CHUNK_SIZE = 2000
+
+TEAM_LOG_FIELDS = [
+    'id', 'timestamp', 'team', 'user', 'method_name', 'field_name', 'match_id', 'description',
+    'changes', 'reward_delta', 'previous_value', 'new_value',
+]
+
+MATCH_FIELDS = [
+    'id', 'datetime', 'mode', 'gamemode', 'best_of_number', 'map_selection', 'money_rules', 'was_played',
+    'is_bounty', 'team_1', 'team_2', 'winning_side', 'round_score', 'judge', 'is_calced', 'tanks_lost',
+]
+
+
+class Echo:
+    """csv.writer target that hands each row back instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def team_log_rows(queryset):
+    for log in queryset.select_related('team').order_by('id').iterator(chunk_size=CHUNK_SIZE):
+        previous_value, new_value = log.previous_value, log.new_value
+        if previous_value is None and log.archive is not None:
+            previous_value, new_value = unpack(log.archive)
+        yield {
+            'id': log.id,
+            'timestamp': log.timestamp.isoformat(),
+            'team': log.team.name,
+            'user': log.user,
+            'method_name': log.method_name,
+            'field_name': log.field_name,
+            'match_id': log.match_id,
+            'description': log.description,
+            'changes': log.changes,
+            'reward_delta': log.reward_delta,
+            'previous_value': previous_value,
+            'new_value': new_value,
+        }
+
+
+def match_rows(queryset):
+    from .models import TeamMatch, TankLost
+
+    # prefetches are fetched per chunk, so memory follows the chunk size and not the season
+    matches = queryset.select_related('match_result__judge').prefetch_related(
+        Prefetch('teammatch_set', queryset=TeamMatch.objects.select_related('team').order_by('id')),
+        Prefetch('match_result__tanks_lost', queryset=TankLost.objects.select_related('team', 'tank').order_by('id')),
+    ).order_by('datetime', 'id')
+
+    for match in matches.iterator(chunk_size=CHUNK_SIZE):
+        sides = {'team_1': [], 'team_2': []}
+        for team_match in match.teammatch_set.all():
+            sides.setdefault(team_match.side, []).append(team_match.team.name)
+        result = getattr(match, 'match_result', None)
+        yield {
+            'id': match.id,
+            'datetime': match.datetime.isoformat(),
+            'mode': match.mode,
+            'gamemode': match.gamemode,
+            'best_of_number': match.best_of_number,
+            'map_selection': match.map_selection,
+            'money_rules': match.money_rules,
+            'was_played': match.was_played,
+            'is_bounty': match.is_bounty,
+            'team_1': sides['team_1'],
+            'team_2': sides['team_2'],
+            'winning_side': result.winning_side if result else None,
+            'round_score': result.round_score if result else None,
+            'judge': result.judge.name if result and result.judge else None,
+            'is_calced': result.is_calced if result else None,
+            'tanks_lost': [
+                {'team': lost.team.name, 'tank': lost.tank.name, 'quantity': lost.quantity}
+                for lost in result.tanks_lost.all()
+            ] if result else [],
+        }
+
+
+def csv_value(value):
+    if isinstance(value, list) and all(isinstance(item, str) for item in value):
+        return ' / '.join(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def stream_rows(rows, fields, output, filename):
+    """A streaming CSV or NDJSON download of ``rows``, written one row at a time."""
+    if output == 'ndjson':
+        content = (json.dumps(row) + '\n' for row in rows)
+        response = StreamingHttpResponse(content, content_type='application/x-ndjson')
+    else:
+        writer = csv.writer(Echo())
+        header = writer.writerow(fields)
+        content = (writer.writerow([csv_value(row[field]) for field in fields]) for row in rows)
+        response = StreamingHttpResponse(chain([header], content), content_type='text/csv')
+        output = 'csv'
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{output}"'
+    return response
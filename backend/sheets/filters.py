@@ -44,6 +44,7 @@ class TeamLogFilter(filters.FilterSet):
     )
     from_date = filters.DateTimeFilter(field_name="timestamp", lookup_expr="gte")
     to_date = filters.DateTimeFilter(field_name="timestamp", lookup_expr="lte")
+    team = filters.NumberFilter(field_name="team_id")
 
 
 class MatchFilter(filters.FilterSet):
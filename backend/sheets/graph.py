@@ -0,0 +1,397 @@
+import heapq
+
+from .versioning import VersionedSnapshot
+
+
+KIT_WEIGHTS = {
+    'T1': 1,
+    'T2': 2,
+    'T3': 4
+}
+
+KIT_INDEX = {tier: index for index, tier in enumerate(KIT_WEIGHTS)}
+
+
+def empty_kits():
+    return {
+        'T1': 0,
+        'T2': 0,
+        'T3': 0
+    }
+
+
+def total_kit_weight(required_kits):
+    total_kits = 0
+
+    for kit_type, count in required_kits.items():
+        total_kits += KIT_WEIGHTS[kit_type] * count
+
+    return total_kits
+
+
+def _kit_tuple_weight(kits):
+    return sum(weight * count for weight, count in zip(KIT_WEIGHTS.values(), kits))
+
+
+def _weakly_dominates(cost_a, kits_a, cost_b, kits_b):
+    return cost_a <= cost_b and all(a <= b for a, b in zip(kits_a, kits_b))
+
+
+def manufacturer_upgrade_cost(from_price, to_price):
+    if to_price >= from_price:
+        return abs(to_price - from_price)
+    return abs(to_price - from_price) / 2
+
+
+def apply_auction_factor(paths, auction_factor):
+    if not auction_factor:
+        return paths
+
+    adjusted = []
+    for path in paths:
+        path = dict(path)
+        path['total_cost'] -= auction_factor
+        if path['manu_cost'] is not None:
+            path['manu_cost'] -= auction_factor
+        adjusted.append(path)
+    return adjusted
+
+
+class UpgradeGraph:
+    """
+    Immutable snapshot of the Tank/UpgradePath graph.
+
+    Tanks are addressed by their position in `ids`; the outgoing edges of node `i` are
+    `offsets[i]:offsets[i + 1]` in the edge arrays.
+    """
+
+    def __init__(self, tanks, paths):
+        self.ids = []
+        self.names = []
+        self.prices = []
+        self.ranks = []
+        self.battle_ratings = []
+        self.index = {}
+
+        for tank_id, name, price, rank, battle_rating in tanks:
+            self.index[tank_id] = len(self.ids)
+            self.ids.append(tank_id)
+            self.names.append(name)
+            self.prices.append(price)
+            self.ranks.append(rank)
+            self.battle_ratings.append(battle_rating)
+
+        outgoing = [[] for _ in self.ids]
+        for path_id, from_tank_id, to_tank_id, cost, kit_tier in paths:
+            outgoing[self.index[from_tank_id]].append((self.index[to_tank_id], cost, kit_tier, path_id))
+
+        self.offsets = [0]
+        self.targets = []
+        self.costs = []
+        self.kit_tiers = []
+        self.path_ids = []
+        for edges in outgoing:
+            for target, cost, kit_tier, path_id in edges:
+                self.targets.append(target)
+                self.costs.append(cost)
+                self.kit_tiers.append(kit_tier)
+                self.path_ids.append(path_id)
+            self.offsets.append(len(self.targets))
+
+    def edges(self, node):
+        return range(self.offsets[node], self.offsets[node + 1])
+
+    def direct_upgrades(self, from_tank_id, kit_discount, native_tank_ids, auction_factor=0):
+        start = self.index.get(from_tank_id)
+        if start is None:
+            return []
+
+        direct_upgrades = []
+        for edge in self.edges(start):
+            target = self.targets[edge]
+            base_cost = self.costs[edge]
+
+            required_kit_tier = self.kit_tiers[edge]
+            discount = kit_discount(required_kit_tier) if required_kit_tier else 0
+
+            effective_cost = max(base_cost - discount, 0)
+
+            required_kits = empty_kits()
+            if required_kit_tier:
+                required_kits[required_kit_tier] += 1
+
+            direct_upgrades.append({
+                'from_tank': self.names[start],
+                'to_tank': self.names[target],
+                'manu_cost': base_cost - auction_factor,
+                'kit_discount': discount,
+                'required_kit_tier': required_kit_tier,
+                'total_cost': effective_cost - auction_factor,
+                'available_in_manufacturer': self.ids[target] in native_tank_ids,
+                'required_kits': required_kits,
+                'to_tank_br': self.battle_ratings[target],
+            })
+
+        return direct_upgrades
+
+    def possible_upgrades(self, from_tank_id, kit_discount, native_tank_ids, auction_factor=0, minimize_kits=True):
+        start = self.index.get(from_tank_id)
+        if start is None:
+            return []
+
+        from_price = self.prices[start]
+        best_upgrade_paths = {}
+        priority_queue = [(0, 0, from_tank_id, empty_kits())]
+
+        while priority_queue:
+            kits, current_cost, current_tank_id, accumulated_kits = heapq.heappop(priority_queue)
+            current = self.index[current_tank_id]
+
+            for edge in self.edges(current):
+                target = self.targets[edge]
+                to_tank_id = self.ids[target]
+                base_cost = self.costs[edge]
+
+                required_kit_tier = self.kit_tiers[edge]
+                discount = kit_discount(required_kit_tier) if required_kit_tier else 0
+
+                total_cost = current_cost + max(base_cost - discount, 0)
+
+                new_required_kits = accumulated_kits.copy()
+                if required_kit_tier:
+                    new_required_kits[required_kit_tier] += 1
+
+                update_path = False
+                if to_tank_id != from_tank_id:
+                    best = best_upgrade_paths.get(to_tank_id)
+                    if best is None:
+                        update_path = True
+                    elif minimize_kits:
+                        update_path = total_kit_weight(new_required_kits) < total_kit_weight(best['required_kits'])
+                    else:
+                        update_path = (total_cost - auction_factor) < best['total_cost']
+
+                if update_path:
+                    available_in_manufacturer = to_tank_id in native_tank_ids
+                    manu_cost = None
+                    if available_in_manufacturer:
+                        manu_cost = manufacturer_upgrade_cost(from_price, self.prices[target]) - auction_factor
+
+                    best_upgrade_paths[to_tank_id] = {
+                        'from_tank': self.names[current],
+                        'to_tank': self.names[target],
+                        'base_cost': base_cost,
+                        'kit_discount': discount,
+                        'required_kit_tier': required_kit_tier,
+                        'total_cost': total_cost - auction_factor,
+                        'available_in_manufacturer': available_in_manufacturer,
+                        'manu_cost': manu_cost,
+                        'required_kits': new_required_kits,
+                        'to_tank_br': self.battle_ratings[target],
+                    }
+
+                    heapq.heappush(priority_queue, (
+                        total_kit_weight(new_required_kits), total_cost, to_tank_id, new_required_kits
+                    ))
+
+        from_name = self.names[start]
+        return [path for path in best_upgrade_paths.values() if path['to_tank'] != from_name]
+
+    def pareto_upgrades(self, from_tank_id, kit_discount, native_tank_ids, auction_factor=0):
+        """
+        Every non-dominated (money, T1, T2, T3) way of reaching each tank, found in a single
+        multi-objective label-correcting pass.
+        """
+        start = self.index.get(from_tank_id)
+        if start is None:
+            return []
+
+        # Labels are stored column-wise; a label is a partial path ending at `label_node`.
+        label_node = [start]
+        label_cost = [0]
+        label_kits = [(0, 0, 0)]
+        label_parent = [None]
+        label_edge = [None]
+        alive = [True]
+        frontier = {start: [0]}
+        queue = [(0, 0, 0)]
+
+        while queue:
+            _, _, label = heapq.heappop(queue)
+            if not alive[label]:
+                continue
+
+            node = label_node[label]
+            for edge in self.edges(node):
+                target = self.targets[edge]
+                if target == start:
+                    continue
+
+                required_kit_tier = self.kit_tiers[edge]
+                discount = kit_discount(required_kit_tier) if required_kit_tier else 0
+
+                cost = label_cost[label] + max(self.costs[edge] - discount, 0)
+                kits = label_kits[label]
+                if required_kit_tier:
+                    kits = list(kits)
+                    kits[KIT_INDEX[required_kit_tier]] += 1
+                    kits = tuple(kits)
+
+                existing = frontier.setdefault(target, [])
+                if any(_weakly_dominates(label_cost[other], label_kits[other], cost, kits) for other in existing):
+                    continue
+
+                for other in existing:
+                    if _weakly_dominates(cost, kits, label_cost[other], label_kits[other]):
+                        alive[other] = False
+                existing[:] = [other for other in existing if alive[other]]
+
+                new_label = len(label_node)
+                label_node.append(target)
+                label_cost.append(cost)
+                label_kits.append(kits)
+                label_parent.append(label)
+                label_edge.append(edge)
+                alive.append(True)
+                existing.append(new_label)
+
+                heapq.heappush(queue, (cost, _kit_tuple_weight(kits), new_label))
+
+        from_price = self.prices[start]
+        results = []
+        for target, labels in frontier.items():
+            if target == start or not labels:
+                continue
+
+            available_in_manufacturer = self.ids[target] in native_tank_ids
+            manu_cost = None
+            if available_in_manufacturer:
+                manu_cost = manufacturer_upgrade_cost(from_price, self.prices[target]) - auction_factor
+
+            options = []
+            for label in sorted(labels, key=lambda l: (label_cost[l], _kit_tuple_weight(label_kits[l]))):
+                hops = []
+                current = label
+                while label_edge[current] is not None:
+                    edge = label_edge[current]
+                    required_kit_tier = self.kit_tiers[edge]
+                    hops.append({
+                        'from_tank': self.names[label_node[label_parent[current]]],
+                        'to_tank': self.names[label_node[current]],
+                        'base_cost': self.costs[edge],
+                        'kit_discount': kit_discount(required_kit_tier) if required_kit_tier else 0,
+                        'required_kit_tier': required_kit_tier,
+                    })
+                    current = label_parent[current]
+                hops.reverse()
+
+                options.append({
+                    'total_cost': label_cost[label] - auction_factor,
+                    'required_kits': dict(zip(KIT_WEIGHTS, label_kits[label])),
+                    'hops': hops,
+                })
+
+            results.append({
+                'to_tank': self.names[target],
+                'to_tank_br': self.battle_ratings[target],
+                'available_in_manufacturer': available_in_manufacturer,
+                'manu_cost': manu_cost,
+                'options': options,
+            })
+
+        return results
+
+
+def _build_upgrade_graph():
+    from .models import Tank, UpgradePath
+
+    tanks = Tank.objects.order_by('id').values_list('id', 'name', 'price', 'rank', 'battle_rating')
+    paths = UpgradePath.objects.order_by('from_tank_id', 'id').values_list(
+        'id', 'from_tank_id', 'to_tank_id', 'cost', 'required_kit_tier'
+    )
+    return UpgradeGraph(tanks, paths)
+
+
+upgrade_graph = VersionedSnapshot(('sheets.tank', 'sheets.upgradepath'), _build_upgrade_graph)
+
+
+def get_upgrade_graph():
+    return upgrade_graph.get()
+
+
+class InterchangeIndex:
+    """
+    Connected components of the Interchange graph, found with union-find.
+
+    Each component is identified by its lowest tank id and keeps its edges already in
+    InterchangeSerializer form.
+    """
+
+    def __init__(self, edges):
+        parent = {}
+
+        def find(tank_id):
+            parent.setdefault(tank_id, tank_id)
+            while parent[tank_id] != tank_id:
+                parent[tank_id] = parent[parent[tank_id]]
+                tank_id = parent[tank_id]
+            return tank_id
+
+        def union(a, b):
+            root_a, root_b = find(a), find(b)
+            if root_a != root_b:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+
+        self.tank_ids = {}
+        for _, from_tank_id, from_tank_name, to_tank_id, to_tank_name, _ in edges:
+            self.tank_ids[from_tank_name] = from_tank_id
+            self.tank_ids[to_tank_name] = to_tank_id
+            union(from_tank_id, to_tank_id)
+
+        self.component_of = {tank_id: find(tank_id) for tank_id in parent}
+        self.tank_names = {}
+        self.edges = {}
+        self.edge_list = []
+        for _, from_tank_id, from_tank_name, to_tank_id, to_tank_name, is_bidirectional in edges:
+            edge = {
+                'from_tank': from_tank_name,
+                'to_tank': to_tank_name,
+                'is_bidirectional': is_bidirectional,
+            }
+            self.edges.setdefault(self.component_of[from_tank_id], []).append(edge)
+            self.edge_list.append(edge)
+        for name, tank_id in self.tank_ids.items():
+            self.tank_names.setdefault(self.component_of[tank_id], []).append(name)
+
+    def component(self, tank_name):
+        tank_id = self.tank_ids.get(tank_name)
+        return self.component_of.get(tank_id)
+
+    def component_edges(self, tank_name):
+        return self.edges.get(self.component(tank_name), [])
+
+    def groups(self):
+        return [
+            {
+                'component': component,
+                'tanks': self.tank_names[component],
+                'edges': self.edges[component],
+            }
+            for component in sorted(self.edges)
+        ]
+
+
+def _build_interchange_index():
+    from .models import Interchange
+
+    edges = Interchange.objects.order_by('id').values_list(
+        'id', 'from_tank_id', 'from_tank__name', 'to_tank_id', 'to_tank__name', 'is_bidirectional'
+    )
+    return InterchangeIndex(list(edges))
+
+
+interchange_index = VersionedSnapshot(('sheets.tank', 'sheets.interchange'), _build_interchange_index)
+
+
+def get_interchange_index():
+    return interchange_index.get()
@@ -0,0 +1,78 @@
+from django.db.models import Sum
+
+REWARD_REASONS = {
+    'calc_rewards': 'match_reward',
+    'sub_rewards': 'substitute_reward',
+    'judge_rewards': 'judge_reward',
+    'judge_and_sub_rewards': 'judge_reward',
+}
+
+
+def record(team, reason, amount=0, score=0, kits=None, **references):
+    """Append an entry for a change already written to ``team``, whose balance and score are current."""
+    from .models import LedgerEntry
+
+    return LedgerEntry.objects.create(
+        team_id=team.pk, reason=reason, amount=amount, score=score, kits=kits or {},
+        balance_after=team.balance, score_after=team.score, **references
+    )
+
+
+def record_batch(entries):
+    """
+    Append unsaved entries for changes already written in bulk, in the order they happened.
+
+    The running balance and score of each entry are worked back from the teams' stored values.
+    """
+    from .models import Team, LedgerEntry
+
+    if not entries:
+        return
+    current = {
+        team_id: [balance, score] for team_id, balance, score in Team.objects.filter(
+            pk__in={entry.team_id for entry in entries}
+        ).values_list('id', 'balance', 'score')
+    }
+    for entry in reversed(entries):
+        entry.balance_after, entry.score_after = current[entry.team_id]
+        current[entry.team_id][0] -= entry.amount
+        current[entry.team_id][1] -= entry.score
+    LedgerEntry.objects.bulk_create(entries, batch_size=500)
+
+
+def reconcile(team, reason):
+    """Record whatever a plain save moved the balance or score by since the team's last entry."""
+    from .models import LedgerEntry
+
+    last = LedgerEntry.objects.filter(team_id=team.pk).order_by('-id').values_list(
+        'balance_after', 'score_after'
+    ).first() or (0, 0)
+    amount, score = team.balance - last[0], team.score - last[1]
+    if amount or score:
+        record(team, reason, amount=amount, score=score)
+
+
+def balance_at(team, when):
+    """The team's balance right after the last entry at or before ``when``."""
+    from .models import LedgerEntry
+
+    return LedgerEntry.objects.filter(team_id=getattr(team, 'pk', team), timestamp__lte=when).order_by(
+        '-timestamp', '-id'
+    ).values_list('balance_after', flat=True).first() or 0
+
+
+def totals_by_reason(team, start=None, end=None):
+    """Money and score moved per reason, optionally limited to ``start <= timestamp < end``."""
+    from .models import LedgerEntry
+
+    entries = LedgerEntry.objects.filter(team_id=getattr(team, 'pk', team))
+    if start is not None:
+        entries = entries.filter(timestamp__gte=start)
+    if end is not None:
+        entries = entries.filter(timestamp__lt=end)
+    return {
+        reason: {'amount': amount, 'score': score}
+        for reason, amount, score in entries.order_by().values('reason').annotate(
+            amount=Sum('amount'), score=Sum('score')
+        ).values_list('reason', 'amount', 'score')
+    }
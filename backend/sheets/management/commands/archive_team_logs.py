@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from ...teamlogs import archive_logs
+
+
+class Command(BaseCommand):
+    help = 'Compress the previous/new values of old team logs into their archive column'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=180, help='Archive logs older than this many days')
+
+    def handle(self, *args, **kwargs):
+        report = archive_logs(now() - timedelta(days=kwargs['days']))
+
+        if not report['rows']:
+            self.stdout.write(self.style.WARNING('No team logs to archive.'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {report['rows']} team logs: {report['bytes_before'] / 1024:.1f} kB of payload is now "
+            f"{report['bytes_after'] / 1024:.1f} kB, "
+            f"{(report['bytes_before'] - report['bytes_after']) / 1024:.1f} kB reclaimed."
+        ))
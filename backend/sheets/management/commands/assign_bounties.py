@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.db import transaction
 from ...models import Team, Bounty, BountyTier
+from ...versioning import invalidate
 
 
 class Command(BaseCommand):
@@ -9,6 +10,7 @@ class Command(BaseCommand):
     def handle(self, *args, **kwargs):
         with transaction.atomic():
             Bounty.objects.filter(is_active=True).update(is_active=False)
+            invalidate(Bounty)
 
             top_teams = Team.objects.order_by('-total_money_earned')[:4]
 
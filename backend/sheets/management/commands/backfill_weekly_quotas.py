@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ...quotas import rebuild_weekly_quotas
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the weekly quota counters from the match history and the transfer logs'
+
+    def handle(self, *args, **kwargs):
+        start = time.perf_counter()
+        written = rebuild_weekly_quotas()
+
+        for kind, count in written.items():
+            self.stdout.write(f" - {kind}: {count} counters")
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {sum(written.values())} weekly counters in {(time.perf_counter() - start) * 1000:.2f} ms"
+        ))
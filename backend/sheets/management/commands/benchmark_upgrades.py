@@ -0,0 +1,75 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ...graph import get_upgrade_graph
+from ...models import TeamTank
+
+
+class Command(BaseCommand):
+    help = 'Compare the two-call cheapest/fewest-kits upgrade search with the single-pass Pareto frontier'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--team', type=str, help='Only benchmark tanks owned by this team')
+        parser.add_argument('--limit', type=int, default=None, help='Maximum number of garage tanks to search from')
+        parser.add_argument('--repeat', type=int, default=3, help='Number of timed rounds')
+
+    def handle(self, *args, **kwargs):
+        team_tanks = TeamTank.objects.filter(is_upgradable=True).select_related('tank', 'team').order_by('id')
+        if kwargs['team']:
+            team_tanks = team_tanks.filter(team__name=kwargs['team'])
+        team_tanks = list(team_tanks[:kwargs['limit']] if kwargs['limit'] else team_tanks)
+
+        if not team_tanks:
+            self.stdout.write(self.style.WARNING('No upgradable tanks found.'))
+            return
+
+        graph = get_upgrade_graph()
+        self.stdout.write(f"Graph: {len(graph.ids)} tanks, {len(graph.targets)} upgrade paths")
+
+        native_ids = {}
+        for team_tank in team_tanks:
+            if team_tank.team_id not in native_ids:
+                native_ids[team_tank.team_id] = team_tank.team.native_tank_ids()
+
+        def two_calls():
+            for team_tank in team_tanks:
+                team = team_tank.team
+                for minimize_kits in (True, False):
+                    graph.possible_upgrades(
+                        team_tank.tank_id, team.get_upgrade_kit_discount, native_ids[team.id], 0, minimize_kits
+                    )
+
+        def frontier():
+            return sum(
+                sum(len(target['options']) for target in graph.pareto_upgrades(
+                    team_tank.tank_id, team_tank.team.get_upgrade_kit_discount, native_ids[team_tank.team_id]
+                ))
+                for team_tank in team_tanks
+            )
+
+        two_call_times = []
+        frontier_times = []
+        options = 0
+        for _ in range(kwargs['repeat']):
+            start = time.perf_counter()
+            two_calls()
+            two_call_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            options = frontier()
+            frontier_times.append(time.perf_counter() - start)
+
+        two_call_best = min(two_call_times)
+        frontier_best = min(frontier_times)
+
+        self.stdout.write(f"Searched from {len(team_tanks)} garage tanks, best of {kwargs['repeat']} rounds")
+        self.stdout.write(
+            f" - two calls (fewest kits + cheapest): {two_call_best * 1000:.1f} ms "
+            f"({two_call_best / len(team_tanks) * 1000:.3f} ms/tank)"
+        )
+        self.stdout.write(
+            f" - pareto frontier (one pass): {frontier_best * 1000:.1f} ms "
+            f"({frontier_best / len(team_tanks) * 1000:.3f} ms/tank, {options / len(team_tanks):.1f} options/tank)"
+        )
+        self.stdout.write(self.style.SUCCESS('Done.'))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from ...discord import queue_calc_notifications
+from ...rewards import calculate_pending_rewards
+
+
+class Command(BaseCommand):
+    help = 'Calculate rewards for every uncalculated match result, oldest match first, in one batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=str, default='calc_pending_matches', help='Name recorded on the team logs')
+        parser.add_argument('--no-discord', action='store_true', help='Do not post the calc messages to Discord')
+
+    def handle(self, *args, **kwargs):
+        report = calculate_pending_rewards(kwargs['user'])
+        notifications = report.pop('notifications')
+
+        if not report['results']:
+            self.stdout.write(self.style.WARNING('No pending match results.'))
+            return
+
+        for result in report['results']:
+            line = f"Match {result['match_id']} ({result['match_datetime']:%Y-%m-%d %H:%M}): {result['duration_ms']} ms"
+            if result['error']:
+                self.stdout.write(self.style.ERROR(f"{line} - failed, {result['error']}"))
+            else:
+                self.stdout.write(line)
+
+        seconds = report['total_ms'] / 1000
+        self.stdout.write(
+            f"Load {report['load_ms']} ms, compute {report['compute_ms']} ms, apply {report['apply_ms']} ms"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Calculated {report['calculated']} of {len(report['results'])} results in {report['total_ms']} ms "
+            f"({report['calculated'] / seconds if seconds else 0:.1f} matches/s)"
+        ))
+
+        if not kwargs['no_discord'] and notifications:
+            self.stdout.write(f"Sending {len(notifications)} Discord calc messages...")
+            thread = queue_calc_notifications(notifications)
+            if thread.is_alive():
+                thread.join()
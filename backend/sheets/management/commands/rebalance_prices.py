@@ -0,0 +1,35 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...pricing import rebalance_prices
+
+
+class Command(BaseCommand):
+    help = 'Apply a price sheet to all tanks and recompute upgrade path costs and box prices'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', type=str, help='CSV file with "Tank Name" and "Cost" columns')
+
+    def handle(self, *args, **kwargs):
+        csv_file = kwargs['csv_file']
+
+        prices = {}
+        with open(csv_file, newline='') as file:
+            reader = csv.DictReader(file)
+
+            for row in reader:
+                if row['Tank Name']:
+                    prices[row['Tank Name']] = int(row['Cost'])
+
+        try:
+            report = rebalance_prices(prices)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f"Tanks in sheet: {report['tanks_in_sheet']}, repriced: {report['tanks_updated']}\n"
+            f"Upgrade paths updated: {report['upgrade_paths_updated']}\n"
+            f"Boxes updated: {report['boxes_updated']}"
+        )
+        self.stdout.write(self.style.SUCCESS(f"Rebalanced prices in {report['duration_ms']} ms"))
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-18 08:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sheets', '0046_bountytier_match_is_bounty_bounty'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatchRewardRates',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('even_split_kill_reward', models.FloatField(default=0.0)),
+                ('even_split_repair_cost', models.FloatField(default=0.0)),
+                ('money_rule_kill_reward', models.FloatField(default=0.0)),
+                ('money_rule_repair_cost', models.FloatField(default=0.0)),
+                ('no_rule_kill_reward', models.FloatField(default=0.0)),
+                ('no_rule_repair_cost', models.FloatField(default=0.0)),
+            ],
+            options={
+                'verbose_name': 'Match Reward Rate',
+                'verbose_name_plural': 'Match Reward Rates',
+            },
+        ),
+        migrations.AddField(
+            model_name='matchresult',
+            name='judge_is_test',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.1.2 on 2026-10-18 08:29
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+MATCH_ID = re.compile(r'Match ID: (\d+)')
+REWARD_METHODS = {'calc_rewards', 'sub_rewards', 'judge_rewards', 'judge_and_sub_rewards'}
+
+
+def reward_delta(previous_value, new_value):
+    previous_kits = previous_value.get('upgrade_kits', {})
+    new_kits = new_value.get('upgrade_kits', {})
+    kits = {
+        tier: new_kits.get(tier, {}).get('quantity', 0) - data.get('quantity', 0)
+        for tier, data in previous_kits.items()
+    }
+    booster = previous_value.get('booster') if new_value.get('booster') else None
+
+    return {
+        'balance': new_value['balance'] - previous_value['balance'],
+        'score': new_value.get('score', 0) - previous_value.get('score', 0),
+        'kits': {tier: difference for tier, difference in kits.items() if difference},
+        'booster': booster,
+    }
+
+
+def backfill_match_references(apps, schema_editor):
+    TeamLog = apps.get_model('sheets', 'TeamLog')
+    Match = apps.get_model('sheets', 'Match')
+
+    match_ids = set(Match.objects.values_list('id', flat=True))
+    batch = []
+    for log in TeamLog.objects.filter(description__contains='Match ID: ').only(
+        'id', 'description', 'method_name', 'previous_value', 'new_value'
+    ).iterator(chunk_size=2000):
+        found = MATCH_ID.search(log.description)
+        if not found or int(found.group(1)) not in match_ids:
+            continue
+
+        log.match_id = int(found.group(1))
+        if (
+                log.method_name in REWARD_METHODS and
+                isinstance(log.previous_value, dict) and isinstance(log.new_value, dict) and
+                'balance' in log.previous_value and 'balance' in log.new_value
+        ):
+            log.reward_delta = reward_delta(log.previous_value, log.new_value)
+        batch.append(log)
+
+        if len(batch) >= 2000:
+            TeamLog.objects.bulk_update(batch, ['match', 'reward_delta'])
+            batch = []
+
+    TeamLog.objects.bulk_update(batch, ['match', 'reward_delta'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sheets', '0047_matchrewardrates_matchresult_judge_is_test'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teamlog',
+            name='match',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='team_logs', to='sheets.match'),
+        ),
+        migrations.AddField(
+            model_name='teamlog',
+            name='reward_delta',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_match_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.1.2 on 2026-10-18 08:47
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils.timezone import localtime
+
+
+def week_start(value):
+    value = localtime(value).date()
+    return value - timedelta(days=value.weekday())
+
+
+def backfill_weekly_quotas(apps, schema_editor):
+    WeeklyQuota = apps.get_model('sheets', 'WeeklyQuota')
+    TeamMatch = apps.get_model('sheets', 'TeamMatch')
+    TeamLog = apps.get_model('sheets', 'TeamLog')
+
+    counts = {}
+    for team_id, match_datetime, mode, gamemode, was_played in TeamMatch.objects.values_list(
+        'team_id', 'match__datetime', 'match__mode', 'match__gamemode', 'match__was_played'
+    ).iterator(chunk_size=2000):
+        week = week_start(match_datetime)
+        counts[team_id, week, 'matches'] = counts.get((team_id, week, 'matches'), 0) + 1
+        if was_played and (mode == 'traditional' or gamemode == 'domination'):
+            counts[team_id, week, 'trad_dom'] = counts.get((team_id, week, 'trad_dom'), 0) + 1
+
+    for team_id, field_name, timestamp, previous_value, new_value in TeamLog.objects.filter(
+        method_name='money_transfer_out'
+    ).values_list('team_id', 'field_name', 'timestamp', 'previous_value', 'new_value').iterator(chunk_size=2000):
+        week = week_start(timestamp)
+        if field_name == 'upgrade_kits':
+            key, amount = (team_id, week, 'alliance_kits'), previous_value.get('quantity', 0) - new_value.get('quantity', 0)
+        else:
+            key, amount = (team_id, week, 'money_transfers'), 1
+        counts[key] = counts.get(key, 0) + amount
+
+    WeeklyQuota.objects.bulk_create(
+        [WeeklyQuota(team_id=team_id, week=week, kind=kind, count=count)
+         for (team_id, week, kind), count in counts.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sheets', '0048_teamlog_match_reward_delta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklyQuota',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week', models.DateField(help_text='Monday of the week the counter covers.')),
+                ('kind', models.CharField(choices=[('matches', 'Matches'), ('trad_dom', 'Traditional/Domination Matches'), ('money_transfers', 'Money Transfers'), ('alliance_kits', 'Alliance Kits Sent')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_quotas', to='sheets.team')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('team', 'week', 'kind'), name='unique_weekly_quota')],
+            },
+        ),
+        migrations.RunPython(backfill_weekly_quotas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 08:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sheets', '0049_weeklyquota'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='team',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Bumped by every write that replaces stored values instead of adding to them.'),
+        ),
+    ]
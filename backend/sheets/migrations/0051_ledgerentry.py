@@ -0,0 +1,49 @@
+# Generated by Django 5.1.2 on 2026-10-18 09:06
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def open_ledgers(apps, schema_editor):
+    """Start every team's ledger from the balance and score it has at migration time."""
+    Team = apps.get_model('sheets', 'Team')
+    LedgerEntry = apps.get_model('sheets', 'LedgerEntry')
+
+    LedgerEntry.objects.bulk_create(
+        [LedgerEntry(team_id=team_id, reason='opening', amount=balance, score=score,
+                     balance_after=balance, score_after=score)
+         for team_id, balance, score in Team.objects.values_list('id', 'balance', 'score').iterator(chunk_size=2000)],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sheets', '0050_team_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('reason', models.CharField(choices=[('opening', 'Opening Balance'), ('adjustment', 'Manual Adjustment'), ('match_reward', 'Match Reward'), ('substitute_reward', 'Substitute Reward'), ('judge_reward', 'Judge Reward'), ('reward_revert', 'Reward Reverted'), ('tank_purchase', 'Tank Purchase'), ('tank_sale', 'Tank Sale'), ('tank_upgrade', 'Tank Upgrade'), ('box_purchase', 'Box Purchase'), ('import_purchase', 'Import Purchase'), ('transfer_out', 'Money Sent'), ('transfer_in', 'Money Received'), ('kit_transfer_out', 'Kits Sent'), ('kit_transfer_in', 'Kits Received'), ('kit_exchange', 'Kit Split/Merge'), ('kit_grant', 'Kits Granted')], max_length=20)),
+                ('amount', models.IntegerField(default=0)),
+                ('score', models.IntegerField(default=0)),
+                ('kits', models.JSONField(blank=True, default=dict)),
+                ('balance_after', models.IntegerField()),
+                ('score_after', models.IntegerField()),
+                ('box', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='sheets.tankbox')),
+                ('match', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='sheets.match')),
+                ('tank', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='sheets.tank')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='sheets.team')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['team', 'timestamp'], name='ledger_team_time'), models.Index(fields=['team', 'reason', 'timestamp'], name='ledger_team_reason_time')],
+            },
+        ),
+        migrations.RunPython(open_ledgers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,134 @@
+# Generated by Django 5.1.2 on 2026-10-18 09:21
+
+import json
+import zlib
+from collections import Counter
+
+from django.db import migrations, models
+
+MONEY_FIELDS = ('balance', 'score', 'total_money_earned', 'total_money_spent')
+
+
+def size(value):
+    if value is None:
+        return 0
+    return len(value.encode()) if isinstance(value, str) else len(json.dumps(value, separators=(',', ':')))
+
+
+def tank_lines(description):
+    tanks = {'added': [], 'removed': []}
+    for line in description.splitlines():
+        for prefix, key in (('Added Tanks: ', 'added'), ('Removed Tanks: ', 'removed')):
+            if line.startswith(prefix):
+                tanks[key] = [name.strip() for name in line[len(prefix):].split(',') if name.strip()]
+    return tanks
+
+
+def state_changes(previous, new, description, tank_ids):
+    if isinstance(previous, str):
+        previous = json.loads(previous)
+    if isinstance(new, str):
+        new = json.loads(new)
+
+    changes = {
+        field: new[field] - previous[field]
+        for field in MONEY_FIELDS if field in previous and field in new and new[field] != previous[field]
+    }
+
+    new_kits = new.get('upgrade_kits', {})
+    kits = {
+        tier: new_kits.get(tier, {}).get('quantity', 0) - data.get('quantity', 0)
+        for tier, data in previous.get('upgrade_kits', {}).items()
+    }
+    if any(kits.values()):
+        changes['kits'] = {tier: difference for tier, difference in kits.items() if difference}
+
+    if 'tanks' in previous and 'tanks' in new:
+        before, after = Counter(previous['tanks']), Counter(new['tanks'])
+        names = {'added': list((after - before).elements()), 'removed': list((before - after).elements())}
+    else:
+        names = tank_lines(description)
+    tanks = {key: [tank_ids.get(name, name) for name in value] for key, value in names.items() if value}
+    if tanks:
+        changes['tanks'] = tanks
+
+    return changes
+
+
+def compact_team_method_logs(apps, schema_editor):
+    """
+    Replace the full before/after team states of team method logs with their differences, keeping the
+    original payload compressed in the archive column.
+    """
+    TeamLog = apps.get_model('sheets', 'TeamLog')
+    Tank = apps.get_model('sheets', 'Tank')
+
+    tank_ids = dict(Tank.objects.order_by('-id').values_list('name', 'id'))
+    ids = list(TeamLog.objects.filter(
+        field_name='multiple_fields', previous_value__isnull=False, changes__isnull=True
+    ).order_by('id').values_list('id', flat=True))
+
+    rows = bytes_before = bytes_after = 0
+    for start in range(0, len(ids), 500):
+        batch = list(TeamLog.objects.filter(id__in=ids[start:start + 500]).only(
+            'id', 'previous_value', 'new_value', 'description'
+        ))
+        for log in batch:
+            bytes_before += size(log.previous_value) + size(log.new_value)
+            log.changes = state_changes(log.previous_value, log.new_value, log.description, tank_ids)
+            log.archive = zlib.compress(
+                json.dumps([log.previous_value, log.new_value], separators=(',', ':')).encode(), 9
+            )
+            bytes_after += size(log.changes) + len(log.archive)
+        TeamLog.objects.bulk_update(batch, ['changes', 'archive'])
+        TeamLog.objects.filter(id__in=[log.id for log in batch]).update(previous_value=None, new_value=None)
+        rows += len(batch)
+
+    if rows:
+        print(
+            f"\n  Compacted {rows} team method logs: {bytes_before / 1024:.1f} kB of payload is now "
+            f"{bytes_after / 1024:.1f} kB, {(bytes_before - bytes_after) / 1024:.1f} kB reclaimed "
+            f"(VACUUM the table to hand the space back to the filesystem)."
+        )
+
+
+def restore_payloads(apps, schema_editor):
+    TeamLog = apps.get_model('sheets', 'TeamLog')
+
+    archived = list(TeamLog.objects.filter(archive__isnull=False).only('id', 'archive'))
+    for log in archived:
+        log.previous_value, log.new_value = json.loads(zlib.decompress(bytes(log.archive)))
+    TeamLog.objects.bulk_update(archived, ['previous_value', 'new_value'], batch_size=500)
+    TeamLog.objects.filter(previous_value__isnull=True).update(previous_value={})
+    TeamLog.objects.filter(new_value__isnull=True).update(new_value={})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sheets', '0051_ledgerentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teamlog',
+            name='archive',
+            field=models.BinaryField(blank=True, help_text='Compressed previous/new values of an archived log.', null=True),
+        ),
+        migrations.AddField(
+            model_name='teamlog',
+            name='changes',
+            field=models.JSONField(blank=True, help_text='Money deltas, kit differences and added/removed tank ids of a team method.', null=True),
+        ),
+        migrations.AlterField(
+            model_name='teamlog',
+            name='new_value',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='teamlog',
+            name='previous_value',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.RunPython(compact_team_method_logs, restore_payloads),
+    ]
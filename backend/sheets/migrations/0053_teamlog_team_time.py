@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-18 09:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sheets', '0052_teamlog_changes_archive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='teamlog',
+            index=models.Index(fields=['team', '-timestamp', '-id'], name='teamlog_team_time'),
+        ),
+    ]
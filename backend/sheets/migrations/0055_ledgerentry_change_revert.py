@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sheets', '0054_modelversion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='reason',
+            field=models.CharField(choices=[('opening', 'Opening Balance'), ('adjustment', 'Manual Adjustment'), ('match_reward', 'Match Reward'), ('substitute_reward', 'Substitute Reward'), ('judge_reward', 'Judge Reward'), ('reward_revert', 'Reward Reverted'), ('change_revert', 'Change Reverted'), ('tank_purchase', 'Tank Purchase'), ('tank_sale', 'Tank Sale'), ('tank_upgrade', 'Tank Upgrade'), ('box_purchase', 'Box Purchase'), ('import_purchase', 'Import Purchase'), ('transfer_out', 'Money Sent'), ('transfer_in', 'Money Received'), ('kit_transfer_out', 'Kits Sent'), ('kit_transfer_in', 'Kits Received'), ('kit_exchange', 'Kit Split/Merge'), ('kit_grant', 'Kits Granted')], max_length=20),
+        ),
+    ]
@@ -1,35 +1,99 @@
 import json
+import math
 import re
 from datetime import timedelta
 import random
 
 from django.db import models, transaction
-from django.db.models import F, Q, Count
+from django.db.models import F
+from django.db.models.expressions import RawSQL
 from django.utils.timezone import now
 from rest_framework.exceptions import ValidationError
-import heapq
 from functools import wraps
-from django.forms.models import model_to_dict
 import copy
-from collections import Counter, deque
-
-ROUND_POINTS = {
-    "1:0": 4,
-    "0:0": 3,
-    "0:1": 2,
-    "2:0": 7,
-    "2:1": 6,
-    "1:1": 5,
-    "1:2": 4,
-    "0:2": 3,
-    "3:0": 10,
-    "3:1": 9,
-    "3:2": 8,
-    "2:2": 7,
-    "2:3": 6,
-    "1:3": 5,
-    "0:3": 4
-}
+from collections import Counter
+
+from .availability import get_manufacturer_index
+from .graph import get_upgrade_graph, total_kit_weight, apply_auction_factor
+from .versioning import invalidate
+from .pricing import upgrade_cost, box_price, recalculate_costs
+from .quotas import consume as consume_quota, used as quota_used, match_quota_key, move_match, \
+    MONEY_TRANSFERS_PER_WEEK, ALLIANCE_KITS_PER_WEEK
+from .teamlogs import unpack as unpack_log, deferred_logs, queue_log
+from .ledger import record as record_ledger, record_batch as record_ledger_batch, reconcile as reconcile_ledger
+from .rewards import weighted_average_rank, base_rewards, load_reward_inputs, compute_rewards, apply_rewards, \
+    preview_rewards
+
+
+class TeamChanges:
+    """What a logged Team method changed, reported by the writes it makes instead of by diffing the team."""
+    FIELDS = ('balance', 'score', 'total_money_earned', 'total_money_spent')
+
+    def __init__(self):
+        self.previous = {}
+        self.new = {}
+        self.previous_kits = {}
+        self.new_kits = {}
+        self.added_tanks = Counter()
+        self.removed_tanks = Counter()
+
+    def record_fields(self, previous, new):
+        for field, value in previous.items():
+            self.previous.setdefault(field, value)
+        self.new.update(new)
+
+    def record_kits(self, previous, new):
+        for tier, quantity in previous.items():
+            self.previous_kits.setdefault(tier, quantity)
+        self.new_kits.update(new)
+
+    def record_tanks(self, added=(), removed=()):
+        self.added_tanks.update(added)
+        self.removed_tanks.update(removed)
+
+    def changes(self):
+        changes = {}
+
+        upgrade_kit_changes = [
+            {'tier': tier, 'diff': self.new_kits[tier] - quantity}
+            for tier, quantity in sorted(self.previous_kits.items()) if self.new_kits[tier] != quantity
+        ]
+        if upgrade_kit_changes:
+            changes['upgrade_kits'] = upgrade_kit_changes
+
+        added_tanks = self.added_tanks - self.removed_tanks
+        removed_tanks = self.removed_tanks - self.added_tanks
+        if added_tanks or removed_tanks:
+            changes['tanks'] = {
+                'added': [tank.name for tank in added_tanks.elements()],
+                'removed': [tank.name for tank in removed_tanks.elements()]
+            }
+
+        for field in self.FIELDS:
+            if field in self.previous and self.previous[field] != self.new[field]:
+                changes[field] = {
+                    'from': self.previous[field],
+                    'to': self.new[field]
+                }
+
+        return changes
+
+    def delta(self):
+        """The same changes in the compact form stored on the log."""
+        delta = {field: change['to'] - change['from'] for field, change in self.changes().items()
+                 if field in self.FIELDS}
+        kits = {tier: self.new_kits[tier] - quantity for tier, quantity in self.previous_kits.items()
+                if self.new_kits[tier] != quantity}
+        if kits:
+            delta['kits'] = kits
+        tanks = {
+            key: [tank.pk for tank in counter.elements()]
+            for key, counter in (('added', self.added_tanks - self.removed_tanks),
+                                 ('removed', self.removed_tanks - self.added_tanks)) if counter
+        }
+        if tanks:
+            delta['tanks'] = tanks
+        return delta
 
 
 def log_team_changes(method=None, custom_method_name=None):
@@ -42,64 +106,29 @@ def log_team_changes(method=None, custom_method_name=None):
         if user is None:
             raise ValueError("User must be provided as a keyword argument to the decorated method.")
 
-        initial_state = model_to_dict(self)
-
-        initial_upgrade_kits = copy.deepcopy(self.upgrade_kits)
-        initial_state['upgrade_kits'] = initial_upgrade_kits
-        initial_state['manufacturers'] = [str(m) for m in self.manufacturers.all()]
-        initial_state['tanks'] = [str(t) for t in self.tanks.all()]
-
-        initial_tanks = [tank.name for tank in self.tanks.all()]
-
-        result = method(self, *args, **kwargs)
-
-        final_state = model_to_dict(self)
-
-        final_upgrade_kits = copy.deepcopy(self.upgrade_kits)
-        final_state['upgrade_kits'] = final_upgrade_kits
-        final_state['manufacturers'] = [str(m) for m in self.manufacturers.all()]
-        final_state['tanks'] = [str(t) for t in self.tanks.all()]
-
-        final_tanks = [tank.name for tank in self.tanks.all()]
-
-        changes = {}
-
-        for field, initial_value in initial_state.items():
-            final_value = final_state.get(field)
-            if initial_value != final_value:
-                changes[field] = {
-                    'from': initial_value,
-                    'to': final_value
-                }
-
-        upgrade_kit_changes = compare_upgrade_kits(initial_upgrade_kits, final_upgrade_kits)
-        if upgrade_kit_changes:
-            changes['upgrade_kits'] = upgrade_kit_changes
-
-        initial_counter = Counter(initial_tanks)
-        final_counter = Counter(final_tanks)
-
-        added_tanks = final_counter - initial_counter
-        removed_tanks = initial_counter - final_counter
-
-        if added_tanks or removed_tanks:
-            changes['tanks'] = {
-                'added': list(added_tanks.elements()),
-                'removed': list(removed_tanks.elements())
-            }
-
-        if changes:
-            readable_changes = parse_changes(changes)
-            method_name = custom_method_name if custom_method_name else method.__name__
-            TeamLog.objects.create(
-                team=self,
-                user=user,
-                field_name='multiple_fields',
-                previous_value=json.dumps(initial_state),
-                new_value=json.dumps(final_state),
-                description=f"Changes made by method: {method_name}\n{readable_changes}",
-                method_name=method_name
-            )
+        tracker = TeamChanges()
+        trackers = self.__dict__.setdefault('_change_trackers', [])
+        trackers.append(tracker)
+        try:
+            with deferred_logs():
+                result = method(self, *args, **kwargs)
+
+                changes = tracker.changes()
+                if changes:
+                    readable_changes = parse_changes(changes)
+                    method_name = custom_method_name if custom_method_name else method.__name__
+                    queue_log(
+                        team=self,
+                        user=user,
+                        field_name='multiple_fields',
+                        previous_value=None,
+                        new_value=None,
+                        changes=tracker.delta(),
+                        description=f"Changes made by method: {method_name}\n{readable_changes}",
+                        method_name=method_name
+                    )
+        finally:
+            trackers.remove(tracker)
 
         return result
 
@@ -174,6 +203,13 @@ class Alliance(models.Model):
         return self.name
 
 
+class StaleTeamError(ValidationError):
+    """A team's kits changed between being read and being written back."""
+
+    def __init__(self, team_name):
+        super().__init__(f"{team_name} was changed by another request, please try again.")
+
+
 class Team(models.Model):
 
     UPGRADE_KITS = default_upgrade_kits()
@@ -191,10 +227,139 @@ class Team(models.Model):
     total_money_spent = models.IntegerField(default=0)
     discord_role_id = models.CharField(max_length=255, null=True, blank=True)
     alliance = models.ForeignKey(Alliance, related_name='teams', on_delete=models.SET_NULL, null=True, blank=True)
+    version = models.PositiveIntegerField(
+        default=0, editable=False, help_text="Bumped by every write that replaces stored values instead of adding to them."
+    )
+
+    MONEY_DELTA_FIELDS = {
+        'balance': 'balance', 'score': 'score', 'earned': 'total_money_earned', 'spent': 'total_money_spent',
+    }
+    ADJUSTED_FIELDS = ('balance', 'score', 'total_money_earned', 'total_money_spent', 'upgrade_kits')
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_adjusted_fields()
+        return instance
+
+    def remember_adjusted_fields(self, fields=ADJUSTED_FIELDS):
+        self.__dict__.setdefault('_loaded_values', {}).update(
+            {field: copy.deepcopy(self.__dict__[field]) for field in fields if field in self.__dict__}
+        )
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                record_ledger(self, LedgerEntry.OPENING, amount=self.balance, score=self.score)
+            self.remember_adjusted_fields()
+            return
+
+        loaded = getattr(self, '_loaded_values', {})
+        fields = kwargs.get('update_fields')
+        if fields is None:
+            # money and kits this instance did not change are left to adjust()'s conditional updates
+            deferred = self.get_deferred_fields()
+            fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred
+                and not (field.name in loaded and getattr(self, field.name) == loaded[field.name])
+            ]
+        fields = set(fields)
+        kwargs['update_fields'] = fields | {'version'}
+
+        with transaction.atomic():
+            if 'upgrade_kits' in fields and Team.objects.select_for_update().filter(pk=self.pk).exclude(
+                version=self.version
+            ).exists():
+                raise StaleTeamError(self.name)
+            version, self.version = self.version, F('version') + 1
+            try:
+                super().save(*args, **kwargs)
+            except Exception:
+                self.version = version
+                raise
+            self.refresh_from_db(fields=['version', *(field for field in loaded if field not in fields)])
+            if fields & {'balance', 'score'}:
+                reconcile_ledger(self, LedgerEntry.ADJUSTMENT)
+        self.remember_adjusted_fields()
+
+    def adjust(self, reason, kits=None, match=None, tank=None, box=None, **deltas):
+        """Apply money and kit deltas in one conditional UPDATE; False if the balance can't cover a debit."""
+        # Whole units, truncated the same way saving the float total used to truncate it.
+        deltas = {self.MONEY_DELTA_FIELDS[name]: math.floor(delta) for name, delta in deltas.items() if delta}
+        values = {column: F(column) + delta for column, delta in deltas.items()}
+        kits = {tier: change for tier, change in (kits or {}).items() if change}
+
+        team = Team.objects.filter(pk=self.pk)
+        if deltas.get('balance', 0) < 0:
+            team = team.filter(balance__gte=-deltas['balance'])
+        if kits:
+            upgrade_kits = copy.deepcopy(self.upgrade_kits)
+            for tier, change in kits.items():
+                upgrade_kits.setdefault(tier, dict(self.UPGRADE_KITS[tier], quantity=0))
+                upgrade_kits[tier]['quantity'] = int(upgrade_kits[tier]['quantity']) + change
+            team = team.filter(version=self.version)
+            values.update(upgrade_kits=upgrade_kits, version=F('version') + 1)
+        elif not values:
+            return True
+
+        if not team.update(**values):
+            if kits and Team.objects.filter(pk=self.pk).exclude(version=self.version).exists():
+                raise StaleTeamError(self.name)
+            return False
+
+        invalidate(Team)
+        refreshed = ['balance', 'score', 'total_money_earned', 'total_money_spent'] + (['upgrade_kits'] if kits else [])
+        self.refresh_from_db(fields=refreshed + ['version'])
+        self.remember_adjusted_fields(refreshed)
+        record_ledger(
+            self, reason, amount=deltas.get('balance', 0), score=deltas.get('score', 0), kits=kits,
+            match=match, tank=tank, box=box,
+        )
+        for tracker in self.__dict__.get('_change_trackers', ()):
+            tracker.record_fields(
+                {column: getattr(self, column) - delta for column, delta in deltas.items()},
+                {column: getattr(self, column) for column in deltas},
+            )
+            quantities = {tier: int(self.upgrade_kits[tier]['quantity']) for tier in kits}
+            tracker.record_kits(
+                {tier: quantity - kits[tier] for tier, quantity in quantities.items()}, quantities
+            )
+        return True
+
+    def record_tank_changes(self, added=(), removed=()):
+        """Tell the logged methods running on this instance which Tanks they added or removed."""
+        for tracker in self.__dict__.get('_change_trackers', ()):
+            tracker.record_tanks(added, removed)
+
+    def reward_state(self):
+        return {
+            'name': self.name, 'balance': self.balance, 'score': self.score,
+            'total_money_earned': self.total_money_earned, 'upgrade_kits': copy.deepcopy(self.upgrade_kits),
+            'version': self.version,
+        }
+
+    @classmethod
+    def write_changes(cls, changes):
+        """Write ``{team_id: (loaded, final)}`` pairs: money as deltas, kits guarded by the loaded version."""
+        money = []
+        for team_id, (loaded, final) in changes.items():
+            team = cls(id=team_id)
+            for column in ('balance', 'score', 'total_money_earned'):
+                setattr(team, column, F(column) + (int(final[column]) - int(loaded[column])))
+            money.append(team)
+
+            if final['upgrade_kits'] != loaded['upgrade_kits'] and not cls.objects.filter(
+                pk=team_id, version=loaded['version']
+            ).update(upgrade_kits=final['upgrade_kits'], version=F('version') + 1):
+                raise StaleTeamError(loaded['name'])
+
+        cls.objects.bulk_update(money, ['balance', 'score', 'total_money_earned'], batch_size=500)
+
     def check_tank_limit(self, tank):
         current_count = TeamTank.objects.filter(team=self, tank=tank).count()
         if current_count >= self.MAX_PER_TANK:
@@ -267,8 +432,7 @@ class Team(models.Model):
             if self.upgrade_kits[kit_type]['quantity'] < 2:
                 return False
 
-            self.upgrade_kits[kit_type]['quantity'] -= 2 * kit_amount
-            self.upgrade_kits[target_kit]['quantity'] += 1 * kit_amount
+            kits = {kit_type: -2 * kit_amount, target_kit: 1 * kit_amount}
 
         elif action == 'split':
             if kit_type == 'T3':
@@ -281,10 +445,10 @@ class Team(models.Model):
             if self.upgrade_kits[kit_type]['quantity'] < 1:
                 return False
 
-            self.upgrade_kits[kit_type]['quantity'] -= 1 * kit_amount
-            self.upgrade_kits[target_kit]['quantity'] += 2 * kit_amount
+            kits = {kit_type: -1 * kit_amount, target_kit: 2 * kit_amount}
 
-        self.save()
+        if not self.adjust(LedgerEntry.KIT_EXCHANGE, kits=kits):
+            raise ValidationError(f"{self.name}'s kits could not be exchanged, please try again.")
         return True
 
     def money_transfer(self, from_team, to_team, amount, user):
@@ -301,41 +465,33 @@ class Team(models.Model):
         method_name = 'money_transfer_out'
         opposite_method_name = 'money_transfer_in'
 
-        start_of_week = now() - timedelta(days=now().weekday())
-        recent_out_transfer = TeamLog.objects.filter(
-            team=from_team,
-            method_name=method_name,
-            timestamp__gte=start_of_week
-        ).exists()
-        if recent_out_transfer:
-            raise ValueError(f"{from_team.name} has already made a transfer out this week.")
-
-        from_team.balance -= amount
-        to_team.balance += taxxed_amount
-        from_team.total_money_spent += amount
+        with deferred_logs():
+            if not consume_quota(from_team, WeeklyQuota.MONEY_TRANSFERS, MONEY_TRANSFERS_PER_WEEK):
+                raise ValueError(f"{from_team.name} has already made a transfer out this week.")
 
-        from_team.save()
-        to_team.save()
+            if not from_team.adjust(LedgerEntry.TRANSFER_OUT, balance=-amount, spent=amount):
+                raise ValueError(f"{from_team.name} does not have enough balance for this transfer.")
+            to_team.adjust(LedgerEntry.TRANSFER_IN, balance=taxxed_amount)
 
-        TeamLog.objects.create(
-            team=from_team,
-            user=user,
-            field_name='balance',
-            previous_value={'balance': from_team.balance + amount},
-            new_value={'balance': from_team.balance},
-            description=f"Changes made by method: {method_name}\nMoney Transferred to {to_team.name}\nBalance Changed by: {-amount}",
-            method_name=method_name,
-        )
+            queue_log(
+                team=from_team,
+                user=user,
+                field_name='balance',
+                previous_value={'balance': from_team.balance + amount},
+                new_value={'balance': from_team.balance},
+                description=f"Changes made by method: {method_name}\nMoney Transferred to {to_team.name}\nBalance Changed by: {-amount}",
+                method_name=method_name,
+            )
 
-        TeamLog.objects.create(
-            team=to_team,
-            user=user,
-            field_name='balance',
-            previous_value={'balance': to_team.balance - taxxed_amount},
-            new_value={'balance': to_team.balance},
-            description=f"Changes made by method: {opposite_method_name}\nMoney received from {from_team.name}\nBalance Changed by: {taxxed_amount}",
-            method_name=opposite_method_name,
-        )
+            queue_log(
+                team=to_team,
+                user=user,
+                field_name='balance',
+                previous_value={'balance': to_team.balance - math.floor(taxxed_amount)},
+                new_value={'balance': to_team.balance},
+                description=f"Changes made by method: {opposite_method_name}\nMoney received from {from_team.name}\nBalance Changed by: {taxxed_amount}",
+                method_name=opposite_method_name,
+            )
 
     def transfer_alliance_kit(self, target_team, amount, user):
         try:
@@ -360,94 +516,58 @@ class Team(models.Model):
         if self == target_team:
             raise ValidationError("Cannot transfer kits to yourself.")
 
-        start_of_week = now() - timedelta(days=now().weekday())
+        with deferred_logs():
+            if not consume_quota(self, WeeklyQuota.ALLIANCE_KITS, ALLIANCE_KITS_PER_WEEK, amount):
+                kits_sent_this_week = quota_used(self, WeeklyQuota.ALLIANCE_KITS)
+                raise ValidationError(
+                    f"Weekly limit reached. You have sent {kits_sent_this_week}/2 T1 kits this week."
+                )
 
-        weekly_logs = TeamLog.objects.filter(
-            team=self,
-            method_name='alliance_kit_transfer',
-            timestamp__gte=start_of_week
-        )
+            target_current = int(target_team.upgrade_kits.get('T1', {}).get('quantity', 0))
 
-        kits_sent_this_week = 0
-        for log in weekly_logs:
-            try:
-                match = re.search(r'Transferred (\d+) T1', log.description)
-                if match:
-                    kits_sent_this_week += int(match.group(1))
-            except:
-                pass
+            self.adjust(LedgerEntry.KIT_TRANSFER_OUT, kits={'T1': -amount})
+            target_team.adjust(LedgerEntry.KIT_TRANSFER_IN, kits={'T1': amount})
 
-        if kits_sent_this_week + amount > 2:
-            raise ValidationError(
-                f"Weekly limit reached. You have sent {kits_sent_this_week}/2 T1 kits this week."
+            queue_log(
+                team=self,
+                user=user,
+                field_name='upgrade_kits',
+                previous_value={'quantity': current_quantity},
+                new_value={'quantity': self.upgrade_kits['T1']['quantity']},
+                description=f"Transferred {amount} T1 kits to {target_team.name} (Alliance)",
+                method_name='money_transfer_out'
             )
 
-        self.upgrade_kits['T1']['quantity'] = current_quantity - amount
-
-        if 'T1' not in target_team.upgrade_kits:
-            target_team.upgrade_kits['T1'] = {'quantity': 0, 'price': 25000}
-
-        target_current_str = target_team.upgrade_kits['T1'].get('quantity', 0)
-        target_current = int(target_current_str)
-        target_team.upgrade_kits['T1']['quantity'] = target_current + amount
-
-        self.save()
-        target_team.save()
-
-        TeamLog.objects.create(
-            team=self,
-            user=user,
-            field_name='upgrade_kits',
-            previous_value={'quantity': current_quantity},
-            new_value={'quantity': self.upgrade_kits['T1']['quantity']},
-            description=f"Transferred {amount} T1 kits to {target_team.name} (Alliance)",
-            method_name='money_transfer_out'
-        )
-
-        TeamLog.objects.create(
-            team=target_team,
-            user=user,
-            field_name='upgrade_kits',
-            previous_value={'quantity': target_current},
-            new_value={'quantity': target_team.upgrade_kits['T1']['quantity']},
-            description=f"Received {amount} T1 kits from {self.name} (Alliance)",
-            method_name='money_transfer_in'
-        )
+            queue_log(
+                team=target_team,
+                user=user,
+                field_name='upgrade_kits',
+                previous_value={'quantity': target_current},
+                new_value={'quantity': target_team.upgrade_kits['T1']['quantity']},
+                description=f"Received {amount} T1 kits from {self.name} (Alliance)",
+                method_name='money_transfer_in'
+            )
 
         return True
 
     def matches_for_week(self, date):
-        start_of_week = date - timedelta(days=date.weekday())
-        end_of_week = start_of_week + timedelta(days=6)
-
-        return Match.objects.filter(
-            teammatch__team=self,
-            datetime__date__gte=start_of_week,
-            datetime__date__lte=end_of_week
-        ).count()
+        return quota_used(self, WeeklyQuota.MATCHES, date)
 
     def trad_dom_matches_for_week(self, date):
-        start_of_week = date - timedelta(days=date.weekday())
-        end_of_week = start_of_week + timedelta(days=6)
-
-        return Match.objects.filter(
-            teammatch__team=self,
-            datetime__date__gte=start_of_week,
-            datetime__date__lte=end_of_week,
-            was_played=True,
-        ).filter(Q(mode="traditional") | Q(gamemode="domination")).count()
+        return quota_used(self, WeeklyQuota.TRAD_DOM, date)
 
     @log_team_changes
     def purchase_tank(self, tank, *, user):
         self.check_tank_limit(tank)
         if tank.price > self.balance:
             raise ValidationError("Insufficient balance to purchase this tank.")
-        if not self.manufacturers.filter(id__in=tank.manufacturers.all()).exists():
+        if not self.is_native(tank):
             raise ValidationError("This tank is not available from your manufacturers.")
-        self.balance -= tank.price
-        self.total_money_spent += tank.price
-        self.save()
-        TeamTank.objects.create(team=self, tank=tank)
+        with transaction.atomic():
+            if not self.adjust(LedgerEntry.TANK_PURCHASE, tank=tank, balance=-tank.price, spent=tank.price):
+                raise ValidationError("Insufficient balance to purchase this tank.")
+            TeamTank.objects.create(team=self, tank=tank)
+            self.record_tank_changes(added=[tank])
         return f"Tank {tank.name} purchased successfully. Remaining balance: {self.balance}"
 
     @log_team_changes
@@ -471,10 +591,10 @@ class Team(models.Model):
 
         tank_name = teamtank.tank.name
 
-        teamtank.delete()
-
-        self.balance += price * 0.6
-        self.save()
+        with transaction.atomic():
+            teamtank.delete()
+            self.adjust(LedgerEntry.TANK_SALE, tank=teamtank.tank, balance=price * 0.6)
+            self.record_tank_changes(removed=[teamtank.tank])
         return f"Tank {tank_name} sold successfully. New balance: {self.balance}"
 
     def sell_tank(self, tank, *, user):
@@ -510,8 +630,7 @@ class Team(models.Model):
     def add_upgrade_kit(self, tier, quantity=1, *, user,):
         if tier in self.UPGRADE_KITS:
             if tier in self.upgrade_kits:
-                self.upgrade_kits[tier]['quantity'] += quantity
-            self.save()
+                self.adjust(LedgerEntry.KIT_GRANT, kits={tier: quantity})
             return f"Added {quantity} Upgrade Kit(s) of tier {tier} to {self.name}."
         else:
             return "Invalid upgrade kit tier."
@@ -563,13 +682,13 @@ class Team(models.Model):
         if not upgrade_path:
             raise ValidationError(f"No valid upgrade path from {from_tank.name} to {to_tank.name}.")
 
-        if self.manufacturers.filter(id__in=to_tank.manufacturers.all()).exists():
+        is_native = self.is_native(to_tank)
+        if is_native:
             cost = upgrade_path['manu_cost']
         else:
             cost = upgrade_path['total_cost']
 
-        required_kits = upgrade_path['required_kits'] if not self.manufacturers.filter(
-            id__in=to_tank.manufacturers.all()).exists() else (
+        required_kits = upgrade_path['required_kits'] if not is_native else (
             {
                 'T1': 0, 'T2': 0, 'T3': 0
             })
@@ -591,15 +710,16 @@ class Team(models.Model):
         if total_cost > self.balance:
             raise ValidationError("Insufficient balance for this upgrade.")
 
-        self.balance -= total_cost
-
-        for tier, count in required_kits.items():
-            self.upgrade_kits[tier]['quantity'] -= count
-
-        self.tanks.through.objects.filter(team=self, id=tank.id, is_upgradable=True).delete()
-        self.tanks.through.objects.create(team=self, tank=to_tank)
+        with transaction.atomic():
+            if not self.adjust(
+                LedgerEntry.TANK_UPGRADE, tank=to_tank, balance=-total_cost,
+                kits={tier: -count for tier, count in required_kits.items()},
+            ):
+                raise ValidationError("Insufficient balance for this upgrade.")
 
-        self.save()
+            self.tanks.through.objects.filter(team=self, id=tank.id, is_upgradable=True).delete()
+            self.tanks.through.objects.create(team=self, tank=to_tank)
+            self.record_tank_changes(added=[to_tank], removed=[from_tank])
 
         return f"Tank {from_tank.name} upgraded to {to_tank.name}. Total cost: {total_cost}. Remaining balance: {self.balance}"
 
@@ -629,12 +749,13 @@ class Team(models.Model):
         if not upgrade_path:
             raise ValidationError(f"No valid upgrade path from {from_tank.name} to {to_tank.name}.")
 
-        if self.manufacturers.filter(id__in=to_tank.manufacturers.all()).exists():
+        is_native = self.is_native(to_tank)
+        if is_native:
             cost = upgrade_path['manu_cost']
         else:
             cost = upgrade_path['total_cost']
 
-        required_kits = upgrade_path['required_kits'] if not self.manufacturers.filter(id__in=to_tank.manufacturers.all()).exists() else (
+        required_kits = upgrade_path['required_kits'] if not is_native else (
         {
             'T1': 0,
             'T2': 0,
@@ -658,17 +779,24 @@ class Team(models.Model):
         if total_cost > self.balance:
             raise ValidationError("Insufficient balance for this upgrade.")
 
-        self.balance -= total_cost
+        with transaction.atomic():
+            if not self.adjust(
+                LedgerEntry.TANK_UPGRADE, tank=to_tank, balance=-total_cost,
+                kits={tier: -count for tier, count in required_kits.items()},
+            ):
+                raise ValidationError("Insufficient balance for this upgrade.")
 
-        for tier, count in required_kits.items():
-            self.upgrade_kits[tier]['quantity'] -= count
+            self.tanks.through.objects.filter(team=self, id=tank.id, is_upgradable=True).delete()
+            self.tanks.through.objects.create(team=self, tank=to_tank)
+            self.record_tank_changes(added=[to_tank], removed=[from_tank])
 
-        self.tanks.through.objects.filter(team=self, id=tank.id, is_upgradable=True).delete()
-        self.tanks.through.objects.create(team=self, tank=to_tank)
+        return f"Tank {from_tank.name} upgraded to {to_tank.name}. Total cost: {total_cost}. Remaining balance: {self.balance}"
 
-        self.save()
+    def is_native(self, tank):
+        return get_manufacturer_index().is_native(self.id, tank.id)
 
-        return f"Tank {from_tank.name} upgraded to {to_tank.name}. Total cost: {total_cost}. Remaining balance: {self.balance}"
+    def native_tank_ids(self):
+        return get_manufacturer_index().native_tank_ids(self.id)
 
     def get_direct_upgrades(self, tank):
         from_tank = tank.tank
@@ -677,44 +805,9 @@ class Team(models.Model):
 
         auction_factor = tank.value - from_tank.price if tank.from_auctions else 0
 
-        direct_upgrade_paths = UpgradePath.objects.filter(from_tank=from_tank)
-        direct_upgrades = []
-
-        for upgrade_path in direct_upgrade_paths:
-            to_tank = upgrade_path.to_tank
-            base_cost = upgrade_path.cost
-
-            required_kit_tier = upgrade_path.required_kit_tier
-            kit_discount = self.get_upgrade_kit_discount(required_kit_tier) if required_kit_tier else 0
-
-            effective_cost = max(base_cost - kit_discount, 0)
-
-            final_manu_cost = base_cost - auction_factor
-            final_total_cost = effective_cost - auction_factor
-
-            required_kits = {
-                'T1': 0,
-                'T2': 0,
-                'T3': 0
-            }
-            if required_kit_tier:
-                required_kits[required_kit_tier] += 1
-
-            available_in_manufacturer = self.manufacturers.filter(id__in=to_tank.manufacturers.all()).exists()
-
-            direct_upgrades.append({
-                'from_tank': from_tank.name,
-                'to_tank': to_tank.name,
-                'manu_cost': final_manu_cost,
-                'kit_discount': kit_discount,
-                'required_kit_tier': required_kit_tier,
-                'total_cost': final_total_cost,
-                'available_in_manufacturer': available_in_manufacturer,
-                'required_kits': required_kits,
-                'to_tank_br': to_tank.battle_rating,
-            })
-
-        return direct_upgrades
+        return get_upgrade_graph().direct_upgrades(
+            from_tank.id, self.get_upgrade_kit_discount, self.native_tank_ids(), auction_factor
+        )
 
     def get_possible_upgrades(self, tank, minimize_kits=True):
         from_tank = tank.tank
@@ -723,97 +816,49 @@ class Team(models.Model):
 
         auction_factor = tank.value - from_tank.price if tank.from_auctions else 0
 
-        best_upgrade_paths = {}
-        priority_queue = []
-        required_kits = {
-            'T1': 0,
-            'T2': 0,
-            'T3': 0
-        }
-        heapq.heappush(priority_queue, (0, 0, from_tank.id, required_kits.copy()))
-
-        while priority_queue:
-            kits, current_cost, current_tank_id, accumulated_kits = heapq.heappop(priority_queue)
-
-            current_tank = Tank.objects.get(id=current_tank_id)
-
-            upgrade_paths = UpgradePath.objects.filter(from_tank=current_tank)
-
-            for upgrade_path in upgrade_paths:
-                to_tank = upgrade_path.to_tank
-                base_cost = upgrade_path.cost
-
-                required_kit_tier = upgrade_path.required_kit_tier
-                kit_discount = self.get_upgrade_kit_discount(required_kit_tier) if required_kit_tier else 0
-
-                step_total_cost = base_cost - kit_discount
-                step_total_cost = max(step_total_cost, 0)
-                total_cost = current_cost + step_total_cost
-
-                new_required_kits = accumulated_kits.copy()
-
-                if required_kit_tier:
-                    new_required_kits[required_kit_tier] += 1
-
-                update_path = False
-                if to_tank.id != from_tank.id:
-                    if minimize_kits:
-                        if (to_tank.id not in best_upgrade_paths or
-                                self.is_path_requirements_less(new_required_kits,
-                                                               best_upgrade_paths[to_tank.id]['required_kits'])):
-                            update_path = True
-                    else:
-                        if (to_tank.id not in best_upgrade_paths or
-                                (total_cost - auction_factor) < best_upgrade_paths[to_tank.id]['total_cost']):
-                            update_path = True
-
-                if update_path:
-                    available_in_manufacturer = self.manufacturers.filter(
-                        id__in=to_tank.manufacturers.all()).exists()
-                    manu_cost = None
-                    if available_in_manufacturer:
-                        manu_cost = abs(
-                            to_tank.price - from_tank.price) if to_tank.price >= from_tank.price else abs(
-                            to_tank.price - from_tank.price) / 2
+        return get_upgrade_graph().possible_upgrades(
+            from_tank.id, self.get_upgrade_kit_discount, self.native_tank_ids(), auction_factor, minimize_kits
+        )
 
-                        manu_cost -= auction_factor
+    def get_garage_upgrades(self):
+        graph = get_upgrade_graph()
+        native_tank_ids = self.native_tank_ids()
+
+        # Copies of the same base tank share one search; only the auction adjustment differs per copy.
+        searches = {}
+        garage_upgrades = []
+        for team_tank in self.teamtank_set.filter(is_upgradable=True).select_related('tank').order_by('id'):
+            if team_tank.tank_id not in searches:
+                searches[team_tank.tank_id] = (
+                    graph.direct_upgrades(team_tank.tank_id, self.get_upgrade_kit_discount, native_tank_ids),
+                    graph.possible_upgrades(team_tank.tank_id, self.get_upgrade_kit_discount, native_tank_ids),
+                )
+            direct_upgrades, possible_upgrades = searches[team_tank.tank_id]
 
-                    kits_calc = self.calculate_total_kits(new_required_kits)
+            auction_factor = team_tank.value - team_tank.tank.price if team_tank.from_auctions else 0
 
-                    final_total_cost = total_cost - auction_factor
+            garage_upgrades.append({
+                'id': team_tank.id,
+                'tank': team_tank.tank.name,
+                'direct_upgrades': apply_auction_factor(direct_upgrades, auction_factor),
+                'upgrades': apply_auction_factor(possible_upgrades, auction_factor),
+            })
 
-                    best_upgrade_paths[to_tank.id] = {
-                        'from_tank': current_tank.name,
-                        'to_tank': to_tank.name,
-                        'base_cost': base_cost,
-                        'kit_discount': kit_discount,
-                        'required_kit_tier': required_kit_tier,
-                        'total_cost': final_total_cost,
-                        'available_in_manufacturer': available_in_manufacturer,
-                        'manu_cost': manu_cost,
-                        'required_kits': new_required_kits,
-                        'to_tank_br': to_tank.battle_rating,
-                    }
+        return garage_upgrades
 
-                    heapq.heappush(priority_queue, (kits_calc, total_cost, to_tank.id, new_required_kits))
+    def get_upgrade_frontier(self, tank):
+        from_tank = tank.tank
+        if not tank.is_upgradable:
+            raise ValidationError(f"The team does not own the tank or its not upgradable: {from_tank.name}.")
 
-        final_upgrade_paths = [path for path in best_upgrade_paths.values() if path['to_tank'] != from_tank.name]
+        auction_factor = tank.value - from_tank.price if tank.from_auctions else 0
 
-        return final_upgrade_paths
+        return get_upgrade_graph().pareto_upgrades(
+            from_tank.id, self.get_upgrade_kit_discount, self.native_tank_ids(), auction_factor
+        )
 
     def calculate_total_kits(self, required_kits):
-        weights = {
-            'T1': 1,
-            'T2': 2,
-            'T3': 4
-        }
-
-        total_kits = 0
-
-        for kit_type, count in required_kits.items():
-            total_kits += weights[kit_type] * count
-
-        return total_kits
+        return total_kit_weight(required_kits)
 
     def is_path_requirements_less(self, path_a_kits, path_b_kits):
         total_kits_a = self.calculate_total_kits(path_a_kits)
@@ -822,7 +867,12 @@ class Team(models.Model):
         return total_kits_a < total_kits_b
 
     def reverse_change(self, log_entry):
-        previous_state = json.loads(log_entry.previous_value)
+        if log_entry.changes is not None:
+            return self.reverse_changes(log_entry.changes)
+
+        previous_state = log_entry.payload()[0]
+        if isinstance(previous_state, str):
+            previous_state = json.loads(previous_state)
         if log_entry.method_name == 'calc_rewards':
             self.balance = int(previous_state['balance'])
             self.save()
@@ -855,6 +905,25 @@ class Team(models.Model):
 
             self.save()
 
+    def reverse_changes(self, changes):
+        deltas = {name: -changes.get(column, 0) for name, column in self.MONEY_DELTA_FIELDS.items()}
+        kits = {tier: -difference for tier, difference in changes.get('kits', {}).items()}
+        with transaction.atomic():
+            if not self.adjust(LedgerEntry.CHANGE_REVERT, kits=kits, **deltas):
+                raise ValidationError(f"{self.name} does not have enough balance to reverse this change.")
+
+            tanks = changes.get('tanks', {})
+            for tank_id in tanks.get('added', []):
+                if isinstance(tank_id, int):
+                    team_tank = self.tanks.through.objects.filter(team=self, tank_id=tank_id).order_by('-id').first()
+                    if team_tank:
+                        team_tank.delete()
+            self.tanks.through.objects.bulk_create([
+                self.tanks.through(team=self, tank_id=tank_id)
+                for tank_id in tanks.get('removed', []) if isinstance(tank_id, int)
+            ])
+            invalidate(TeamTank)
+
 
 class Bounty(models.Model):
     team = models.ForeignKey(Team, related_name='bounties', on_delete=models.CASCADE)
@@ -901,21 +970,25 @@ class Tank(models.Model):
     def __str__(self):
         return f"{self.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_price = instance.__dict__.get('price')
+        return instance
+
     def save(self, *args, **kwargs):
-        if self.pk:
-            old_price = Tank.objects.get(pk=self.pk).price
-        else:
+        if self._state.adding:
             old_price = None
+        else:
+            old_price = getattr(self, '_loaded_price', None)
+            if old_price is None:
+                old_price = Tank.objects.filter(pk=self.pk).values_list('price', flat=True).first()
 
-        super().save(*args, **kwargs)
-
-        if old_price is not None and old_price != self.price:
-            for upgrade_path in UpgradePath.objects.filter(from_tank=self):
-                upgrade_path.cost = upgrade_path.calculate_cost()
-                upgrade_path.save()
-            for upgrade_path in UpgradePath.objects.filter(to_tank=self):
-                upgrade_path.cost = upgrade_path.calculate_cost()
-                upgrade_path.save()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if old_price is not None and old_price != self.price:
+                recalculate_costs([self.pk])
+        self._loaded_price = self.price
 
 
 class TankBox(models.Model):
@@ -934,37 +1007,28 @@ class TankBox(models.Model):
         super().save(*args, **kwargs)
 
     def calculate_cost(self):
-        tank_prices = self.tanks.all().values_list('price', flat=True)
-
-        if tank_prices:
-            mean_price = sum(tank_prices) / len(tank_prices)
-        else:
-            mean_price = 0
-
-        if self.is_national:
-            self.price = int(mean_price * 1.30)
-        else:
-            self.price = int(mean_price)
+        tank_prices = list(self.tanks.all().values_list('price', flat=True))
+        self.price = box_price(tank_prices, self.is_national)
 
     def purchase(self, team, user):
         if team.balance < self.price:
             raise ValueError(f"Team '{team.name}' does not have enough balance to purchase '{self.name}'.")
 
-        team.balance -= self.price
-        team.total_money_spent += self.price
-        team.save()
+        with deferred_logs():
+            if not team.adjust(LedgerEntry.BOX_PURCHASE, box=self, balance=-self.price, spent=self.price):
+                raise ValueError(f"Team '{team.name}' does not have enough balance to purchase '{self.name}'.")
 
-        box = TeamBox.objects.create(team=team, box=self)
+            box = TeamBox.objects.create(team=team, box=self)
 
-        TeamLog.objects.create(
-            team=team,
-            user=user,
-            field_name='balance',
-            previous_value={'balance': team.balance + self.price},
-            new_value={'balance': team.balance},
-            description=f"Changes made by method: purchase_box\nBalance Changed by: {-self.price}\nBox Purchased: {self.name} T{self.tier}",
-            method_name='purchase_box',
-        )
+            queue_log(
+                team=team,
+                user=user,
+                field_name='balance',
+                previous_value={'balance': team.balance + self.price},
+                new_value={'balance': team.balance},
+                description=f"Changes made by method: purchase_box\nBalance Changed by: {-self.price}\nBox Purchased: {self.name} T{self.tier}",
+                method_name='purchase_box',
+            )
 
         return {
             'team': team.name,
@@ -991,7 +1055,7 @@ class TeamBox(models.Model):
         TeamTank.objects.create(team=self.team, tank=selected_tank)
         self.delete()
 
-        TeamLog.objects.create(
+        queue_log(
             team=self.team,
             user=user,
             field_name='balance',
@@ -1016,52 +1080,29 @@ class UpgradePath(models.Model):
         super().save(*args, **kwargs)
 
     def calculate_cost(self):
-        price_difference = self.to_tank.price - self.from_tank.price
-        if self.from_tank.price > self.to_tank.price:
-            self.cost = abs(price_difference / 2)
-        else:
-            self.cost = abs(price_difference)
-        if price_difference == 0:
-            rank = self.to_tank.rank
-            rank_based_costs = {
-                1: 3500,
-                2: 7500,
-                3: 10000,
-                4: 15000,
-                5: 20000
-            }
-            self.cost = rank_based_costs.get(rank, 0)
+        self.cost = upgrade_cost(self.from_tank.price, self.to_tank.price, self.to_tank.rank)
 
     def __str__(self):
         return f"From {self.from_tank} to {self.to_tank} using {self.required_kit_tier} for {self.cost}"
 
 def get_upgrade_tree(start_tank_name):
+    reachable_tanks = RawSQL(
+        f"""
+        WITH RECURSIVE reachable(tank_id) AS (
+            SELECT id FROM {Tank._meta.db_table} WHERE name = %s
+            UNION
+            SELECT path.to_tank_id
+            FROM {UpgradePath._meta.db_table} path
+            JOIN reachable ON path.from_tank_id = reachable.tank_id
+        )
+        SELECT tank_id FROM reachable
+        """,
+        (start_tank_name,)
+    )
 
-    visited = set()
-    upgrade_paths = []
-    queue = deque()
-
-    try:
-        start_tank = Tank.objects.get(name=start_tank_name)
-    except Tank.DoesNotExist:
-        return []
-
-    queue.append(start_tank)
-
-    while queue:
-        current_tank = queue.popleft()
-        if current_tank.id in visited:
-            continue
-        visited.add(current_tank.id)
-
-        direct_upgrades = UpgradePath.objects.filter(from_tank=current_tank).select_related('from_tank', 'to_tank')
-
-        for path in direct_upgrades:
-            upgrade_paths.append(path)
-            if path.to_tank.id not in visited:
-                queue.append(path.to_tank)
-
-    return upgrade_paths
+    return list(
+        UpgradePath.objects.filter(from_tank_id__in=reachable_tanks).select_related('from_tank', 'to_tank').order_by('id')
+    )
 
 
 class TeamTank(models.Model):
@@ -1142,6 +1183,28 @@ class Match(models.Model):
     channel_id_result = models.CharField(max_length=255, blank=True, null=True)
     channel_id_calc = models.CharField(max_length=255, blank=True, null=True)
 
+    QUOTA_FIELDS = ('datetime', 'mode', 'gamemode', 'was_played')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if all(name in instance.__dict__ for name in cls.QUOTA_FIELDS):
+            instance._loaded_quota_key = match_quota_key(instance)
+        return instance
+
+    def save(self, *args, **kwargs):
+        old_key = getattr(self, '_loaded_quota_key', None)
+        if old_key is None and self.pk is not None:
+            old = Match.objects.filter(pk=self.pk).only(*self.QUOTA_FIELDS).first()
+            old_key = old and old._loaded_quota_key
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            new_key = match_quota_key(self)
+            if old_key is not None and old_key != new_key:
+                move_match(self.pk, old_key, new_key)
+        self._loaded_quota_key = new_key
+
     def __str__(self):
         teams_by_side = {
             'team_1': [],
@@ -1151,6 +1214,9 @@ class Match(models.Model):
         for team_match in team_matches:
             teams_by_side[team_match.side].append(team_match.team.name)
 
+        return self.label(teams_by_side)
+
+    def label(self, teams_by_side):
         side_1_teams = ", ".join(teams_by_side['team_1'])
         side_2_teams = ", ".join(teams_by_side['team_2'])
         return f"{self.datetime} - {self.mode} - {self.gamemode}\n {side_1_teams} vs {side_2_teams}"
@@ -1181,631 +1247,75 @@ class MatchResult(models.Model):
 
     def calculate_average_rank(self):
         tanks_lost = TankLost.objects.filter(match_result__match=self.match)
-        tanks = Tank.objects.filter(id__in=tanks_lost.values_list('tank_id', flat=True))
+        tanks = Tank.objects.filter(id__in=tanks_lost.values_list('tank_id', flat=True)).order_by('id')
 
-        total_rank_br = sum(tank.rank * tank.battle_rating for tank in tanks)
-        total_br = sum(tank.battle_rating for tank in tanks)
-
-        if total_br > 0:
-            average_rank = total_rank_br / total_br
-        else:
-            average_rank = 0
-
-        return round(average_rank)
+        return weighted_average_rank(tanks.values_list('rank', 'battle_rating'))
 
     def calculate_base_reward(self, average_rank):
-
-        advanced_rewards = [
-            {"rank": 1, "winner": 20000, "loser": 15000},
-            {"rank": 2, "winner": 40000, "loser": 30000},
-            {"rank": 3, "winner": 60000, "loser": 45000},
-            {"rank": 4, "winner": 80000, "loser": 60000},
-            {"rank": 5, "winner": 100000, "loser": 75000},
-        ]
-
-        flag_rewards = [
-            {"rank": 1, "winner": 35000, "loser": 15000},
-            {"rank": 2, "winner": 60000, "loser": 25000},
-            {"rank": 3, "winner": 85000, "loser": 40000},
-            {"rank": 4, "winner": 110000, "loser": 50000},
-            {"rank": 5, "winner": 150000, "loser": 70000},
-        ]
-
-        trad_bo5_rewards = [
-            {"rank": 1, "winner": 20000, "loser": 15000},
-            {"rank": 2, "winner": 40000, "loser": 30000},
-            {"rank": 3, "winner": 55000, "loser": 40000},
-            {"rank": 4, "winner": 75000, "loser": 55000},
-            {"rank": 5, "winner": 95000, "loser": 70000},
-        ]
-
-        trad_bo3_rewards = [
-            {"rank": 1, "winner": 15000, "loser": 12000},
-            {"rank": 2, "winner": 30000, "loser": 23000},
-            {"rank": 3, "winner": 45000, "loser": 34000},
-            {"rank": 4, "winner": 60000, "loser": 45000},
-            {"rank": 5, "winner": 75000, "loser": 56000},
-        ]
-
-        mode = self.match.mode
-        game_mode = self.match.gamemode
-        best_of = self.match.best_of_number
-
-        if mode == "traditional":
-            if best_of == 5:
-                return trad_bo5_rewards[min(int(round(average_rank)-1), 4)]["winner"], \
-                    trad_bo5_rewards[min(int(round(average_rank)-1), 4)]["loser"]
-            else:
-                return trad_bo3_rewards[min(int(round(average_rank) - 1), 4)]["winner"], \
-                    trad_bo3_rewards[min(int(round(average_rank) - 1), 4)]["loser"]
-        elif mode == "advanced" or mode == "evolved":
-            if game_mode == "flag_tank":
-                return flag_rewards[min(int(round(average_rank)-1), 4)]["winner"], \
-                    flag_rewards[min(int(round(average_rank)-1), 4)]["loser"]
-            else:
-                return advanced_rewards[min(int(round(average_rank)-1), 4)]["winner"], \
-                    advanced_rewards[min(int(round(average_rank)-1), 4)]["loser"]
-
-        return 0, 0
+        return base_rewards(self.match.mode, self.match.gamemode, self.match.best_of_number, average_rank)
 
     def calculate_rewards(self, user):
-        average_rank = self.calculate_average_rank()
-        winner_base_reward, loser_base_reward = self.calculate_base_reward(average_rank)
-
-        rates = MatchRewardRates.objects.first()
-        if not rates:
-            rates = MatchRewardRates()
-
-        participating_teams = set(
-            TeamMatch.objects.filter(match=self.match).values_list('team_id', flat=True)
-        )
-        playing_teams = set(
-            TeamMatch.objects.filter(match=self.match).values_list('team_id', flat=True)
-        )
-        participating_teams.update(substitute.team.id for substitute in self.substitutes.all())
-        if self.judge:
-            participating_teams.add(self.judge.id)
-
-        team_rewards = {team_id: 0 for team_id in participating_teams}
-
-        teams_on_side = {
-            'team_1': list(TeamMatch.objects.filter(match=self.match, side='team_1').values_list('team_id', flat=True)),
-            'team_2': list(TeamMatch.objects.filter(match=self.match, side='team_2').values_list('team_id', flat=True)),
-        }
-
-        num_teams_on_side = {
-            'team_1': len(teams_on_side['team_1']),
-            'team_2': len(teams_on_side['team_2']),
-        }
-
-        substitutes_rewards = {
-            'team_1': 0,
-            'team_2': 0,
-        }
-
-        for team_result in self.team_results.all():
-            team = team_result.team
-            team_id = team.id
-            side = 'team_1' if team_id in teams_on_side['team_1'] else 'team_2'
-            other_side = 'team_2' if side == 'team_1' else 'team_1'
-
-            if not team_result.was_present:
-                if len(teams_on_side[side]) > 1:
-                    TeamLog.objects.create(
-                        team=team,
-                        user=user,
-                        field_name='balance',
-                        previous_value={'balance': team.balance},
-                        new_value={'balance': team.balance},
-                        description=f"Balance Changed by: {0}\n"
-                                    f"No Show\n"
-                                    f"Match: {self.match.__str__()}\n"
-                                    f"Match ID: {self.match.id}",
-                        method_name="calc_rewards"
-                    )
-                    participating_teams.remove(team_id)
-                    playing_teams.remove(team_id)
-                else:
-                    initial_balance = team.balance
-                    team.balance -= 20000
-
-                    TeamLog.objects.create(
-                        team=team,
-                        user=user,
-                        field_name='balance',
-                        previous_value={'balance': initial_balance},
-                        new_value={'balance': team.balance},
-                        description=f"Balance Changed by: {-20000}\n"
-                                    f"No Show\n"
-                                    f"Match: {self.match.__str__()}\n"
-                                    f"Match ID: {self.match.id}",
-                        method_name="calc_rewards"
-                    )
-                    team.save()
-
-                    for other_team in teams_on_side[other_side]:
-                        team = Team.objects.get(id=other_team)
-                        initial_balance = team.balance
-                        team.balance += 20000
-
-                        TeamLog.objects.create(
-                            team=team,
-                            user=user,
-                            field_name='balance',
-                            previous_value={'balance': initial_balance},
-                            new_value={'balance': team.balance},
-                            description=f"Balance Changed by: {20000}\n"
-                                        f"Enemy No Show\n"
-                                        f"Match: {self.match.__str__()}\n"
-                                        f"Match ID: {self.match.id}",
-                            method_name="calc_rewards"
-                        )
-                        team.save()
-
-                    self.is_calced = True
-                    self.save()
-                    return
-
-
-
-        if self.winning_side == 'team_1':
-            winner_base_reward -= substitutes_rewards['team_1']
-            loser_base_reward -= substitutes_rewards['team_2']
-        else:
-            winner_base_reward -= substitutes_rewards['team_2']
-            loser_base_reward -= substitutes_rewards['team_1']
-
-        winning_teams = teams_on_side[self.winning_side]
-        losing_teams = teams_on_side['team_1' if self.winning_side == 'team_2' else 'team_2']
-
-        tank_counts = TeamMatch.objects.filter(match=self.match).values('side').annotate(total_tanks=Count('tanks'))
-        team_1_tanks = next((t['total_tanks'] for t in tank_counts if t['side'] == 'team_1'), 0)
-        team_2_tanks = next((t['total_tanks'] for t in tank_counts if t['side'] == 'team_2'), 0)
-
-        if self.match.mode == "traditional" or self.match.gamemode == "flag_tank":
-            for team in winning_teams:
-                team_rewards[team] += winner_base_reward
-
-            for team in losing_teams:
-                team_rewards[team] += loser_base_reward
-        else:
-            total_loss_penalty_team_1 = 0
-            total_gain_reward_team_1 = 0
-            total_loss_penalty_team_2 = 0
-            total_gain_reward_team_2 = 0
-
-            for tank_lost in self.tanks_lost.all():
-                team_id = tank_lost.team.id
-                tank_price = tank_lost.tank.price
-                quantity = tank_lost.quantity
-                side = 'team_1' if team_id in teams_on_side['team_1'] else 'team_2'
-                other_side = 'team_2' if side == 'team_1' else 'team_1'
-
-                if self.match.money_rules == 'even_split':
-                    loss_penalty = tank_price * rates.even_split_repair_cost * quantity
-                    gain_reward = tank_price * rates.even_split_kill_reward * quantity
-                elif self.match.money_rules == 'money_rule':
-                    loss_penalty = tank_price * rates.money_rule_repair_cost * quantity
-                    gain_reward = tank_price * rates.money_rule_kill_reward * quantity
-                else:
-                    loss_penalty = tank_price * rates.no_rule_repair_cost * quantity
-                    gain_reward = tank_price * rates.no_rule_kill_reward * quantity
-
-                if side == 'team_1':
-                    total_loss_penalty_team_1 += loss_penalty
-                    total_gain_reward_team_2 += gain_reward
-                else:
-                    total_gain_reward_team_1 += gain_reward
-                    total_loss_penalty_team_2 += loss_penalty
-
-                if team_1_tanks == 1 and team_2_tanks == 1:
-                    total_gain_reward_team_2 = 0
-                    total_gain_reward_team_1 = 0
-
-            if self.winning_side == 'team_1':
-                winner_base_reward += total_gain_reward_team_1 - total_loss_penalty_team_1
-                loser_base_reward += total_gain_reward_team_2 - total_loss_penalty_team_2
-            else:
-                winner_base_reward += total_gain_reward_team_2 - total_loss_penalty_team_2
-                loser_base_reward += total_gain_reward_team_1 - total_loss_penalty_team_1
-
-            winner_total_reward = winner_base_reward
-            loser_total_reward = loser_base_reward
-
-            if self.match.money_rules == "even_split":
-                winner_total_reward = (winner_base_reward + loser_base_reward) / 2
-                loser_total_reward = (winner_base_reward + loser_base_reward) / 2
-
-            for team in winning_teams:
-                team_rewards[team] += winner_total_reward / len(winning_teams)
-
-            for team in losing_teams:
-                team_rewards[team] += loser_total_reward / len(losing_teams)
-
-
-
-        used_boosters = {}
-
-        for team in winning_teams:
-            try:
-                booster = Booster.objects.get(team=team)
-            except Booster.DoesNotExist:
-                continue
-
-            if booster and booster.active:
-                if booster.expires_at and booster.expires_at < now():
-                    booster.delete()
-                elif booster.match_limited and (booster.matches_left is None or booster.matches_left <= 0):
-                    booster.delete()
-                else:
-                    team_rewards[team] *= booster.multiplier
-                    if booster.match_limited and booster.matches_left is not None:
-                        used_boosters[team] = {
-                            "team_id": team,
-                            "booster_id": booster.id,
-                            "matches_left_before": booster.matches_left,
-                            "matches_left_after": booster.matches_left - 1
-                        }
-                        booster.matches_left -= 1
-                    booster.save()
-
-        for team in losing_teams:
-            try:
-                booster = Booster.objects.get(team=team)
-            except Booster.DoesNotExist:
-                continue
-
-            if booster and booster.active:
-                if booster.expires_at and booster.expires_at < now():
-                    booster.delete()
-                elif booster.match_limited and (booster.matches_left is None or booster.matches_left <= 0):
-                    booster.delete()
-                else:
-                    team_rewards[team] *= booster.multiplier
-                    if booster.match_limited and booster.matches_left is not None:
-                        used_boosters[team] = {
-                            "team_id": team,
-                            "booster_id": booster.id,
-                            "matches_left_before": booster.matches_left,
-                            "matches_left_after": booster.matches_left - 1
-                        }
-                        booster.matches_left -= 1
-                    booster.save()
-
-        for team_result in self.team_results.all():
-            team_id = team_result.team.id
-            if team_result.bonuses:
-                team_rewards[team_id] += 10000 * team_result.bonuses
-
-        if self.match.money_rules == "money_rule":
-            for team_id in playing_teams:
-                reward = team_rewards.get(team_id, 0)
-
-                if reward < 0:
-                    deficit = abs(reward)
-                    team_rewards[team_id] = 0
-
-                    winning_side_teams = teams_on_side[self.winning_side]
-                    if winning_side_teams:
-                        per_team_deduction = deficit / len(winning_side_teams)
-
-                        for winner_id in winning_side_teams:
-                            team_rewards[winner_id] -= per_team_deduction
-
-                            if team_rewards[winner_id] < 0:
-                                deficit += abs(team_rewards[winner_id])
-                                team_rewards[winner_id] = 0
-
-                                remaining_winners = [
-                                    t for t in winning_side_teams if team_rewards[t] > 0
-                                ]
-                                if remaining_winners:
-                                    per_team_deduction = deficit / len(remaining_winners)
-
-        for team_result in self.team_results.all():
-            team_id = team_result.team.id
-            if team_result.penalties:
-                team_rewards[team_id] -= 10000 * average_rank * team_result.penalties
-
-        for team_id in playing_teams:
-            team_subs = [s for s in self.substitutes.all() if s.team_played_for.id == team_id]
-
-            for sub in team_subs:
-                played_for_team = Team.objects.get(id=team_id)
-                sub_team = sub.team
-
-                is_alliance_sub = (
-                        played_for_team.alliance is not None and
-                        sub_team.alliance is not None and
-                        played_for_team.alliance.id == sub_team.alliance.id
-                )
-
-                if is_alliance_sub:
-                    pass
-                else:
-                    reward_pool = team_rewards[team_id]
-                    if reward_pool > 0:
-                        cut_amount = reward_pool * (sub.activity * 0.05)
-                        team_rewards[sub.team.id] += cut_amount
-                        team_rewards[team_id] -= cut_amount
-
-        combined_rewards = winner_base_reward + loser_base_reward
-        if self.tanks_lost.all().count() >= 12:
-            judge_reward = 0.075 * combined_rewards
-        else:
-            judge_reward = 0.05 * combined_rewards
-        if self.match.mode == "bo5":
-            judge_reward = max(judge_reward, 7500)
-        else:
-            judge_reward = max(judge_reward, 5000)
-
-        if self.judge:
-            if self.judge_is_test:
-                team_rewards[self.judge.id] += judge_reward / 2
-            else:
-                team_rewards[self.judge.id] += judge_reward
-
-
-        winning_teams = teams_on_side[self.winning_side]
-        losing_teams = teams_on_side['team_1' if self.winning_side == 'team_2' else 'team_2']
-
-        for team in winning_teams:
-            points = ROUND_POINTS.get(self.round_score, 0)
-            num_rounds = sum(map(int, self.round_score.split(':')))
-            win_percentage = int(self.round_score.split(':')[0]) / num_rounds if num_rounds > 0 else 0
-            total_points = points * (1 + win_percentage)
-            team_rewards[team] += total_points
-
-        reversed_score = ":".join(self.round_score.split(':')[::-1])
-        for team in losing_teams:
-            points = ROUND_POINTS.get(reversed_score, 0)
-            num_rounds = sum(map(int, reversed_score.split(':')))
-            win_percentage = int(reversed_score.split(':')[0]) / num_rounds if num_rounds > 0 else 0
-            total_points = points * (1 + win_percentage)
-            team_rewards[team] += total_points
-
-        a = TeamLog.objects.filter(
-            Q(description__contains=f'Reverted rewards calculation for Match ID: {self.match.id}')
-        ).delete()
-
-        today = now().date()
-        start_of_week = today - timedelta(days=today.weekday())
-        end_of_week = start_of_week + timedelta(days=6)
-
-        if self.match.is_bounty:
-            target_team = None
-            challenger_team = None
-
-            for team_id in playing_teams:
-                t = Team.objects.get(id=team_id)
-                if t.has_active_bounty:
-                    target_team = t
-                else:
-                    challenger_team = t
-
-            if target_team and challenger_team:
-                if challenger_team.id in winning_teams:
-                    active_bounty = target_team.bounties.filter(is_active=True).first()
-                    if active_bounty:
-                        bounty_amount = active_bounty.value
-                        team_rewards[challenger_team.id] += bounty_amount
-
-        for team_id, reward in team_rewards.items():
-            reversed_score = ":".join(self.round_score.split(':')[::-1])
-            if team_id in winning_teams:
-                points = ROUND_POINTS.get(self.round_score, 0)
-                num_rounds = sum(map(int, self.round_score.split(':')))
-                win_percentage = int(self.round_score.split(':')[0]) / num_rounds if num_rounds > 0 else 0
-                total_points = points * (1 + win_percentage)
-            elif team_id in losing_teams:
-                points = ROUND_POINTS.get(reversed_score, 0)
-                num_rounds = sum(map(int, self.round_score.split(':')))
-                win_percentage = int(self.round_score.split(':')[0]) / num_rounds if num_rounds > 0 else 0
-                total_points = points * (1 + win_percentage)
-            else:
-                total_points = 0
-
-            team = Team.objects.get(id=team_id)
-            initial_balance = team.balance
-            initial_points = team.score
-
-            team.balance += reward
-            team.score += total_points
-            team.total_money_earned += reward
-            if team_id in playing_teams:
-                kits = copy.deepcopy(team.upgrade_kits)
-                if (
-                        (self.match.mode == "traditional" or self.match.gamemode == 'domination') and
-                        team_1_tanks >= 3 and
-                        team_2_tanks >= 3 and
-                        team.trad_dom_matches_for_week(self.match.datetime) <= 2
-                ):
-                    team.upgrade_kits['T1']['quantity'] += 1
-            team.save()
-
-            if team_id in playing_teams:
-                log_method = "calc_rewards"
-            elif self.judge and team_id == self.judge.id and any(sub.team.id == team_id for sub in self.substitutes.all()):
-                log_method = "judge_and_sub_rewards"
-            elif any(sub.team.id == team_id for sub in self.substitutes.all()):
-                log_method = "sub_rewards"
-            else:
-                log_method = "judge_rewards"
-
-            booster_log_data = used_boosters.get(team.id)
-            if booster_log_data:
-                previous_booster = {
-                    "booster_id": booster_log_data["booster_id"],
-                    "matches_left": booster_log_data["matches_left_before"]
-                }
-                new_booster = {
-                    "booster_id": booster_log_data["booster_id"],
-                    "matches_left": booster_log_data["matches_left_after"]
-                }
-            else:
-                previous_booster = None
-                new_booster = None
-
-            bounty_line = ""
-            if self.match.is_bounty and team_id in winning_teams:
-                if not team.has_active_bounty:
-                    for loser_id in losing_teams:
-                        loser_team = Team.objects.get(id=loser_id)
-                        active_bounty = loser_team.bounties.filter(is_active=True).first()
-                        if active_bounty:
-                            bounty_line = f"Bounty Claimed from {loser_team.name}: {active_bounty.value}\n"
-                            break
-
-            if log_method == 'calc_rewards':
-                TeamLog.objects.create(
-                    team=team,
-                    user=user,
-                    field_name='balance',
-                    previous_value={
-                        'balance': initial_balance,
-                        'upgrade_kits': kits,
-                        'score': initial_points,
-                        'booster': previous_booster
-                    },
-                    new_value={
-                        'balance': team.balance,
-                        'upgrade_kits': team.upgrade_kits,
-                        'score': team.score,
-                        'booster': new_booster
-                    },
-                    description=f"Balance Changed by: {reward}\n"
-                                f"Kits changed by: {compare_upgrade_kits(kits, team.upgrade_kits)}\n"
-                                f"{bounty_line}"
-                                f"Match: {self.match.__str__()}\n"
-                                f"Match ID: {self.match.id}\n"
-                                f"Booster: {booster_log_data if booster_log_data else 'None'}",
-                    method_name=log_method
-                )
-            else:
-                TeamLog.objects.create(
-                    team=team,
-                    user=user,
-                    field_name='balance',
-                    previous_value={
-                        'balance': initial_balance,
-                        'booster': previous_booster
-                    },
-                    new_value={
-                        'balance': team.balance,
-                        'booster': new_booster
-                    },
-                    description=f"Balance Changed by: {reward}\n"
-                                f"{bounty_line}"
-                                f"Match: {self.match.__str__()}\n"
-                                f"Match ID: {self.match.id}\n"
-                                f"Booster: {booster_log_data if booster_log_data else 'None'}",
-                    method_name=log_method
-                )
-
-        self.is_calced = True
-        self.save()
-
-        rewards_summary = {
-            "winning_teams": {},
-            "losing_teams": {},
-            "substitutes": {},
-            "judge": {},
-            "total_rewards": 0,
-            "kits": {},
-        }
-
-        for team_id in playing_teams:
-            team = Team.objects.get(id=team_id)
-            team_data = {
-                "reward": int(team_rewards.get(team_id, 0)),
-                "new_balance": team.balance,
-                "new_score": team.score,
-            }
-
-            if team_id in winning_teams:
-                rewards_summary["winning_teams"][team.name] = team_data
-            else:
-                rewards_summary["losing_teams"][team.name] = team_data
-
-            if (
-                    (self.match.mode == "traditional" or self.match.gamemode == 'domination') and
-                    team_1_tanks >= 3 and
-                    team_2_tanks >= 3 and
-                    team.trad_dom_matches_for_week(self.match.datetime) <= 2
-            ):
-                if team_id in TeamMatch.objects.filter(match=self.match).values_list('team_id', flat=True):
-                    rewards_summary["kits"][team.name] = {
-                        "T1_kits_received": 1
-                    }
-
-        for sub in self.substitutes.all():
-            sub_team_name = sub.team.name
-            sub_reward = int(team_rewards.get(sub.team.id, 0))
-            if sub_team_name not in rewards_summary["substitutes"]:
-                rewards_summary["substitutes"][sub_team_name] = {"reward": 0}
-            rewards_summary["substitutes"][sub_team_name]["reward"] += sub_reward
-
-        if self.judge:
-            judge_team = self.judge
-            rewards_summary["judge"] = {
-                "name": judge_team.name,
-                "reward": int(team_rewards.get(judge_team.id, 0)),
-                "new_balance": judge_team.balance,
-            }
-
-        rewards_summary["total_rewards"] = sum(team_rewards.values())
-
-        return rewards_summary
+        inputs = load_reward_inputs(self)
+        outcome = compute_rewards(inputs)
+        return apply_rewards(self, outcome, user)
 
+    def preview_rewards(self):
+        return preview_rewards(self)
 
+    @transaction.atomic
     def revert_rewards(self):
         if not self.is_calced:
             raise ValueError("Rewards have not been calculated yet, cannot revert.")
 
-        team_logs = TeamLog.objects.filter(
-            description__icontains=f"Match ID: {self.match.id}"
+        team_logs = list(
+            TeamLog.objects.filter(match_id=self.match_id, reward_delta__isnull=False).order_by('id')
+        )
+        teams = Team.objects.in_bulk({log.team_id for log in team_logs})
+        loaded = {team.id: team.reward_state() for team in teams.values()}
+        boosters = Booster.objects.in_bulk(
+            {log.reward_delta['booster']['booster_id'] for log in team_logs if log.reward_delta.get('booster')}
         )
 
+        restored_boosters = []
+        ledger_entries = []
         for log in team_logs:
-            team = log.team
-            current_balance = team.balance
-            current_kits = team.upgrade_kits
-            current_score = team.score
-
-            calc_difference = log.new_value['balance'] - log.previous_value['balance']
-            revert_balance = current_balance - calc_difference
-
-            previous_kits = log.previous_value.get('upgrade_kits', {})
-            new_kits = log.new_value.get('upgrade_kits', {})
-
-            calc_score_difference = log.new_value.get('score', 0) - log.previous_value.get('score', 0)
-            revert_score = current_score - calc_score_difference
-
-            kits_difference = new_kits.get('T1', {}).get('quantity', 0) - previous_kits.get('T1',{}).get('quantity', 0)
-            current_kits['T1']['quantity'] -= kits_difference
-
-            prev_booster = log.previous_value.get('booster')
-            new_booster = log.new_value.get('booster')
-            if prev_booster and new_booster:
-                try:
-                    booster = Booster.objects.get(id=prev_booster['booster_id'], team=team)
-                    booster.matches_left = prev_booster['matches_left']
-                    booster.save()
-                except Booster.DoesNotExist:
-                    pass
-
-            team.balance = revert_balance
-            team.upgrade_kits = current_kits
-            team.score = revert_score
-            team.total_money_earned -= calc_difference
-            team.save()
+            team = teams[log.team_id]
+            delta = log.reward_delta
+
+            # Each step is truncated like the integer columns it is stored in.
+            balance, score = team.balance, team.score
+            team.balance = int(team.balance - delta['balance'])
+            team.score = int(team.score - delta['score'])
+            team.total_money_earned = int(team.total_money_earned - delta['balance'])
+            for tier, difference in delta['kits'].items():
+                team.upgrade_kits[tier]['quantity'] -= difference
+            ledger_entries.append(LedgerEntry(
+                team_id=team.id, reason=LedgerEntry.REWARD_REVERT, match_id=self.match_id,
+                amount=team.balance - balance, score=team.score - score,
+                kits={tier: -difference for tier, difference in delta['kits'].items()},
+            ))
+
+            previous_booster = delta.get('booster')
+            booster = boosters.get(previous_booster['booster_id']) if previous_booster else None
+            if booster and booster.team_id == team.id:
+                booster.matches_left = previous_booster['matches_left']
+                restored_boosters.append(booster)
 
             log.previous_value = {'balance': 0, 'score': 0}
             log.new_value = {'balance': 0, 'score': 0}
             log.description = f"Balance Changed by: 0\n" \
-                              f"\nReverted rewards calculation for Match ID: {self.match.id}."
+                              f"\nReverted rewards calculation for Match ID: {self.match_id}."
             log.method_name = 'revert_rewards'
-            log.save()
+            log.reward_delta = None
+            log.archive = None
+
+        Team.write_changes({team.id: (loaded[team.id], team.reward_state()) for team in teams.values()})
+        record_ledger_batch(ledger_entries)
+        Booster.objects.bulk_update(restored_boosters, ['matches_left'])
+        TeamLog.objects.bulk_update(
+            team_logs, ['previous_value', 'new_value', 'description', 'method_name', 'reward_delta', 'archive']
+        )
+        invalidate(Team, Booster, TeamLog)
 
         self.is_calced = False
         self.save()
@@ -1845,15 +1355,133 @@ class TeamLog(models.Model):
     team = models.ForeignKey('Team', on_delete=models.CASCADE)
     user = models.CharField(max_length=255, blank=True, null=True)
     field_name = models.CharField(max_length=255)
-    previous_value = models.JSONField()
-    new_value = models.JSONField()
+    previous_value = models.JSONField(null=True, blank=True)
+    new_value = models.JSONField(null=True, blank=True)
     description = models.TextField()
     method_name = models.CharField(max_length=255, db_index=True)
     timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    match = models.ForeignKey('Match', on_delete=models.SET_NULL, null=True, blank=True, related_name='team_logs')
+    reward_delta = models.JSONField(null=True, blank=True)
+    changes = models.JSONField(
+        null=True, blank=True, help_text="Money deltas, kit differences and added/removed tank ids of a team method."
+    )
+    archive = models.BinaryField(
+        null=True, blank=True, editable=False, help_text="Compressed previous/new values of an archived log."
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['team', '-timestamp', '-id'], name='teamlog_team_time'),
+        ]
 
     def __str__(self):
         return f"{self.method_name} for {self.team.name}"
 
+    def payload(self):
+        """The previous and new values, read back from the archive once the log has been archived."""
+        if self.previous_value is None and self.archive is not None:
+            return tuple(unpack_log(self.archive))
+        return self.previous_value, self.new_value
+
+
+class LedgerEntry(models.Model):
+    OPENING = 'opening'
+    ADJUSTMENT = 'adjustment'
+    MATCH_REWARD = 'match_reward'
+    SUBSTITUTE_REWARD = 'substitute_reward'
+    JUDGE_REWARD = 'judge_reward'
+    REWARD_REVERT = 'reward_revert'
+    CHANGE_REVERT = 'change_revert'
+    TANK_PURCHASE = 'tank_purchase'
+    TANK_SALE = 'tank_sale'
+    TANK_UPGRADE = 'tank_upgrade'
+    BOX_PURCHASE = 'box_purchase'
+    IMPORT_PURCHASE = 'import_purchase'
+    TRANSFER_OUT = 'transfer_out'
+    TRANSFER_IN = 'transfer_in'
+    KIT_TRANSFER_OUT = 'kit_transfer_out'
+    KIT_TRANSFER_IN = 'kit_transfer_in'
+    KIT_EXCHANGE = 'kit_exchange'
+    KIT_GRANT = 'kit_grant'
+
+    REASON_CHOICES = [
+        (OPENING, 'Opening Balance'),
+        (ADJUSTMENT, 'Manual Adjustment'),
+        (MATCH_REWARD, 'Match Reward'),
+        (SUBSTITUTE_REWARD, 'Substitute Reward'),
+        (JUDGE_REWARD, 'Judge Reward'),
+        (REWARD_REVERT, 'Reward Reverted'),
+        (CHANGE_REVERT, 'Change Reverted'),
+        (TANK_PURCHASE, 'Tank Purchase'),
+        (TANK_SALE, 'Tank Sale'),
+        (TANK_UPGRADE, 'Tank Upgrade'),
+        (BOX_PURCHASE, 'Box Purchase'),
+        (IMPORT_PURCHASE, 'Import Purchase'),
+        (TRANSFER_OUT, 'Money Sent'),
+        (TRANSFER_IN, 'Money Received'),
+        (KIT_TRANSFER_OUT, 'Kits Sent'),
+        (KIT_TRANSFER_IN, 'Kits Received'),
+        (KIT_EXCHANGE, 'Kit Split/Merge'),
+        (KIT_GRANT, 'Kits Granted'),
+    ]
+
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='ledger_entries')
+    timestamp = models.DateTimeField(default=now)
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    amount = models.IntegerField(default=0)
+    score = models.IntegerField(default=0)
+    kits = models.JSONField(default=dict, blank=True)
+    balance_after = models.IntegerField()
+    score_after = models.IntegerField()
+    match = models.ForeignKey(Match, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries')
+    tank = models.ForeignKey(Tank, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries')
+    box = models.ForeignKey(TankBox, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['team', 'timestamp'], name='ledger_team_time'),
+            models.Index(fields=['team', 'reason', 'timestamp'], name='ledger_team_reason_time'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_reason_display()} for {self.team.name}: {self.amount}"
+
+
+class WeeklyQuota(models.Model):
+    MATCHES = 'matches'
+    TRAD_DOM = 'trad_dom'
+    MONEY_TRANSFERS = 'money_transfers'
+    ALLIANCE_KITS = 'alliance_kits'
+
+    KIND_CHOICES = [
+        (MATCHES, 'Matches'),
+        (TRAD_DOM, 'Traditional/Domination Matches'),
+        (MONEY_TRANSFERS, 'Money Transfers'),
+        (ALLIANCE_KITS, 'Alliance Kits Sent'),
+    ]
+
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='weekly_quotas')
+    week = models.DateField(help_text="Monday of the week the counter covers.")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['team', 'week', 'kind'], name='unique_weekly_quota'),
+        ]
+
+    def __str__(self):
+        return f"{self.team.name} {self.kind} for week of {self.week}: {self.count}"
+
+
+class ModelVersion(models.Model):
+    """The version stamp of a model, changed whenever a committed write touches it. See versioning.py."""
+    label = models.CharField(max_length=100, unique=True)
+    version = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.label}: {self.version}"
+
 
 def default_expiry_date():
     return now() + timedelta(days=7)
@@ -1879,8 +1507,7 @@ class ImportTank(models.Model):
 
     @transaction.atomic
     def purchase_from_imports(self, team, user):
-        import_tank = ImportTank.objects.select_for_update().get(pk=self.pk)
-        team = Team.objects.select_for_update().get(pk=team.pk)
+        import_tank = self
 
         team.check_tank_limit(import_tank.tank)
 
@@ -1892,7 +1519,7 @@ class ImportTank(models.Model):
 
         tank_price = max(import_tank.tank.price - import_tank.tank.price * (import_tank.discount / 100), 0)
 
-        if team.manufacturers.filter(id__in=import_tank.tank.manufacturers.all()).exists():
+        if team.is_native(import_tank.tank):
             if import_tank.tank.battle_rating <= 3.7:
                 tank_price = 0.8 * tank_price
             else:
@@ -1906,19 +1533,22 @@ class ImportTank(models.Model):
         if tank_price > team.balance:
             raise ValidationError("Insufficient balance to purchase this tank.")
 
-        team.balance -= tank_price
-        team.total_money_spent += tank_price
+        # Claiming the import and charging the team are both conditional updates, so two buyers
+        # racing for the same import cannot both get it and neither has to lock the other out.
+        if not ImportTank.objects.filter(pk=import_tank.pk, is_purchased=False).update(is_purchased=True):
+            raise ValidationError("This tank has already been purchased.")
         import_tank.is_purchased = True
-        import_tank.save()
-        team.save()
+
+        if not team.adjust(LedgerEntry.IMPORT_PURCHASE, tank=import_tank.tank, balance=-tank_price, spent=tank_price):
+            raise ValidationError("Insufficient balance to purchase this tank.")
 
         TeamTank.objects.create(team=team, tank=import_tank.tank)
 
-        TeamLog.objects.create(
+        queue_log(
             team=team,
             user=user,
             field_name='balance',
-            previous_value={'balance': team.balance + tank_price},
+            previous_value={'balance': team.balance + math.floor(tank_price)},
             new_value={'balance': team.balance},
             description=f"Changes made by method: imports_purchase\nBalance Changed by: {tank_price}\nTanks Added: {str(import_tank.tank)}",
             method_name='imports_purchase',
@@ -1986,43 +1616,3 @@ class Interchange(models.Model):
     def __str__(self):
         arrow = "<->" if self.is_bidirectional else "->"
         return f"{self.from_tank} {arrow} {self.to_tank}"
-
-
-def get_interchange_graph(start_tank_name):
-    try:
-        start_tank = Tank.objects.get(name=start_tank_name)
-    except Tank.DoesNotExist:
-        return []
-
-    visited_tank_ids = set()
-    collected_edges = set()
-    results = []
-
-    queue = deque([start_tank])
-    visited_tank_ids.add(start_tank.id)
-
-    while queue:
-        current_tank = queue.popleft()
-
-        outgoing = Interchange.objects.filter(from_tank=current_tank)
-        incoming = Interchange.objects.filter(to_tank=current_tank)
-
-        for edge in outgoing:
-            if edge.id not in collected_edges:
-                collected_edges.add(edge.id)
-                results.append(edge)
-
-            if edge.to_tank.id not in visited_tank_ids:
-                visited_tank_ids.add(edge.to_tank.id)
-                queue.append(edge.to_tank)
-
-        for edge in incoming:
-            if edge.id not in collected_edges:
-                collected_edges.add(edge.id)
-                results.append(edge)
-
-            if edge.from_tank.id not in visited_tank_ids:
-                visited_tank_ids.add(edge.from_tank.id)
-                queue.append(edge.from_tank)
-
-    return results
\ No newline at end of file
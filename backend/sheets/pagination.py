@@ -0,0 +1,9 @@
+from rest_framework.pagination import CursorPagination
+
+
+class TeamLogCursorPagination(CursorPagination):
+    """Keyset pages over the (team, timestamp, id) index, newest first."""
+    ordering = ('-timestamp', '-id')
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 500
@@ -0,0 +1,119 @@
+import time
+
+from django.db import transaction
+from django.db.models import Q
+
+from .versioning import invalidate
+
+RANK_BASED_UPGRADE_COSTS = {
+    1: 3500,
+    2: 7500,
+    3: 10000,
+    4: 15000,
+    5: 20000
+}
+
+NATIONAL_BOX_MARKUP = 1.30
+
+
+def upgrade_cost(from_price, to_price, to_rank):
+    price_difference = to_price - from_price
+    if price_difference == 0:
+        return RANK_BASED_UPGRADE_COSTS.get(to_rank, 0)
+    if from_price > to_price:
+        return int(abs(price_difference / 2))
+    return abs(price_difference)
+
+
+def box_price(tank_prices, is_national):
+    mean_price = sum(tank_prices) / len(tank_prices) if tank_prices else 0
+    if is_national:
+        return int(mean_price * NATIONAL_BOX_MARKUP)
+    return int(mean_price)
+
+
+def recalculate_costs(tank_ids):
+    """
+    Recompute the cost of every upgrade path and the price of every box touching the given tanks.
+
+    Reads everything with two queries and writes only the rows whose value changed.
+    Returns the number of upgrade paths and boxes updated.
+    """
+    from .models import UpgradePath, TankBox
+
+    tank_ids = list(tank_ids)
+    if not tank_ids:
+        return 0, 0
+
+    paths = UpgradePath.objects.filter(
+        Q(from_tank_id__in=tank_ids) | Q(to_tank_id__in=tank_ids)
+    ).values_list('id', 'cost', 'from_tank__price', 'to_tank__price', 'to_tank__rank')
+
+    changed_paths = []
+    for path_id, cost, from_price, to_price, to_rank in paths:
+        new_cost = upgrade_cost(from_price, to_price, to_rank)
+        if new_cost != cost:
+            changed_paths.append(UpgradePath(id=path_id, cost=new_cost))
+
+    box_links = TankBox.tanks.through.objects.filter(
+        tankbox_id__in=TankBox.tanks.through.objects.filter(tank_id__in=tank_ids).values('tankbox_id')
+    ).values_list('tankbox_id', 'tankbox__price', 'tankbox__is_national', 'tank__price')
+
+    boxes = {}
+    for box_id, price, is_national, tank_price in box_links:
+        boxes.setdefault(box_id, (price, is_national, []))[2].append(tank_price)
+
+    changed_boxes = []
+    for box_id, (price, is_national, tank_prices) in boxes.items():
+        new_price = box_price(tank_prices, is_national)
+        if new_price != price:
+            changed_boxes.append(TankBox(id=box_id, price=new_price))
+
+    UpgradePath.objects.bulk_update(changed_paths, ['cost'], batch_size=500)
+    TankBox.objects.bulk_update(changed_boxes, ['price'], batch_size=500)
+
+    if changed_paths:
+        invalidate(UpgradePath)
+    if changed_boxes:
+        invalidate(TankBox)
+
+    return len(changed_paths), len(changed_boxes)
+
+
+def rebalance_prices(prices):
+    """
+    Apply a whole price sheet, mapping tank names to their new price, in one transaction.
+
+    Unknown tank names abort the rebalance before anything is written.
+    """
+    from .models import Tank
+
+    start = time.perf_counter()
+    prices = {name.strip(): int(price) for name, price in prices.items()}
+
+    with transaction.atomic():
+        tanks = list(Tank.objects.filter(name__in=prices.keys()).only('id', 'name', 'price'))
+
+        unknown = set(prices) - {tank.name for tank in tanks}
+        if unknown:
+            raise ValueError(f"Unknown tanks in price sheet: {', '.join(sorted(unknown))}")
+
+        changed_tanks = []
+        for tank in tanks:
+            if tank.price != prices[tank.name]:
+                tank.price = prices[tank.name]
+                changed_tanks.append(tank)
+
+        Tank.objects.bulk_update(changed_tanks, ['price'], batch_size=500)
+        if changed_tanks:
+            invalidate(Tank)
+
+        paths_updated, boxes_updated = recalculate_costs(tank.id for tank in changed_tanks)
+
+    return {
+        'tanks_in_sheet': len(prices),
+        'tanks_updated': len(changed_tanks),
+        'upgrade_paths_updated': paths_updated,
+        'boxes_updated': boxes_updated,
+        'duration_ms': round((time.perf_counter() - start) * 1000, 2),
+    }
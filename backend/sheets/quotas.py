@@ -0,0 +1,148 @@
+from datetime import datetime, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.timezone import is_aware, localtime, now
+
+from .teamlogs import unpack
+from .versioning import invalidate
+
+MATCHES_PER_WEEK = 6
+MONEY_TRANSFERS_PER_WEEK = 1
+ALLIANCE_KITS_PER_WEEK = 2
+
+
+def week_start(value=None):
+    """Monday of the week containing ``value``, in the same local date the ``datetime__date`` lookups use."""
+    if value is None:
+        value = now()
+    if isinstance(value, datetime):
+        value = localtime(value).date() if is_aware(value) else value.date()
+    return value - timedelta(days=value.weekday())
+
+
+def match_kinds(mode, gamemode, was_played):
+    """The weekly counters a team's entry in a match adds to."""
+    from .models import WeeklyQuota
+
+    kinds = [WeeklyQuota.MATCHES]
+    if was_played and (mode == 'traditional' or gamemode == 'domination'):
+        kinds.append(WeeklyQuota.TRAD_DOM)
+    return tuple(kinds)
+
+
+def match_quota_key(match):
+    return week_start(match.datetime), match_kinds(match.mode, match.gamemode, match.was_played)
+
+
+def used(team, kind, when=None):
+    from .models import WeeklyQuota
+
+    team_id = getattr(team, 'pk', team)
+    return WeeklyQuota.objects.filter(team_id=team_id, week=week_start(when), kind=kind).values_list(
+        'count', flat=True
+    ).first() or 0
+
+
+def add(team_id, kind, week, amount):
+    """Move a counter by ``amount``, creating it on the first increment."""
+    from .models import WeeklyQuota
+
+    counter = WeeklyQuota.objects.filter(team_id=team_id, week=week, kind=kind)
+    if counter.update(count=F('count') + amount) or amount <= 0:
+        # Decrements never create rows, so a team being deleted cannot get its counters back mid-cascade.
+        return
+    try:
+        with transaction.atomic():
+            WeeklyQuota.objects.create(team_id=team_id, week=week, kind=kind, count=amount)
+    except IntegrityError:
+        counter.update(count=F('count') + amount)
+
+
+def consume(team, kind, limit, amount=1, when=None):
+    """Take ``amount`` from a team's weekly allowance, or return False if that would go over ``limit``."""
+    from .models import WeeklyQuota
+
+    team_id = getattr(team, 'pk', team)
+    week = week_start(when)
+    if amount > limit:
+        return False
+
+    WeeklyQuota.objects.get_or_create(team_id=team_id, week=week, kind=kind)
+    return bool(WeeklyQuota.objects.filter(
+        team_id=team_id, week=week, kind=kind, count__lte=limit - amount
+    ).update(count=F('count') + amount))
+
+
+def count_team_match(team_match, sign):
+    from .models import Match
+
+    try:
+        match = team_match.match
+    except Match.DoesNotExist:
+        return
+    week, kinds = match_quota_key(match)
+    for kind in kinds:
+        add(team_match.team_id, kind, week, sign)
+
+
+def move_match(match_id, old_key, new_key):
+    """Re-file every team in a match after its date, mode or played flag changed."""
+    from .models import TeamMatch
+
+    team_ids = list(TeamMatch.objects.filter(match_id=match_id).values_list('team_id', flat=True))
+    (old_week, old_kinds), (new_week, new_kinds) = old_key, new_key
+    for team_id in team_ids:
+        for kind in old_kinds:
+            add(team_id, kind, old_week, -1)
+        for kind in new_kinds:
+            add(team_id, kind, new_week, 1)
+
+
+def rebuild_weekly_quotas():
+    """
+    Recount every weekly counter from the match history and the transfer logs.
+
+    Returns the number of counters written per kind.
+    """
+    from .models import WeeklyQuota, TeamMatch, TeamLog
+
+    counts = {}
+
+    for team_id, match_datetime, mode, gamemode, was_played in TeamMatch.objects.values_list(
+        'team_id', 'match__datetime', 'match__mode', 'match__gamemode', 'match__was_played'
+    ).iterator(chunk_size=2000):
+        week = week_start(match_datetime)
+        for kind in match_kinds(mode, gamemode, was_played):
+            counts[team_id, week, kind] = counts.get((team_id, week, kind), 0) + 1
+
+    # Alliance kit transfers are logged under the money transfer method name, on the kits field.
+    for team_id, field_name, timestamp, previous_value, new_value, archive in TeamLog.objects.filter(
+        method_name='money_transfer_out'
+    ).values_list(
+        'team_id', 'field_name', 'timestamp', 'previous_value', 'new_value', 'archive'
+    ).iterator(chunk_size=2000):
+        if previous_value is None and archive is not None:
+            previous_value, new_value = unpack(archive)
+        week = week_start(timestamp)
+        if field_name == 'upgrade_kits':
+            kind = WeeklyQuota.ALLIANCE_KITS
+            amount = previous_value.get('quantity', 0) - new_value.get('quantity', 0)
+        else:
+            kind = WeeklyQuota.MONEY_TRANSFERS
+            amount = 1
+        counts[team_id, week, kind] = counts.get((team_id, week, kind), 0) + amount
+
+    with transaction.atomic():
+        WeeklyQuota.objects.all().delete()
+        WeeklyQuota.objects.bulk_create(
+            [WeeklyQuota(team_id=team_id, week=week, kind=kind, count=count)
+             for (team_id, week, kind), count in counts.items()],
+            batch_size=1000,
+        )
+        invalidate(WeeklyQuota)
+
+    written = {kind: 0 for kind, _ in WeeklyQuota.KIND_CHOICES}
+    for _, _, kind in counts:
+        written[kind] += 1
+    return written
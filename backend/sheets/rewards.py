@@ -0,0 +1,887 @@
+import copy
+import hashlib
+import time
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime
+from typing import Optional
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.utils.timezone import now
+
+from .ledger import REWARD_REASONS, record_batch
+from .quotas import week_start
+from .versioning import get_versions, invalidate
+
+ADVANCED_REWARDS = [
+    {"rank": 1, "winner": 20000, "loser": 15000},
+    {"rank": 2, "winner": 40000, "loser": 30000},
+    {"rank": 3, "winner": 60000, "loser": 45000},
+    {"rank": 4, "winner": 80000, "loser": 60000},
+    {"rank": 5, "winner": 100000, "loser": 75000},
+]
+
+FLAG_REWARDS = [
+    {"rank": 1, "winner": 35000, "loser": 15000},
+    {"rank": 2, "winner": 60000, "loser": 25000},
+    {"rank": 3, "winner": 85000, "loser": 40000},
+    {"rank": 4, "winner": 110000, "loser": 50000},
+    {"rank": 5, "winner": 150000, "loser": 70000},
+]
+
+TRAD_BO5_REWARDS = [
+    {"rank": 1, "winner": 20000, "loser": 15000},
+    {"rank": 2, "winner": 40000, "loser": 30000},
+    {"rank": 3, "winner": 55000, "loser": 40000},
+    {"rank": 4, "winner": 75000, "loser": 55000},
+    {"rank": 5, "winner": 95000, "loser": 70000},
+]
+
+TRAD_BO3_REWARDS = [
+    {"rank": 1, "winner": 15000, "loser": 12000},
+    {"rank": 2, "winner": 30000, "loser": 23000},
+    {"rank": 3, "winner": 45000, "loser": 34000},
+    {"rank": 4, "winner": 60000, "loser": 45000},
+    {"rank": 5, "winner": 75000, "loser": 56000},
+]
+
+ROUND_POINTS = {
+    "1:0": 4,
+    "0:0": 3,
+    "0:1": 2,
+    "2:0": 7,
+    "2:1": 6,
+    "1:1": 5,
+    "1:2": 4,
+    "0:2": 3,
+    "3:0": 10,
+    "3:1": 9,
+    "3:2": 8,
+    "2:2": 7,
+    "2:3": 6,
+    "1:3": 5,
+    "0:3": 4
+}
+
+NO_SHOW_PENALTY = 20000
+
+# Every model load_reward_inputs reads; a preview stays valid until one of them changes.
+REWARD_INPUT_MODELS = (
+    'sheets.match', 'sheets.teammatch', 'sheets.teammatch_tanks', 'sheets.matchresult', 'sheets.teamresult',
+    'sheets.substitute', 'sheets.tanklost', 'sheets.tank', 'sheets.team', 'sheets.booster', 'sheets.bounty',
+    'sheets.matchrewardrates', 'sheets.weeklyquota',
+)
+PREVIEW_CACHE_KEY = 'sheets:reward-preview:{}:{}'
+# Booster expiry depends on the clock rather than on any row, so previews also age out.
+PREVIEW_TIMEOUT = 300
+
+
+def weighted_average_rank(tanks):
+    """BR-weighted average rank of the distinct (rank, battle_rating) tanks lost in a match."""
+    tanks = list(tanks)
+    total_rank_br = sum(rank * battle_rating for rank, battle_rating in tanks)
+    total_br = sum(battle_rating for _, battle_rating in tanks)
+
+    if total_br > 0:
+        average_rank = total_rank_br / total_br
+    else:
+        average_rank = 0
+
+    return round(average_rank)
+
+
+def base_rewards(mode, gamemode, best_of, average_rank):
+    if mode == "traditional":
+        table = TRAD_BO5_REWARDS if best_of == 5 else TRAD_BO3_REWARDS
+    elif mode == "advanced" or mode == "evolved":
+        table = FLAG_REWARDS if gamemode == "flag_tank" else ADVANCED_REWARDS
+    else:
+        return 0, 0
+
+    row = table[min(int(round(average_rank) - 1), 4)]
+    return row["winner"], row["loser"]
+
+
+def reward_delta(previous_value, new_value):
+    """What a reward log changed, in the form revert_rewards subtracts back out."""
+    previous_kits = previous_value.get('upgrade_kits', {})
+    new_kits = new_value.get('upgrade_kits', {})
+    kits = {
+        tier: new_kits.get(tier, {}).get('quantity', 0) - data.get('quantity', 0)
+        for tier, data in previous_kits.items()
+    }
+    booster = previous_value.get('booster') if new_value.get('booster') else None
+
+    return {
+        'balance': new_value['balance'] - previous_value['balance'],
+        'score': new_value.get('score', 0) - previous_value.get('score', 0),
+        'kits': {tier: difference for tier, difference in kits.items() if difference},
+        'booster': booster,
+    }
+
+
+@dataclass(frozen=True)
+class TeamState:
+    id: int
+    name: str
+    balance: int
+    score: int
+    total_money_earned: int
+    upgrade_kits: dict
+    alliance_id: Optional[int]
+    active_bounty: Optional[int]
+    version: int
+
+
+@dataclass(frozen=True)
+class BoosterState:
+    id: int
+    multiplier: float
+    expires_at: Optional[datetime]
+    match_limited: bool
+    matches_left: Optional[int]
+    active: bool
+
+
+@dataclass(frozen=True)
+class SideEntry:
+    team_id: int
+    side: str
+    tank_count: int
+
+
+@dataclass(frozen=True)
+class TeamResultEntry:
+    team_id: int
+    bonuses: Optional[float]
+    penalties: Optional[float]
+    was_present: bool
+
+
+@dataclass(frozen=True)
+class SubstituteEntry:
+    team_id: int
+    activity: int
+    team_played_for_id: Optional[int]
+
+
+@dataclass(frozen=True)
+class TankLostEntry:
+    team_id: int
+    tank_id: int
+    price: int
+    rank: int
+    battle_rating: float
+    quantity: int
+
+
+@dataclass(frozen=True)
+class RewardInputs:
+    """Everything a reward calculation reads, loaded up front by load_reward_inputs."""
+    match_id: int
+    match_label: str
+    mode: str
+    gamemode: str
+    best_of_number: int
+    money_rules: str
+    is_bounty: bool
+    winning_side: str
+    round_score: str
+    judge_id: Optional[int]
+    judge_is_test: bool
+    rates: dict
+    sides: tuple
+    team_results: tuple
+    substitutes: tuple
+    tanks_lost: tuple
+    teams: dict
+    boosters: dict
+    trad_dom_matches: dict
+    calculated_at: datetime
+
+
+@dataclass
+class RewardOutcome:
+    """The writes a reward calculation wants applied, in the order they happened."""
+    teams: dict = field(default_factory=dict)
+    loaded_teams: dict = field(default_factory=dict)
+    logs: list = field(default_factory=list)
+    booster_matches_left: dict = field(default_factory=dict)
+    deleted_booster_ids: list = field(default_factory=list)
+    clear_reverted_logs: bool = False
+    summary: Optional[dict] = None
+
+
+class RewardCatalog:
+    """Everything needed to calculate a batch of match results, loaded with a fixed number of queries."""
+
+    RATE_FIELDS = [
+        'even_split_kill_reward', 'even_split_repair_cost', 'money_rule_kill_reward',
+        'money_rule_repair_cost', 'no_rule_kill_reward', 'no_rule_repair_cost',
+    ]
+
+    def __init__(self, match_results):
+        from .models import TeamMatch, TeamResult, Substitute, TankLost, Team, Booster, Bounty, \
+            MatchRewardRates, WeeklyQuota
+
+        match_results = list(match_results)
+        match_ids = [match_result.match_id for match_result in match_results]
+        result_ids = [match_result.id for match_result in match_results]
+
+        self.sides = {match_id: [] for match_id in match_ids}
+        for match_id, team_id, side, tank_count in TeamMatch.objects.filter(match_id__in=match_ids).annotate(
+            tank_count=Count('tanks')
+        ).order_by('id').values_list('match_id', 'team_id', 'side', 'tank_count'):
+            self.sides[match_id].append(SideEntry(team_id, side, tank_count))
+
+        self.team_results = self._group(
+            TeamResult.objects.filter(match_result_id__in=result_ids).values_list(
+                'match_result_id', 'team_id', 'bonuses', 'penalties', 'was_present'
+            ), TeamResultEntry, result_ids
+        )
+        self.substitutes = self._group(
+            Substitute.objects.filter(match_result_id__in=result_ids).values_list(
+                'match_result_id', 'team_id', 'activity', 'team_played_for_id'
+            ), SubstituteEntry, result_ids
+        )
+        self.tanks_lost = self._group(
+            TankLost.objects.filter(match_result_id__in=result_ids).values_list(
+                'match_result_id', 'team_id', 'tank_id', 'tank__price', 'tank__rank', 'tank__battle_rating', 'quantity'
+            ), TankLostEntry, result_ids
+        )
+
+        rates = MatchRewardRates.objects.first() or MatchRewardRates()
+        self.rates = {name: getattr(rates, name) for name in self.RATE_FIELDS}
+
+        side_team_ids = {entry.team_id for entries in self.sides.values() for entry in entries}
+        team_ids = set(side_team_ids)
+        for match_result in match_results:
+            team_ids.update(entry.team_id for entry in self.team_results[match_result.id])
+            team_ids.update(sub.team_id for sub in self.substitutes[match_result.id])
+            if match_result.judge_id:
+                team_ids.add(match_result.judge_id)
+
+        active_bounties = {}
+        for team_id, value in Bounty.objects.filter(team_id__in=team_ids, is_active=True).order_by('id').values_list(
+            'team_id', 'value'
+        ):
+            active_bounties.setdefault(team_id, value)
+
+        self.teams = {
+            team_id: TeamState(
+                team_id, name, balance, score, total_money_earned, upgrade_kits, alliance_id,
+                active_bounties.get(team_id), version,
+            )
+            for team_id, name, balance, score, total_money_earned, upgrade_kits, alliance_id, version in
+            Team.objects.filter(id__in=team_ids).values_list(
+                'id', 'name', 'balance', 'score', 'total_money_earned', 'upgrade_kits', 'alliance_id', 'version'
+            )
+        }
+
+        self.boosters = {
+            booster.team_id: BoosterState(
+                booster.id, booster.multiplier, booster.expires_at, booster.match_limited, booster.matches_left,
+                booster.active,
+            )
+            for booster in Booster.objects.filter(team_id__in=side_team_ids)
+        }
+
+        weeks = {match_result.id: week_start(match_result.match.datetime) for match_result in match_results}
+        counts = {}
+        for team_id, week, count in WeeklyQuota.objects.filter(
+            kind=WeeklyQuota.TRAD_DOM, week__in=set(weeks.values()), team_id__in=side_team_ids
+        ).values_list('team_id', 'week', 'count'):
+            counts.setdefault(week, {})[team_id] = count
+        self.trad_dom_matches = {result_id: counts.get(week, {}) for result_id, week in weeks.items()}
+
+    @staticmethod
+    def _group(rows, entry_class, keys):
+        grouped = {key: [] for key in keys}
+        for key, *values in rows.order_by('id'):
+            grouped[key].append(entry_class(*values))
+        return grouped
+
+    def inputs_for(self, match_result):
+        match = match_result.match
+        sides = tuple(self.sides[match.id])
+
+        teams_by_side = {'team_1': [], 'team_2': []}
+        for entry in sides:
+            teams_by_side[entry.side].append(self.teams[entry.team_id].name)
+
+        return RewardInputs(
+            match_id=match.id,
+            match_label=match.label(teams_by_side),
+            mode=match.mode,
+            gamemode=match.gamemode,
+            best_of_number=match.best_of_number,
+            money_rules=match.money_rules,
+            is_bounty=match.is_bounty,
+            winning_side=match_result.winning_side,
+            round_score=match_result.round_score,
+            judge_id=match_result.judge_id,
+            judge_is_test=match_result.judge_is_test,
+            rates=self.rates,
+            sides=sides,
+            team_results=tuple(self.team_results[match_result.id]),
+            substitutes=tuple(self.substitutes[match_result.id]),
+            tanks_lost=tuple(self.tanks_lost[match_result.id]),
+            teams=dict(self.teams),
+            boosters=dict(self.boosters),
+            trad_dom_matches=self.trad_dom_matches[match_result.id],
+            calculated_at=now(),
+        )
+
+    def record(self, outcome):
+        for team_id, values in outcome.teams.items():
+            values = copy.deepcopy(values)
+            # the integer columns truncate on save, later results must see the stored values
+            for field in ('balance', 'score', 'total_money_earned'):
+                values[field] = int(values[field])
+            self.teams[team_id] = replace(self.teams[team_id], **values)
+
+        for team_id, booster in list(self.boosters.items()):
+            if booster.id in outcome.deleted_booster_ids:
+                del self.boosters[team_id]
+            elif booster.id in outcome.booster_matches_left:
+                self.boosters[team_id] = replace(booster, matches_left=outcome.booster_matches_left[booster.id])
+
+
+def load_reward_inputs(match_result):
+    return RewardCatalog([match_result]).inputs_for(match_result)
+
+
+def _round_points(round_score, points_score):
+    points = ROUND_POINTS.get(points_score, 0)
+    num_rounds = sum(map(int, round_score.split(':')))
+    win_percentage = int(round_score.split(':')[0]) / num_rounds if num_rounds > 0 else 0
+    return points * (1 + win_percentage)
+
+
+def compute_rewards(inputs):
+    """
+    Work out every balance, score, kit, booster and log change for a match result.
+
+    Pure: reads only ``inputs`` and returns a RewardOutcome for apply_rewards to write.
+    """
+    from .models import compare_upgrade_kits
+
+    outcome = RewardOutcome()
+
+    def team_state(team_id):
+        if team_id not in outcome.teams:
+            team = inputs.teams[team_id]
+            outcome.loaded_teams[team_id] = team
+            outcome.teams[team_id] = {
+                'balance': team.balance,
+                'score': team.score,
+                'total_money_earned': team.total_money_earned,
+                'upgrade_kits': copy.deepcopy(team.upgrade_kits),
+            }
+        return outcome.teams[team_id]
+
+    def log(team_id, previous_value, new_value, description, method_name):
+        outcome.logs.append({
+            'team_id': team_id,
+            'match_id': inputs.match_id,
+            'field_name': 'balance',
+            'previous_value': previous_value,
+            'new_value': new_value,
+            'description': description,
+            'method_name': method_name,
+            'reward_delta': reward_delta(previous_value, new_value),
+        })
+
+    match_lines = f"Match: {inputs.match_label}\nMatch ID: {inputs.match_id}"
+
+    lost_tanks = {tank.tank_id: (tank.rank, tank.battle_rating) for tank in inputs.tanks_lost}
+    average_rank = weighted_average_rank(lost_tanks[tank_id] for tank_id in sorted(lost_tanks))
+    winner_base_reward, loser_base_reward = base_rewards(
+        inputs.mode, inputs.gamemode, inputs.best_of_number, average_rank
+    )
+
+    participating_teams = set(entry.team_id for entry in inputs.sides)
+    playing_teams = set(entry.team_id for entry in inputs.sides)
+    participating_teams.update(sub.team_id for sub in inputs.substitutes)
+    if inputs.judge_id:
+        participating_teams.add(inputs.judge_id)
+
+    team_rewards = {team_id: 0 for team_id in participating_teams}
+
+    teams_on_side = {
+        'team_1': [entry.team_id for entry in inputs.sides if entry.side == 'team_1'],
+        'team_2': [entry.team_id for entry in inputs.sides if entry.side == 'team_2'],
+    }
+
+    for team_result in inputs.team_results:
+        team_id = team_result.team_id
+        side = 'team_1' if team_id in teams_on_side['team_1'] else 'team_2'
+        other_side = 'team_2' if side == 'team_1' else 'team_1'
+
+        if team_result.was_present:
+            continue
+
+        if len(teams_on_side[side]) > 1:
+            balance = inputs.teams[team_id].balance
+            log(team_id, {'balance': balance}, {'balance': balance},
+                f"Balance Changed by: {0}\nNo Show\n{match_lines}", "calc_rewards")
+            participating_teams.remove(team_id)
+            playing_teams.remove(team_id)
+        else:
+            team = team_state(team_id)
+            initial_balance = team['balance']
+            team['balance'] -= NO_SHOW_PENALTY
+            log(team_id, {'balance': initial_balance}, {'balance': team['balance']},
+                f"Balance Changed by: {-NO_SHOW_PENALTY}\nNo Show\n{match_lines}", "calc_rewards")
+
+            for other_team in teams_on_side[other_side]:
+                team = team_state(other_team)
+                initial_balance = team['balance']
+                team['balance'] += NO_SHOW_PENALTY
+                log(other_team, {'balance': initial_balance}, {'balance': team['balance']},
+                    f"Balance Changed by: {NO_SHOW_PENALTY}\nEnemy No Show\n{match_lines}", "calc_rewards")
+
+            return outcome
+
+    winning_side = inputs.winning_side
+    losing_side = 'team_1' if winning_side == 'team_2' else 'team_2'
+    winning_teams = teams_on_side[winning_side]
+    losing_teams = teams_on_side[losing_side]
+
+    team_1_tanks = sum(entry.tank_count for entry in inputs.sides if entry.side == 'team_1')
+    team_2_tanks = sum(entry.tank_count for entry in inputs.sides if entry.side == 'team_2')
+
+    if inputs.mode == "traditional" or inputs.gamemode == "flag_tank":
+        for team in winning_teams:
+            team_rewards[team] += winner_base_reward
+
+        for team in losing_teams:
+            team_rewards[team] += loser_base_reward
+    else:
+        if inputs.money_rules == 'even_split':
+            repair_rate, kill_rate = inputs.rates['even_split_repair_cost'], inputs.rates['even_split_kill_reward']
+        elif inputs.money_rules == 'money_rule':
+            repair_rate, kill_rate = inputs.rates['money_rule_repair_cost'], inputs.rates['money_rule_kill_reward']
+        else:
+            repair_rate, kill_rate = inputs.rates['no_rule_repair_cost'], inputs.rates['no_rule_kill_reward']
+
+        total_loss_penalty = {'team_1': 0, 'team_2': 0}
+        total_gain_reward = {'team_1': 0, 'team_2': 0}
+
+        for tank_lost in inputs.tanks_lost:
+            side = 'team_1' if tank_lost.team_id in teams_on_side['team_1'] else 'team_2'
+            other_side = 'team_2' if side == 'team_1' else 'team_1'
+
+            total_loss_penalty[side] += tank_lost.price * repair_rate * tank_lost.quantity
+            total_gain_reward[other_side] += tank_lost.price * kill_rate * tank_lost.quantity
+
+            if team_1_tanks == 1 and team_2_tanks == 1:
+                total_gain_reward = {'team_1': 0, 'team_2': 0}
+
+        winner_base_reward += total_gain_reward[winning_side] - total_loss_penalty[winning_side]
+        loser_base_reward += total_gain_reward[losing_side] - total_loss_penalty[losing_side]
+
+        winner_total_reward = winner_base_reward
+        loser_total_reward = loser_base_reward
+
+        if inputs.money_rules == "even_split":
+            winner_total_reward = (winner_base_reward + loser_base_reward) / 2
+            loser_total_reward = (winner_base_reward + loser_base_reward) / 2
+
+        for team in winning_teams:
+            team_rewards[team] += winner_total_reward / len(winning_teams)
+
+        for team in losing_teams:
+            team_rewards[team] += loser_total_reward / len(losing_teams)
+
+    used_boosters = {}
+
+    for team in winning_teams + losing_teams:
+        booster = inputs.boosters.get(team)
+        if booster is None or not booster.active:
+            continue
+
+        if booster.expires_at and booster.expires_at < inputs.calculated_at:
+            outcome.deleted_booster_ids.append(booster.id)
+        elif booster.match_limited and (booster.matches_left is None or booster.matches_left <= 0):
+            outcome.deleted_booster_ids.append(booster.id)
+        else:
+            team_rewards[team] *= booster.multiplier
+            if booster.match_limited and booster.matches_left is not None:
+                used_boosters[team] = {
+                    "team_id": team,
+                    "booster_id": booster.id,
+                    "matches_left_before": booster.matches_left,
+                    "matches_left_after": booster.matches_left - 1
+                }
+                outcome.booster_matches_left[booster.id] = booster.matches_left - 1
+
+    for team_result in inputs.team_results:
+        if team_result.bonuses:
+            team_rewards[team_result.team_id] += 10000 * team_result.bonuses
+
+    if inputs.money_rules == "money_rule":
+        for team_id in playing_teams:
+            reward = team_rewards.get(team_id, 0)
+
+            if reward < 0:
+                deficit = abs(reward)
+                team_rewards[team_id] = 0
+
+                if winning_teams:
+                    per_team_deduction = deficit / len(winning_teams)
+
+                    for winner_id in winning_teams:
+                        team_rewards[winner_id] -= per_team_deduction
+
+                        if team_rewards[winner_id] < 0:
+                            deficit += abs(team_rewards[winner_id])
+                            team_rewards[winner_id] = 0
+
+                            remaining_winners = [t for t in winning_teams if team_rewards[t] > 0]
+                            if remaining_winners:
+                                per_team_deduction = deficit / len(remaining_winners)
+
+    for team_result in inputs.team_results:
+        if team_result.penalties:
+            team_rewards[team_result.team_id] -= 10000 * average_rank * team_result.penalties
+
+    for team_id in playing_teams:
+        for sub in inputs.substitutes:
+            if sub.team_played_for_id != team_id:
+                continue
+
+            played_for_alliance = inputs.teams[team_id].alliance_id
+            is_alliance_sub = (
+                    played_for_alliance is not None and
+                    played_for_alliance == inputs.teams[sub.team_id].alliance_id
+            )
+
+            if not is_alliance_sub:
+                reward_pool = team_rewards[team_id]
+                if reward_pool > 0:
+                    cut_amount = reward_pool * (sub.activity * 0.05)
+                    team_rewards[sub.team_id] += cut_amount
+                    team_rewards[team_id] -= cut_amount
+
+    combined_rewards = winner_base_reward + loser_base_reward
+    if len(inputs.tanks_lost) >= 12:
+        judge_reward = 0.075 * combined_rewards
+    else:
+        judge_reward = 0.05 * combined_rewards
+    if inputs.mode == "bo5":
+        judge_reward = max(judge_reward, 7500)
+    else:
+        judge_reward = max(judge_reward, 5000)
+
+    if inputs.judge_id:
+        if inputs.judge_is_test:
+            team_rewards[inputs.judge_id] += judge_reward / 2
+        else:
+            team_rewards[inputs.judge_id] += judge_reward
+
+    reversed_score = ":".join(inputs.round_score.split(':')[::-1])
+    winner_points = _round_points(inputs.round_score, inputs.round_score)
+    loser_points = _round_points(reversed_score, reversed_score)
+
+    for team in winning_teams:
+        team_rewards[team] += winner_points
+
+    for team in losing_teams:
+        team_rewards[team] += loser_points
+
+    outcome.clear_reverted_logs = True
+
+    if inputs.is_bounty:
+        target_team = None
+        challenger_team = None
+
+        for team_id in playing_teams:
+            if inputs.teams[team_id].active_bounty is not None:
+                target_team = team_id
+            else:
+                challenger_team = team_id
+
+        if target_team and challenger_team and challenger_team in winning_teams:
+            team_rewards[challenger_team] += inputs.teams[target_team].active_bounty
+
+    kit_eligible = (
+            (inputs.mode == "traditional" or inputs.gamemode == 'domination') and
+            team_1_tanks >= 3 and
+            team_2_tanks >= 3
+    )
+    sub_team_ids = {sub.team_id for sub in inputs.substitutes}
+
+    for team_id, reward in team_rewards.items():
+        if team_id in winning_teams:
+            total_points = winner_points
+        elif team_id in losing_teams:
+            # Losers score their reversed result but keep the winners' round share.
+            total_points = _round_points(inputs.round_score, reversed_score)
+        else:
+            total_points = 0
+
+        team = team_state(team_id)
+        initial_balance = team['balance']
+        initial_points = team['score']
+
+        team['balance'] += reward
+        team['score'] += total_points
+        team['total_money_earned'] += reward
+        if team_id in playing_teams:
+            kits = copy.deepcopy(team['upgrade_kits'])
+            if kit_eligible and inputs.trad_dom_matches.get(team_id, 0) <= 2:
+                team['upgrade_kits']['T1']['quantity'] += 1
+
+        if team_id in playing_teams:
+            log_method = "calc_rewards"
+        elif team_id == inputs.judge_id and team_id in sub_team_ids:
+            log_method = "judge_and_sub_rewards"
+        elif team_id in sub_team_ids:
+            log_method = "sub_rewards"
+        else:
+            log_method = "judge_rewards"
+
+        booster_log_data = used_boosters.get(team_id)
+        if booster_log_data:
+            previous_booster = {
+                "booster_id": booster_log_data["booster_id"],
+                "matches_left": booster_log_data["matches_left_before"]
+            }
+            new_booster = {
+                "booster_id": booster_log_data["booster_id"],
+                "matches_left": booster_log_data["matches_left_after"]
+            }
+        else:
+            previous_booster = None
+            new_booster = None
+
+        bounty_line = ""
+        if inputs.is_bounty and team_id in winning_teams and inputs.teams[team_id].active_bounty is None:
+            for loser_id in losing_teams:
+                active_bounty = inputs.teams[loser_id].active_bounty
+                if active_bounty is not None:
+                    bounty_line = f"Bounty Claimed from {inputs.teams[loser_id].name}: {active_bounty}\n"
+                    break
+
+        booster_line = f"Booster: {booster_log_data if booster_log_data else 'None'}"
+        if log_method == 'calc_rewards':
+            log(
+                team_id,
+                {
+                    'balance': initial_balance,
+                    'upgrade_kits': kits,
+                    'score': initial_points,
+                    'booster': previous_booster
+                },
+                {
+                    'balance': team['balance'],
+                    'upgrade_kits': team['upgrade_kits'],
+                    'score': team['score'],
+                    'booster': new_booster
+                },
+                f"Balance Changed by: {reward}\n"
+                f"Kits changed by: {compare_upgrade_kits(kits, team['upgrade_kits'])}\n"
+                f"{bounty_line}"
+                f"{match_lines}\n"
+                f"{booster_line}",
+                log_method,
+            )
+        else:
+            log(
+                team_id,
+                {'balance': initial_balance, 'booster': previous_booster},
+                {'balance': team['balance'], 'booster': new_booster},
+                f"Balance Changed by: {reward}\n"
+                f"{bounty_line}"
+                f"{match_lines}\n"
+                f"{booster_line}",
+                log_method,
+            )
+
+    summary = {
+        "winning_teams": {},
+        "losing_teams": {},
+        "substitutes": {},
+        "judge": {},
+        "total_rewards": 0,
+        "kits": {},
+    }
+
+    for team_id in playing_teams:
+        team = inputs.teams[team_id]
+        # Balances are reported as stored, i.e. truncated by the integer columns.
+        team_data = {
+            "reward": int(team_rewards.get(team_id, 0)),
+            "new_balance": int(outcome.teams[team_id]['balance']),
+            "new_score": int(outcome.teams[team_id]['score']),
+        }
+
+        if team_id in winning_teams:
+            summary["winning_teams"][team.name] = team_data
+        else:
+            summary["losing_teams"][team.name] = team_data
+
+        if kit_eligible and inputs.trad_dom_matches.get(team_id, 0) <= 2:
+            summary["kits"][team.name] = {
+                "T1_kits_received": 1
+            }
+
+    for sub in inputs.substitutes:
+        sub_team_name = inputs.teams[sub.team_id].name
+        sub_reward = int(team_rewards.get(sub.team_id, 0))
+        if sub_team_name not in summary["substitutes"]:
+            summary["substitutes"][sub_team_name] = {"reward": 0}
+        summary["substitutes"][sub_team_name]["reward"] += sub_reward
+
+    if inputs.judge_id:
+        judge_team = inputs.teams[inputs.judge_id]
+        summary["judge"] = {
+            "name": judge_team.name,
+            "reward": int(team_rewards.get(judge_team.id, 0)),
+            "new_balance": judge_team.balance,
+        }
+
+    summary["total_rewards"] = sum(team_rewards.values())
+    outcome.summary = summary
+
+    return outcome
+
+
+def preview_rewards(match_result):
+    """Return the summary calculate_rewards would produce for this result, without writing anything."""
+    versions = get_versions(*REWARD_INPUT_MODELS)
+    key = PREVIEW_CACHE_KEY.format(match_result.pk, hashlib.md5(repr(versions).encode()).hexdigest())
+
+    cached = cache.get(key)
+    if cached is not None:
+        return cached['summary']
+
+    summary = compute_rewards(load_reward_inputs(match_result)).summary
+    cache.set(key, {'summary': summary}, PREVIEW_TIMEOUT)
+    return summary
+
+
+@transaction.atomic
+def apply_reward_batch(calculated, user):
+    """Write the outcomes of (match_result, outcome) pairs, in calculation order, in one transaction."""
+    from .models import Team, Booster, TeamLog, MatchResult, LedgerEntry
+
+    teams = {}
+    loaded_teams = {}
+    booster_matches_left = {}
+    deleted_booster_ids = set()
+    logs = []
+    cleared_match_ids = []
+    for match_result, outcome in calculated:
+        teams.update(outcome.teams)
+        for team_id, team in outcome.loaded_teams.items():
+            loaded_teams.setdefault(team_id, team)
+        booster_matches_left.update(outcome.booster_matches_left)
+        deleted_booster_ids.update(outcome.deleted_booster_ids)
+        logs.extend(outcome.logs)
+        if outcome.clear_reverted_logs:
+            cleared_match_ids.append(match_result.match_id)
+
+    Team.write_changes({team_id: (asdict(loaded_teams[team_id]), values) for team_id, values in teams.items()})
+    record_batch([
+        LedgerEntry(
+            team_id=entry['team_id'], reason=REWARD_REASONS[entry['method_name']], match_id=entry['match_id'],
+            amount=int(entry['new_value']['balance']) - int(entry['previous_value']['balance']),
+            score=int(entry['new_value'].get('score', 0)) - int(entry['previous_value'].get('score', 0)),
+            kits=entry['reward_delta']['kits'],
+        )
+        for entry in logs
+    ])
+
+    if deleted_booster_ids:
+        Booster.objects.filter(id__in=deleted_booster_ids).delete()
+    Booster.objects.bulk_update(
+        [Booster(id=booster_id, matches_left=matches_left)
+         for booster_id, matches_left in booster_matches_left.items() if booster_id not in deleted_booster_ids],
+        ['matches_left'],
+    )
+
+    if cleared_match_ids:
+        TeamLog.objects.filter(match_id__in=cleared_match_ids, method_name='revert_rewards').delete()
+
+    TeamLog.objects.bulk_create([TeamLog(user=user, **entry) for entry in logs], batch_size=500)
+
+    MatchResult.objects.filter(pk__in=[match_result.pk for match_result, _ in calculated]).update(is_calced=True)
+    for match_result, _ in calculated:
+        match_result.is_calced = True
+
+    invalidate(Team, Booster, MatchResult, TeamLog)
+
+
+def apply_rewards(match_result, outcome, user):
+    apply_reward_batch([(match_result, outcome)], user)
+    return outcome.summary
+
+
+def calculate_pending_rewards(user):
+    """
+    Calculate every match result that has not been calculated yet, oldest match first, as one batch.
+
+    A result that fails to calculate is reported and skipped. The batch is calculated again from fresh rows
+    if a team changed before it was written; if writing it fails anyway, every result reports that error.
+    """
+    from .models import MatchResult, StaleTeamError
+
+    started = time.perf_counter()
+    for attempt in range(2):
+        pending = list(
+            MatchResult.objects.filter(is_calced=False, match__isnull=False).select_related('match').order_by(
+                'match__datetime', 'id'
+            )
+        )
+        catalog = RewardCatalog(pending)
+        loaded = time.perf_counter()
+
+        calculated = []
+        results = []
+        for match_result in pending:
+            start = time.perf_counter()
+            try:
+                outcome = compute_rewards(catalog.inputs_for(match_result))
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            else:
+                error = None
+                catalog.record(outcome)
+                calculated.append((match_result, outcome))
+
+            results.append({
+                'match_id': match_result.match_id,
+                'match_datetime': match_result.match.datetime,
+                'error': error,
+                'duration_ms': round((time.perf_counter() - start) * 1000, 2),
+            })
+
+        computed = time.perf_counter()
+        try:
+            apply_reward_batch(calculated, user)
+        except Exception as e:
+            if isinstance(e, StaleTeamError) and attempt == 0:
+                continue
+            for result in results:
+                if result['error'] is None:
+                    result['error'] = f"{type(e).__name__}: {e}"
+            calculated = []
+        break
+
+    finished = time.perf_counter()
+
+    return {
+        'results': results,
+        'calculated': len(calculated),
+        'failed': len(pending) - len(calculated),
+        'load_ms': round((loaded - started) * 1000, 2),
+        'compute_ms': round((computed - loaded) * 1000, 2),
+        'apply_ms': round((finished - computed) * 1000, 2),
+        'total_ms': round((finished - started) * 1000, 2),
+        'notifications': [
+            (match_result.match, outcome.summary) for match_result, outcome in calculated if outcome.summary
+        ],
+    }
@@ -1,9 +1,30 @@
-from django.db.models import Avg, Q, Max
+from django.db.models import Avg, Q, Max, OuterRef, Prefetch, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from rest_framework import serializers
 from .models import Manufacturer, Team, Tank, UpgradePath, TeamTank, Match, TeamMatch, Substitute, MatchResult, \
     TankLost, TeamResult, TankBox, TeamBox, TeamLog, ImportTank, ImportCriteria, UpgradeTree, InterchangeGroup, \
-    Interchange, Alliance
+    Interchange, Alliance, Bounty
+
+
+def active_bounty_map(context):
+    """Every team's active bounty value by team id, loaded once per serializer tree and kept in its context."""
+    if 'active_bounties' not in context:
+        # oldest last, so it is the one that ends up in the map like .first() would pick
+        context['active_bounties'] = dict(
+            Bounty.objects.filter(is_active=True).order_by('-id').values_list('team_id', 'value')
+        )
+    return context['active_bounties']
+
+
+def bounty_value(team, context):
+    return active_bounty_map(context).get(team.id)
+
+
+def highest_non_trad_rank(team_ref):
+    """The highest rank among the non-trad tanks of the team at ``team_ref``, as a subquery."""
+    ranks = TeamTank.objects.filter(team=OuterRef(team_ref), is_trad=False).order_by().values('team')
+    return Coalesce(Subquery(ranks.annotate(max_rank=Max('tank__rank')).values('max_rank')), Value(0))
 
 
 class TankSerializerSlim(serializers.ModelSerializer):
@@ -107,16 +128,62 @@ class TeamTankSerializer(serializers.ModelSerializer):
         model = TeamTank
         fields = ['id', 'tank', 'team', 'is_trad', 'available', 'from_auctions', 'value']
 
-    def get_available(self, obj):
-        team_tanks = TeamTank.objects.filter(team=obj.team)
+    @staticmethod
+    def eager_load(queryset):
+        return queryset.select_related('tank')
 
-        non_trad_tanks = team_tanks.filter(is_trad=False)
-        highest_non_trad_rank = non_trad_tanks.aggregate(max_rank=Max('tank__rank', default=0))['max_rank']
+    def get_available(self, obj):
+        # Worked out once per team and shared through the context, instead of an aggregate per row.
+        ranks = self.context.setdefault('highest_non_trad_rank', {})
+        if obj.team_id not in ranks:
+            ranks[obj.team_id] = TeamTank.objects.filter(team_id=obj.team_id, is_trad=False).aggregate(
+                max_rank=Max('tank__rank', default=0)
+            )['max_rank']
+        highest_non_trad_rank = ranks[obj.team_id]
         if highest_non_trad_rank is not None and obj.tank.rank <= (highest_non_trad_rank + 1):
             return True
         return False
 
 
+def garage_data(team, context):
+    """A team's serialized garage, read in one query or from the view's ``teamtank_set`` prefetch."""
+    if 'teamtank_set' in getattr(team, '_prefetched_objects_cache', {}):
+        team_tanks = team.teamtank_set.all()
+    else:
+        team_tanks = TeamTankSerializer.eager_load(team.teamtank_set.all())
+    highest_non_trad_rank = max(
+        (team_tank.tank.rank for team_tank in team_tanks if not team_tank.is_trad), default=0
+    )
+    if context.get('grouped_garage'):
+        return grouped_garage(team_tanks, highest_non_trad_rank, context.setdefault('tank_catalog', {}))
+    context = {**context, 'highest_non_trad_rank': {team.id: highest_non_trad_rank}}
+    return TeamTankSerializer(team_tanks, many=True, context=context).data
+
+
+def grouped_garage(team_tanks, highest_non_trad_rank, catalog):
+    """A garage keyed by tank id, with the tanks themselves serialized once into the shared ``catalog``."""
+    garage = {}
+    for team_tank in team_tanks:
+        tank = team_tank.tank
+        if tank.id not in catalog:
+            catalog[tank.id] = TankSerializer(tank).data
+        group = garage.setdefault(tank.id, {
+            'count': 0, 'ids': [], 'available': tank.rank <= highest_non_trad_rank + 1,
+        })
+        group['count'] += 1
+        group['ids'].append(team_tank.id)
+        for key, flagged in (
+            ('trad', team_tank.is_trad),
+            ('from_auctions', team_tank.from_auctions),
+            ('not_upgradable', not team_tank.is_upgradable),
+        ):
+            if flagged:
+                group.setdefault(key, []).append(team_tank.id)
+        if team_tank.value != tank.price:
+            group.setdefault('values', {})[team_tank.id] = team_tank.value
+    return garage
+
+
 class TeamSerializer(serializers.ModelSerializer):
     manufacturers = ManufacturerSerializer(many=True, read_only=True)
     tanks = serializers.SerializerMethodField()
@@ -126,7 +193,7 @@ class TeamSerializer(serializers.ModelSerializer):
     alliance_id = serializers.PrimaryKeyRelatedField(source='alliance', read_only=True)
     alliance_name = serializers.CharField(source='alliance.name', read_only=True)
     alliance_color = serializers.CharField(source='alliance.color', read_only=True)
-    has_bounty = serializers.BooleanField(source='has_active_bounty', read_only=True)
+    has_bounty = serializers.SerializerMethodField()
 
     class Meta:
         model = Team
@@ -137,9 +204,24 @@ class TeamSerializer(serializers.ModelSerializer):
         ]
         depth = 1
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.context.get('manufacturer_ids'):
+            self.fields['manufacturers'] = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
+    @staticmethod
+    def eager_load(queryset, manufacturer_ids=False):
+        return queryset.select_related('alliance').prefetch_related(
+            'manufacturers' if manufacturer_ids else 'manufacturers__tanks',
+            Prefetch('teambox_set', queryset=TeamBox.objects.select_related('box')),
+            Prefetch('teamtank_set', queryset=TeamTankSerializer.eager_load(TeamTank.objects.all())),
+        )
+
     def get_tanks(self, obj):
-        team_tanks = obj.teamtank_set.filter()
-        return TeamTankSerializer(team_tanks, many=True).data
+        return garage_data(obj, self.context)
+
+    def get_has_bounty(self, obj):
+        return obj.id in active_bounty_map(self.context)
 
 
 class TeamMatchSerializer(serializers.ModelSerializer):
@@ -150,6 +232,22 @@ class TeamMatchSerializer(serializers.ModelSerializer):
         model = TeamMatch
         fields = ['team', 'tanks', 'side']
 
+    @staticmethod
+    def eager_load(queryset):
+        return queryset.select_related('team').annotate(
+            highest_non_trad_rank=highest_non_trad_rank('team')
+        ).prefetch_related(
+            Prefetch('tanks', queryset=TeamTankSerializer.eager_load(TeamTank.objects.all())),
+        )
+
+    def to_representation(self, instance):
+        # the annotated rank saves TeamTankSerializer.get_available a query for this team
+        if hasattr(instance, 'highest_non_trad_rank'):
+            self.context.setdefault('highest_non_trad_rank', {}).setdefault(
+                instance.team_id, instance.highest_non_trad_rank
+            )
+        return super().to_representation(instance)
+
     def validate(self, data):
         team = data.get('team')
         tanks_data = data.get('tanks', [])
@@ -192,6 +290,12 @@ class MatchSerializer(serializers.ModelSerializer):
             'is_bounty'
         ]
 
+    @staticmethod
+    def eager_load(queryset):
+        return queryset.prefetch_related(
+            Prefetch('teammatch_set', queryset=TeamMatchSerializer.eager_load(TeamMatch.objects.all())),
+        )
+
     def validate(self, data):
         team_matches_data = data.get('teammatch_set', [])
         match_date = data.get('datetime', timezone.now()).date()
@@ -322,9 +426,12 @@ class SlimTeamSerializer(serializers.ModelSerializer):
         model = Team
         fields = ['name', 'color', 'balance', 'alliance_name', 'bounty_value', 'total_money_earned', 'score']
 
+    @staticmethod
+    def eager_load(queryset):
+        return queryset.select_related('alliance')
+
     def get_bounty_value(self, obj):
-        active_bounty = obj.bounties.filter(is_active=True).first()
-        return active_bounty.value if active_bounty else None
+        return bounty_value(obj, self.context)
 
 class SlimTeamSerializerWithTanks(serializers.ModelSerializer):
     tanks = serializers.SerializerMethodField()
@@ -335,13 +442,17 @@ class SlimTeamSerializerWithTanks(serializers.ModelSerializer):
         model = Team
         fields = ['id', 'name', 'color', 'balance', 'tanks', 'bounty_value']
 
+    @staticmethod
+    def eager_load(queryset):
+        return queryset.prefetch_related(
+            Prefetch('teamtank_set', queryset=TeamTankSerializer.eager_load(TeamTank.objects.all())),
+        )
+
     def get_tanks(self, obj):
-        team_tanks = obj.teamtank_set.filter()
-        return TeamTankSerializer(team_tanks, many=True).data
+        return garage_data(obj, self.context)
 
     def get_bounty_value(self, obj):
-        active_bounty = obj.bounties.filter(is_active=True).first()
-        return active_bounty.value if active_bounty else None
+        return bounty_value(obj, self.context)
 
 class AllianceSerializer(serializers.ModelSerializer):
     teams = SlimTeamSerializer(many=True, read_only=True)
@@ -350,6 +461,10 @@ class AllianceSerializer(serializers.ModelSerializer):
         model = Alliance
         fields = ['id', 'name', 'color', 'teams']
 
+    @staticmethod
+    def eager_load(queryset):
+        return queryset.prefetch_related(Prefetch('teams', queryset=SlimTeamSerializer.eager_load(Team.objects.all())))
+
 
 class SlimTeamMatchSerializer(serializers.ModelSerializer):
     team = SlimTeamSerializer()
@@ -358,6 +473,10 @@ class SlimTeamMatchSerializer(serializers.ModelSerializer):
         model = TeamMatch
         fields = ['team', 'side']
 
+    @staticmethod
+    def eager_load(queryset):
+        return queryset.select_related('team__alliance')
+
 
 class SlimMatchSerializer(serializers.ModelSerializer):
     teammatch_set = SlimTeamMatchSerializer(many=True, read_only=True)
@@ -366,6 +485,12 @@ class SlimMatchSerializer(serializers.ModelSerializer):
         model = Match
         fields = ['id', 'datetime', 'teammatch_set']
 
+    @staticmethod
+    def eager_load(queryset):
+        return queryset.prefetch_related(
+            Prefetch('teammatch_set', queryset=SlimTeamMatchSerializer.eager_load(TeamMatch.objects.all())),
+        )
+
 
 class TeamResultSerializer(serializers.ModelSerializer):
     team_name = serializers.CharField(source='team.name', write_only=True)
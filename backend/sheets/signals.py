@@ -0,0 +1,86 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import Tank, UpgradePath, Team, Manufacturer, Interchange, Match, TeamMatch, MatchResult, TeamResult, \
+    Substitute, TankLost, Booster, Bounty, MatchRewardRates, TankBox, UpgradeTree, InterchangeGroup, Alliance, \
+    TeamTank, TeamBox, TeamLog
+from .quotas import count_team_match
+from .versioning import invalidate
+
+
+@receiver([post_save, post_delete], sender=Tank)
+@receiver([post_save, post_delete], sender=UpgradePath)
+def invalidate_upgrade_graph(sender, **kwargs):
+    invalidate(sender)
+
+
+@receiver([post_save, post_delete], sender=Interchange)
+def invalidate_interchange_index(sender, **kwargs):
+    invalidate(sender)
+
+
+@receiver(m2m_changed, sender=Team.manufacturers.through)
+@receiver(m2m_changed, sender=Tank.manufacturers.through)
+def invalidate_manufacturer_links(sender, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate(sender)
+
+
+@receiver(post_delete, sender=Manufacturer)
+def invalidate_deleted_manufacturer(sender, **kwargs):
+    invalidate(sender, Team.manufacturers.through, Tank.manufacturers.through)
+
+
+# catalog models only the cached reference responses are built from
+@receiver(post_save, sender=Manufacturer)
+@receiver([post_save, post_delete], sender=TankBox)
+@receiver([post_save, post_delete], sender=UpgradeTree)
+@receiver([post_save, post_delete], sender=InterchangeGroup)
+@receiver([post_save, post_delete], sender=Alliance)
+def invalidate_catalog(sender, **kwargs):
+    invalidate(sender)
+
+
+@receiver(m2m_changed, sender=TankBox.tanks.through)
+def invalidate_box_tanks(sender, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate(sender)
+
+
+# garages, boxes and logs only the ETags of team, match and money log responses are built from
+@receiver([post_save, post_delete], sender=TeamTank)
+@receiver([post_save, post_delete], sender=TeamBox)
+@receiver([post_save, post_delete], sender=TeamLog)
+def invalidate_team_holdings(sender, **kwargs):
+    invalidate(sender)
+
+
+@receiver([post_save, post_delete], sender=Match)
+@receiver([post_save, post_delete], sender=TeamMatch)
+@receiver([post_save, post_delete], sender=MatchResult)
+@receiver([post_save, post_delete], sender=TeamResult)
+@receiver([post_save, post_delete], sender=Substitute)
+@receiver([post_save, post_delete], sender=TankLost)
+@receiver([post_save, post_delete], sender=Team)
+@receiver([post_save, post_delete], sender=Booster)
+@receiver([post_save, post_delete], sender=Bounty)
+@receiver([post_save, post_delete], sender=MatchRewardRates)
+def invalidate_reward_inputs(sender, **kwargs):
+    invalidate(sender)
+
+
+@receiver(m2m_changed, sender=TeamMatch.tanks.through)
+def invalidate_match_tanks(sender, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate(sender)
+
+
+@receiver(post_save, sender=TeamMatch)
+def count_weekly_match(sender, instance, created, **kwargs):
+    if created:
+        count_team_match(instance, 1)
+
+
+@receiver(post_delete, sender=TeamMatch)
+def uncount_weekly_match(sender, instance, **kwargs):
+    count_team_match(instance, -1)
@@ -0,0 +1,146 @@
+import json
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.db import transaction
+
+from .versioning import bump_version
+
+MONEY_FIELDS = ('balance', 'score', 'total_money_earned', 'total_money_spent')
+
+_pending_logs = ContextVar('pending_team_logs', default=None)
+
+
+def pack(payload):
+    return zlib.compress(json.dumps(payload, separators=(',', ':')).encode(), 9)
+
+
+def unpack(archive):
+    return json.loads(zlib.decompress(bytes(archive)))
+
+
+def payload_size(*values):
+    """Roughly what JSON values take up in a json/jsonb column, measured as compact JSON text."""
+    return sum(
+        len(value.encode()) if isinstance(value, str) else len(json.dumps(value, separators=(',', ':')))
+        for value in values if value is not None
+    )
+
+
+def tank_lines(description):
+    """The tank names a log description lists as added and removed."""
+    tanks = {'added': [], 'removed': []}
+    for line in description.splitlines():
+        for prefix, key in (('Added Tanks: ', 'added'), ('Removed Tanks: ', 'removed')):
+            if line.startswith(prefix):
+                tanks[key] = [name.strip() for name in line[len(prefix):].split(',') if name.strip()]
+    return tanks
+
+
+def state_changes(previous, new, description='', tank_ids=None):
+    """
+    The compact form of a log that stored the team's state before and after the call: money deltas,
+    kit differences per tier and the ids of the tanks added and removed.
+
+    Tanks are matched by name, so a name ``tank_ids`` does not know is kept as it is.
+    """
+    if isinstance(previous, str):
+        previous = json.loads(previous)
+    if isinstance(new, str):
+        new = json.loads(new)
+    tank_ids = tank_ids or {}
+
+    changes = {
+        field: new[field] - previous[field]
+        for field in MONEY_FIELDS if field in previous and field in new and new[field] != previous[field]
+    }
+
+    new_kits = new.get('upgrade_kits', {})
+    kits = {
+        tier: new_kits.get(tier, {}).get('quantity', 0) - data.get('quantity', 0)
+        for tier, data in previous.get('upgrade_kits', {}).items()
+    }
+    if any(kits.values()):
+        changes['kits'] = {tier: difference for tier, difference in kits.items() if difference}
+
+    if 'tanks' in previous and 'tanks' in new:
+        before, after = Counter(previous['tanks']), Counter(new['tanks'])
+        names = {'added': list((after - before).elements()), 'removed': list((before - after).elements())}
+    else:
+        names = tank_lines(description)
+    tanks = {key: [tank_ids.get(name, name) for name in value] for key, value in names.items() if value}
+    if tanks:
+        changes['tanks'] = tanks
+
+    return changes
+
+
+def archive_logs(before, batch_size=1000):
+    """
+    Compress the payloads of logs written before ``before`` into their archive column, skipping the ones
+    too small to get any smaller. Returns how many rows were archived and their payload sizes before/after.
+    """
+    from .models import TeamLog
+
+    report = {'rows': 0, 'bytes_before': 0, 'bytes_after': 0}
+    ids = list(TeamLog.objects.filter(
+        timestamp__lt=before, previous_value__isnull=False, archive__isnull=True
+    ).order_by('id').values_list('id', flat=True))
+
+    for start in range(0, len(ids), batch_size):
+        archived = []
+        for log in TeamLog.objects.filter(id__in=ids[start:start + batch_size]).only(
+            'id', 'previous_value', 'new_value'
+        ):
+            size = payload_size(log.previous_value, log.new_value)
+            archive = pack([log.previous_value, log.new_value])
+            if len(archive) >= size:
+                continue
+            log.archive = archive
+            log.previous_value = log.new_value = None
+            archived.append(log)
+            report['rows'] += 1
+            report['bytes_before'] += size
+            report['bytes_after'] += len(archive)
+        TeamLog.objects.bulk_update(archived, ['archive', 'previous_value', 'new_value'])
+
+    return report
+
+
+@contextmanager
+def deferred_logs():
+    """Run the block in a transaction and bulk_create the TeamLogs queued inside it once that commits."""
+    parent = _pending_logs.get()
+    pending = []
+    token = _pending_logs.set(pending)
+    try:
+        with transaction.atomic():
+            yield
+            if parent is None and pending:
+                transaction.on_commit(partial(write_logs, pending))
+    finally:
+        _pending_logs.reset(token)
+    if parent is not None:
+        parent.extend(pending)
+
+
+def write_logs(logs):
+    from .models import TeamLog
+
+    TeamLog.objects.bulk_create(logs, batch_size=500)
+    # written from on_commit, after the transaction is over
+    bump_version(TeamLog)
+
+
+def queue_log(**fields):
+    """Write a TeamLog with the surrounding ``deferred_logs`` block, or on its own once the transaction commits."""
+    from .models import TeamLog
+
+    pending = _pending_logs.get()
+    if pending is None:
+        transaction.on_commit(partial(TeamLog.objects.create, **fields))
+    else:
+        pending.append(TeamLog(**fields))
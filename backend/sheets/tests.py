@@ -1,7 +1,33 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
 from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
 
-from .models import Manufacturer, Team, Tank, UpgradePath
+from .models import Manufacturer, Team, Tank, UpgradePath, TeamTank, Interchange, TankBox, Match, TeamMatch, \
+    MatchResult, TankLost, Substitute, TeamLog, Booster, TeamResult, Alliance, WeeklyQuota, StaleTeamError, \
+    LedgerEntry, Bounty, TeamBox, ModelVersion, get_upgrade_tree
+from .graph import get_upgrade_graph
+from .ledger import balance_at, totals_by_reason
+from .teamlogs import archive_logs, state_changes, deferred_logs
+from .pricing import rebalance_prices
+from .quotas import rebuild_weekly_quotas
+from .rewards import calculate_pending_rewards
+from .serializers import UpgradePathSerializer, MatchSerializer, SlimMatchSerializer
+from user.models import User
 
 
 class TankUpgradeTests(TestCase):
@@ -59,4 +85,1126 @@ class TankUpgradeTests(TestCase):
             upgrade_message = self.team1.upgrade_tank_manu(from_tank=self.tank1, to_tank=self.tank4, extra_upgrade_kit_tiers=['T1', 'T1'])
             self.assertEqual(upgrade_message, f"Tank {self.tank1.name} upgraded/downgraded to {self.tank4.name}. Total cost: {80000}. Remaining balance: {250000}")
         except ValidationError as e:
-            self.fail(f"Upgrade failed with error: {e}")
\ No newline at end of file
+            self.fail(f"Upgrade failed with error: {e}")
+
+class UpgradeGraphTests(TestCase):
+
+    def setUp(self):
+        self.manufacturer1 = Manufacturer.objects.create(name='Manufacturer1')
+        self.manufacturer2 = Manufacturer.objects.create(name='Manufacturer2')
+
+        self.team = Team.objects.create(name='Team1', balance=500000)
+        self.team.manufacturers.add(self.manufacturer2)
+
+        self.tank1 = Tank.objects.create(name='M10', battle_rating=3.7, price=170000)
+        self.tank1.manufacturers.add(self.manufacturer1, self.manufacturer2)
+        self.tank2 = Tank.objects.create(name='M4', battle_rating=3.7, price=162000)
+        self.tank2.manufacturers.add(self.manufacturer2)
+        self.tank3 = Tank.objects.create(name='M4A2', battle_rating=4.0, price=192000)
+        self.tank3.manufacturers.add(self.manufacturer1)
+        self.tank4 = Tank.objects.create(name='M4A2 76W', battle_rating=5.0, price=300000)
+        self.tank4.manufacturers.add(self.manufacturer1)
+
+        UpgradePath.objects.create(from_tank=self.tank1, to_tank=self.tank2, required_kit_tier='T1')
+        UpgradePath.objects.create(from_tank=self.tank2, to_tank=self.tank3)
+        UpgradePath.objects.create(from_tank=self.tank3, to_tank=self.tank4)
+
+        self.team_tank = TeamTank.objects.create(team=self.team, tank=self.tank1)
+
+    def upgrades_by_name(self):
+        team_tank = TeamTank.objects.select_related('tank').get(pk=self.team_tank.pk)
+        return {path['to_tank']: path for path in self.team.get_possible_upgrades(team_tank)}
+
+    def test_possible_upgrades(self):
+        upgrades = self.upgrades_by_name()
+
+        self.assertEqual(set(upgrades), {'M4', 'M4A2', 'M4A2 76W'})
+        self.assertEqual(upgrades['M4']['total_cost'], 0)
+        self.assertEqual(upgrades['M4']['manu_cost'], 4000)
+        self.assertTrue(upgrades['M4']['available_in_manufacturer'])
+        self.assertEqual(upgrades['M4A2']['from_tank'], 'M4')
+        self.assertEqual(upgrades['M4A2 76W']['total_cost'], 138000)
+        self.assertEqual(upgrades['M4A2 76W']['required_kits'], {'T1': 1, 'T2': 0, 'T3': 0})
+        self.assertIsNone(upgrades['M4A2 76W']['manu_cost'])
+
+    def test_constant_queries(self):
+        self.upgrades_by_name()
+        team_tank = TeamTank.objects.select_related('tank').get(pk=self.team_tank.pk)
+        with self.assertNumQueries(0):
+            self.team.get_possible_upgrades(team_tank)
+
+    def test_price_change_invalidates_graph(self):
+        self.upgrades_by_name()
+        self.tank4.price = 310000
+        self.tank4.save()
+
+        self.assertEqual(self.upgrades_by_name()['M4A2 76W']['total_cost'], 148000)
+
+    def test_manufacturer_change_refreshes_availability(self):
+        self.assertFalse(self.team.is_native(self.tank3))
+        self.assertIsNone(self.upgrades_by_name()['M4A2']['manu_cost'])
+
+        self.team.manufacturers.add(self.manufacturer1)
+
+        self.assertTrue(self.team.is_native(self.tank3))
+        self.assertEqual(self.upgrades_by_name()['M4A2']['manu_cost'], 22000)
+
+    def test_upgrade_tree_single_query(self):
+        UpgradePath.objects.create(from_tank=self.tank4, to_tank=self.tank1)
+
+        with self.assertNumQueries(1):
+            tree = UpgradePathSerializer(get_upgrade_tree('M4'), many=True).data
+
+        self.assertEqual(
+            [(path['from_tank'], path['to_tank']) for path in tree],
+            [('M10', 'M4'), ('M4', 'M4A2'), ('M4A2', 'M4A2 76W'), ('M4A2 76W', 'M10')]
+        )
+        self.assertEqual(get_upgrade_tree('Missing'), [])
+
+    def test_interchange_index(self):
+        Interchange.objects.create(from_tank=self.tank1, to_tank=self.tank2)
+        Interchange.objects.create(from_tank=self.tank3, to_tank=self.tank4)
+        self.client.get('/api/league/interchanges/', {'tank': 'M10'})
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/league/interchanges/', {'tank': 'M10'})
+        self.assertEqual(response.json(), [{'from_tank': 'M10', 'to_tank': 'M4', 'is_bidirectional': True}])
+
+        link = Interchange.objects.create(from_tank=self.tank2, to_tank=self.tank3)
+        self.assertEqual(len(self.client.get('/api/league/interchanges/', {'tank': 'M10'}).json()), 3)
+
+        link.delete()
+        groups = self.client.get('/api/league/interchanges/labels/', {'edges': 'true'}).json()
+        self.assertEqual([group['tanks'] for group in groups], [['M10', 'M4'], ['M4A2', 'M4A2 76W']])
+
+    def test_upgrade_frontier(self):
+        UpgradePath.objects.create(from_tank=self.tank1, to_tank=self.tank3, required_kit_tier='T2')
+        team_tank = TeamTank.objects.select_related('tank').get(pk=self.team_tank.pk)
+
+        frontier = {target['to_tank']: target for target in self.team.get_upgrade_frontier(team_tank)}
+
+        options = frontier['M4A2']['options']
+        self.assertEqual([option['total_cost'] for option in options], [0, 30000])
+        self.assertEqual(options[0]['required_kits'], {'T1': 0, 'T2': 1, 'T3': 0})
+        self.assertEqual([hop['to_tank'] for hop in options[1]['hops']], ['M4', 'M4A2'])
+
+    def test_garage_upgrades(self):
+        auction_tank = TeamTank.objects.create(team=self.team, tank=self.tank1, from_auctions=True, value=180000)
+        for _ in range(5):
+            TeamTank.objects.create(team=self.team, tank=self.tank1)
+        self.team.get_garage_upgrades()
+
+        with self.assertNumQueries(1):
+            garage = {entry['id']: entry for entry in self.team.get_garage_upgrades()}
+
+        self.assertEqual(len(garage), 7)
+        upgrades = {path['to_tank']: path for path in garage[auction_tank.id]['upgrades']}
+        self.assertEqual(upgrades['M4A2 76W']['total_cost'], 128000)
+        self.assertEqual(upgrades['M4']['manu_cost'], -6000)
+        self.assertEqual(garage[self.team_tank.id]['upgrades'][-1]['total_cost'], 138000)
+
+
+class SharedVersionTests(TransactionTestCase):
+
+    def elsewhere(self, write):
+        # another thread has its own connection and transaction, as another process would
+        def run():
+            try:
+                with transaction.atomic():
+                    write()
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+
+    def test_writes_committed_elsewhere_reach_the_snapshots(self):
+        low = Tank.objects.create(name='M4', price=100000)
+        high = Tank.objects.create(name='M4A2', price=150000)
+        UpgradePath.objects.create(from_tank=low, to_tank=high)
+        self.assertEqual(get_upgrade_graph().direct_upgrades(low.id, lambda tier: 0, set())[0]['manu_cost'], 50000)
+
+        self.elsewhere(lambda: rebalance_prices({'M4A2': 180000}))
+
+        self.assertEqual(get_upgrade_graph().direct_upgrades(low.id, lambda tier: 0, set())[0]['manu_cost'], 80000)
+
+    def test_rebalance_command_reaches_the_server(self):
+        tank = Tank.objects.create(name='M4', price=100000)
+        box = TankBox.objects.create(id=1, name='Shermans', tier=2)
+        box.tanks.add(tank)
+        labels = ['sheets.tank', 'sheets.tankbox']
+        self.assertEqual(self.client.get('/api/league/tanks/').json()[0]['price'], 100000)
+        box_price = self.client.get('/api/league/boxes/').json()[0]['price']
+        before = dict(ModelVersion.objects.filter(label__in=labels).values_list('label', 'version'))
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as sheet:
+            sheet.write('Tank Name,Cost\nM4,120000\n')
+            sheet.flush()
+            call_command('rebalance_prices', sheet.name, stdout=io.StringIO())
+
+        after = dict(ModelVersion.objects.filter(label__in=labels).values_list('label', 'version'))
+        self.assertTrue(all(after[label] != before[label] for label in labels))
+        self.assertEqual(self.client.get('/api/league/tanks/').json()[0]['price'], 120000)
+        self.assertNotEqual(self.client.get('/api/league/boxes/').json()[0]['price'], box_price)
+
+    def test_bounties_assigned_elsewhere_change_the_etag(self):
+        Team.objects.create(name='Team0', total_money_earned=1000)
+        response = self.client.get('/api/league/teams/')
+        self.assertIsNone(response.json()[0]['bounty_value'])
+
+        self.elsewhere(lambda: call_command('assign_bounties', stdout=io.StringIO()))
+
+        fresh = self.client.get('/api/league/teams/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(fresh.status_code, 200)
+        self.assertNotEqual(fresh['ETag'], response['ETag'])
+        self.assertEqual(fresh.json()[0]['bounty_value'], 50000)
+
+
+class PriceRebalanceTests(TestCase):
+
+    def setUp(self):
+        self.tank1 = Tank.objects.create(name='M10', price=170000, rank=2)
+        self.tank2 = Tank.objects.create(name='M4', price=162000, rank=2)
+        self.tank3 = Tank.objects.create(name='M4A2', price=192000, rank=2)
+
+        self.path1 = UpgradePath.objects.create(from_tank=self.tank1, to_tank=self.tank2)
+        self.path2 = UpgradePath.objects.create(from_tank=self.tank2, to_tank=self.tank3)
+
+        self.box = TankBox.objects.create(id=1, name='Shermans', tier=2, is_national=True)
+        self.box.tanks.add(self.tank2, self.tank3)
+        self.box.save()
+
+    def test_rebalance_recomputes_paths_and_boxes(self):
+        with self.assertNumQueries(8):
+            report = rebalance_prices({'M10': 170000, 'M4': 180000, 'M4A2': 192000})
+
+        self.assertEqual(report['tanks_updated'], 1)
+        self.assertEqual(report['upgrade_paths_updated'], 2)
+        self.assertEqual(report['boxes_updated'], 1)
+
+        self.path1.refresh_from_db()
+        self.path2.refresh_from_db()
+        self.box.refresh_from_db()
+        self.assertEqual(self.path1.cost, 10000)
+        self.assertEqual(self.path2.cost, 12000)
+        self.assertEqual(self.box.price, int((180000 + 192000) / 2 * 1.30))
+
+    def test_rebalance_rejects_unknown_tanks(self):
+        with self.assertRaises(ValueError):
+            rebalance_prices({'M4': 1, 'T-34': 2})
+
+        self.tank2.refresh_from_db()
+        self.assertEqual(self.tank2.price, 162000)
+
+    def test_tank_save_recomputes_costs(self):
+        tank = Tank.objects.get(pk=self.tank2.pk)
+        tank.price = 192000
+
+        tank.save()
+
+        self.path2.refresh_from_db()
+        self.box.refresh_from_db()
+        self.assertEqual(self.path2.cost, 7500)
+        self.assertEqual(self.box.price, int(192000 * 1.30))
+
+        # savepoint, update, release: the old price is not read back
+        with self.assertNumQueries(3):
+            tank.save()
+
+
+class MatchRewardTests(TestCase):
+
+    def setUp(self):
+        self.tank = Tank.objects.create(name='M4', price=100000, rank=1, battle_rating=3.7)
+
+    def create_result(self, teams_per_side, mode='traditional', substitutes=0, losses=1, match_id=None):
+        match = Match.objects.create(
+            id=match_id, datetime=datetime(2025, 3, 5, 18, tzinfo=timezone.utc), mode=mode, gamemode='annihilation',
+            best_of_number=3, map_selection='Advance to the Rhine', money_rules='none',
+        )
+        sides = {}
+        for side in ('team_1', 'team_2'):
+            sides[side] = []
+            for i in range(teams_per_side):
+                team = Team.objects.create(name=f'{side}-{i}-{match_id}', balance=100000)
+                TeamMatch.objects.create(match=match, team=team, side=side)
+                sides[side].append(team)
+        judge = Team.objects.create(name=f'Judge-{match_id}', balance=0)
+        result = MatchResult.objects.create(match=match, winning_side='team_1', judge=judge, round_score='2:0')
+        for i in range(substitutes):
+            Substitute.objects.create(
+                match_result=result, team=Team.objects.create(name=f'Sub{i}'), activity=2,
+                team_played_for=sides['team_1'][0],
+            )
+        for i in range(losses):
+            TankLost.objects.create(match_result=result, team=sides['team_2'][i % teams_per_side], tank=self.tank,
+                                    quantity=1)
+        return result, sides, judge
+
+    def test_traditional_rewards(self):
+        result, sides, judge = self.create_result(1)
+
+        summary = result.calculate_rewards('judge')
+
+        winner = Team.objects.get(pk=sides['team_1'][0].pk)
+        loser = Team.objects.get(pk=sides['team_2'][0].pk)
+        self.assertEqual((winner.balance, winner.score), (100000 + 15000 + 14, 14))
+        self.assertEqual((loser.balance, loser.score), (100000 + 12000 + 3, 6))
+        self.assertEqual(Team.objects.get(pk=judge.pk).balance, 5000)
+        self.assertEqual(summary['winning_teams']['team_1-0-None']['new_balance'], winner.balance)
+        self.assertEqual(summary['judge']['reward'], 5000)
+        self.assertTrue(MatchResult.objects.get(pk=result.pk).is_calced)
+        self.assertEqual(
+            sorted(TeamLog.objects.values_list('method_name', flat=True)),
+            ['calc_rewards', 'calc_rewards', 'judge_rewards'],
+        )
+
+    def test_query_count_is_flat(self):
+        def count_queries(result):
+            result = MatchResult.objects.get(pk=result.pk)
+            with CaptureQueriesContext(connection) as queries:
+                result.calculate_rewards('judge')
+            return len(queries)
+
+        small, _, _ = self.create_result(1, mode='advanced')
+        TeamLog.objects.all().delete()
+        Team.objects.all().update(name='old')
+        large, _, _ = self.create_result(3, mode='advanced', substitutes=3, losses=12)
+
+        self.assertEqual(count_queries(small), count_queries(large))
+
+    def test_preview_writes_nothing(self):
+        result, sides, judge = self.create_result(2, mode='advanced', substitutes=1, losses=4)
+        balances = dict(Team.objects.values_list('id', 'balance'))
+
+        preview = result.preview_rewards()
+
+        self.assertEqual(dict(Team.objects.values_list('id', 'balance')), balances)
+        self.assertFalse(TeamLog.objects.exists())
+        self.assertFalse(MatchResult.objects.get(pk=result.pk).is_calced)
+        # a cached preview only reads the version stamps
+        with self.assertNumQueries(1):
+            self.assertEqual(result.preview_rewards(), preview)
+
+        heavy = Tank.objects.create(name='Maus', price=500000, rank=5, battle_rating=8.7)
+        TankLost.objects.create(match_result=result, team=sides['team_1'][0], tank=heavy, quantity=1)
+        changed = result.preview_rewards()
+        self.assertNotEqual(changed, preview)
+
+        self.assertEqual(MatchResult.objects.get(pk=result.pk).calculate_rewards('judge'), changed)
+
+    def test_revert_only_touches_its_match(self):
+        first, first_sides, _ = self.create_result(1, match_id=1)
+        other, other_sides, _ = self.create_result(1, match_id=12)
+        Booster.objects.create(name='x2', multiplier=2, team=first_sides['team_1'][0], match_limited=True,
+                               matches_left=3)
+        balances = dict(Team.objects.values_list('id', 'balance'))
+
+        first.calculate_rewards('judge')
+        other.calculate_rewards('judge')
+        self.assertEqual(TeamLog.objects.filter(match_id=1).count(), 3)
+        self.assertEqual(Booster.objects.get().matches_left, 2)
+        other_balances = dict(Team.objects.filter(judged_matches__match_id=12).values_list('id', 'balance'))
+
+        MatchResult.objects.get(pk=first.pk).revert_rewards()
+
+        for team in first_sides['team_1'] + first_sides['team_2']:
+            self.assertEqual(Team.objects.get(pk=team.pk).balance, balances[team.pk])
+        self.assertEqual(Booster.objects.get().matches_left, 3)
+        self.assertEqual(dict(Team.objects.filter(judged_matches__match_id=12).values_list('id', 'balance')),
+                         other_balances)
+        self.assertEqual(TeamLog.objects.filter(match_id=12, method_name='revert_rewards').count(), 0)
+
+        MatchResult.objects.get(pk=first.pk).calculate_rewards('judge')
+        self.assertFalse(TeamLog.objects.filter(match_id=1, method_name='revert_rewards').exists())
+        self.assertEqual(TeamLog.objects.filter(match_id=12).count(), 3)
+
+    def test_ledger_follows_calc_and_revert(self):
+        result, sides, judge = self.create_result(2, substitutes=1)
+
+        result.calculate_rewards('judge')
+        MatchResult.objects.get(pk=result.pk).revert_rewards()
+        MatchResult.objects.get(pk=result.pk).calculate_rewards('judge')
+
+        for team in Team.objects.all():
+            entries = team.ledger_entries.aggregate(amount=Sum('amount'), score=Sum('score'))
+            self.assertEqual((entries['amount'], entries['score']), (team.balance, team.score))
+            last = team.ledger_entries.order_by('-id').first()
+            self.assertEqual((last.balance_after, last.score_after), (team.balance, team.score))
+        self.assertEqual(
+            LedgerEntry.objects.filter(match_id=result.match_id, reason=LedgerEntry.REWARD_REVERT).count(), 6
+        )
+        totals = totals_by_reason(judge)
+        self.assertEqual(totals[LedgerEntry.JUDGE_REWARD]['amount'], 10000)
+        self.assertEqual(totals[LedgerEntry.REWARD_REVERT]['amount'], -5000)
+
+    def test_pending_batch_matches_sequential_calcs(self):
+        first, first_sides, _ = self.create_result(1, match_id=1)
+        second, _, _ = self.create_result(2, mode='advanced', substitutes=1, losses=3, match_id=2)
+        shared = first_sides['team_1'][0]
+        TeamMatch.objects.create(match=second.match, team=shared, side='team_1')
+        TeamResult.objects.create(match_result=second, team=shared, bonuses=1)
+        Booster.objects.create(name='x2', multiplier=2, team=shared, match_limited=True, matches_left=1)
+
+        def state():
+            return (
+                sorted(Team.objects.values_list('name', 'balance', 'score', 'total_money_earned')),
+                sorted(TeamLog.objects.values_list('team__name', 'match_id', 'reward_delta')),
+                list(Booster.objects.values_list('matches_left', flat=True)),
+            )
+
+        class Rollback(Exception):
+            pass
+
+        try:
+            with transaction.atomic():
+                for result in (first, second):
+                    MatchResult.objects.get(pk=result.pk).calculate_rewards('judge')
+                sequential = state()
+                raise Rollback
+        except Rollback:
+            pass
+
+        report = calculate_pending_rewards('judge')
+
+        self.assertEqual(report['calculated'], 2)
+        self.assertEqual([result['match_id'] for result in report['results']], [1, 2])
+        self.assertEqual(state(), sequential)
+        self.assertFalse(MatchResult.objects.filter(is_calced=False).exists())
+
+    def test_pending_batch_query_count_is_flat(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                calculate_pending_rewards('judge')
+            return len(queries)
+
+        self.create_result(1, mode='advanced', match_id=1)
+        single = count_queries()
+        for match_id in (2, 3, 4):
+            self.create_result(2, mode='advanced', substitutes=1, losses=3, match_id=match_id)
+
+        self.assertEqual(count_queries(), single)
+
+    def test_pending_batch_retries_after_a_stale_team(self):
+        _, sides, _ = self.create_result(1, match_id=1)
+        write_changes = Team.write_changes
+
+        def stale_once(changes):
+            if patched.call_count == 1:
+                raise StaleTeamError('Team')
+            return write_changes(changes)
+
+        with mock.patch.object(Team, 'write_changes', side_effect=stale_once) as patched:
+            report = calculate_pending_rewards('judge')
+
+        self.assertEqual(patched.call_count, 2)
+        self.assertEqual((report['calculated'], report['failed']), (1, 0))
+        self.assertFalse(MatchResult.objects.filter(is_calced=False).exists())
+        self.assertGreater(Team.objects.get(pk=sides['team_1'][0].pk).balance, 100000)
+
+    def test_pending_batch_reports_a_failed_write(self):
+        self.create_result(1, match_id=1)
+        admin = User.objects.create(username='admin')
+        admin.user_permissions.add(Permission.objects.get(codename='admin_permissions'))
+        client = APIClient()
+        client.force_authenticate(admin)
+
+        with mock.patch.object(Team, 'write_changes', side_effect=StaleTeamError('Team')):
+            response = client.post('/api/league/matches/calc/pending/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['calculated'], response.data['failed']), (0, 1))
+        self.assertEqual(response.data['results'][0]['match_id'], 1)
+        self.assertTrue(response.data['results'][0]['error'].startswith('StaleTeamError'))
+        self.assertFalse(MatchResult.objects.filter(is_calced=True).exists())
+        self.assertFalse(TeamLog.objects.exists())
+
+
+class WeeklyQuotaTests(TestCase):
+
+    def setUp(self):
+        alliance = Alliance.objects.create(name='Axis')
+        self.team = Team.objects.create(name='Alpha', balance=100000, alliance=alliance)
+        self.other = Team.objects.create(name='Bravo', balance=100000, alliance=alliance)
+        self.team.upgrade_kits['T1']['quantity'] = 5
+        self.team.save()
+
+    def create_match(self, day, **kwargs):
+        match = Match.objects.create(
+            datetime=datetime(2025, 3, day, 18, tzinfo=timezone.utc), mode='traditional', gamemode='annihilation',
+            best_of_number=3, map_selection='Advance to the Rhine', money_rules='none', **kwargs
+        )
+        TeamMatch.objects.create(match=match, team=self.team, side='team_1')
+        TeamMatch.objects.create(match=match, team=self.other, side='team_2')
+        return match
+
+    def test_match_counters_follow_edits(self):
+        monday, next_monday = datetime(2025, 3, 3).date(), datetime(2025, 3, 10).date()
+        match = self.create_match(5)
+        self.create_match(7, was_played=True)
+
+        self.assertEqual(self.team.matches_for_week(monday), 2)
+        self.assertEqual(self.team.trad_dom_matches_for_week(monday), 1)
+
+        match = Match.objects.get(pk=match.pk)
+        match.was_played = True
+        match.save()
+        self.assertEqual(self.team.trad_dom_matches_for_week(monday), 2)
+
+        match.datetime = datetime(2025, 3, 11, 18, tzinfo=timezone.utc)
+        match.save()
+        self.assertEqual(
+            [self.other.matches_for_week(monday), self.other.trad_dom_matches_for_week(monday)], [1, 1]
+        )
+        self.assertEqual(self.other.trad_dom_matches_for_week(next_monday), 1)
+
+        match.delete()
+        self.assertEqual(self.team.matches_for_week(next_monday), 0)
+
+        counters = sorted(WeeklyQuota.objects.filter(count__gt=0).values_list('team_id', 'week', 'kind', 'count'))
+        rebuild_weekly_quotas()
+        self.assertEqual(sorted(WeeklyQuota.objects.values_list('team_id', 'week', 'kind', 'count')), counters)
+
+    def test_transfer_limits(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.team.transfer_alliance_kit(self.other, 2, 'commander')
+            with self.assertRaises(ValidationError):
+                self.team.transfer_alliance_kit(self.other, 1, 'commander')
+        self.assertEqual(Team.objects.get(pk=self.team.pk).upgrade_kits['T1']['quantity'], 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.team.money_transfer(self.team, self.other, 10000, 'commander')
+            with self.assertRaises(ValueError):
+                self.team.money_transfer(self.team, self.other, 10000, 'commander')
+        self.assertEqual(Team.objects.get(pk=self.team.pk).balance, 90000)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.team.trad_dom_matches_for_week(now()), 0)
+
+        counters = sorted(WeeklyQuota.objects.values_list('kind', 'count'))
+        rebuild_weekly_quotas()
+        self.assertEqual(sorted(WeeklyQuota.objects.values_list('kind', 'count')), counters)
+
+
+class BalanceUpdateTests(TestCase):
+
+    def setUp(self):
+        manufacturer = Manufacturer.objects.create(name='Manufacturer1')
+        self.team = Team.objects.create(name='Team1', balance=100000)
+        self.team.manufacturers.add(manufacturer)
+        self.tank = Tank.objects.create(name='M4', battle_rating=3.7, price=40000)
+        self.tank.manufacturers.add(manufacturer)
+
+    def test_stale_instances_do_not_lose_updates(self):
+        first, second = Team.objects.get(pk=self.team.pk), Team.objects.get(pk=self.team.pk)
+
+        first.purchase_tank(self.tank, user='commander')
+        second.purchase_tank(self.tank, user='commander')
+        first.sell_teamtank(first.teamtank_set.first(), user='commander')
+
+        team = Team.objects.get(pk=self.team.pk)
+        self.assertEqual(team.balance, 100000 - 2 * 40000 + 24000)
+        self.assertEqual(team.total_money_spent, 80000)
+        self.assertEqual(first.balance, team.balance)
+
+    def test_debit_never_overdraws(self):
+        first, second = Team.objects.get(pk=self.team.pk), Team.objects.get(pk=self.team.pk)
+        self.tank.price = 60000
+        self.tank.save()
+
+        first.purchase_tank(self.tank, user='commander')
+        with self.assertRaises(ValidationError):
+            second.purchase_tank(self.tank, user='commander')
+
+        self.assertEqual(Team.objects.get(pk=self.team.pk).balance, 40000)
+        self.assertEqual(TeamTank.objects.count(), 1)
+
+    def test_stale_kit_write_is_rejected(self):
+        Team.objects.filter(pk=self.team.pk).update(
+            upgrade_kits={'T1': {'quantity': 4, 'price': 25000}, 'T2': {'quantity': 0, 'price': 50000},
+                          'T3': {'quantity': 0, 'price': 100000}}
+        )
+        first, second = Team.objects.get(pk=self.team.pk), Team.objects.get(pk=self.team.pk)
+
+        second.purchase_tank(self.tank, user='commander')
+        first.split_merge_kit('merge', 'T1', 1)
+        with self.assertRaises(StaleTeamError):
+            second.split_merge_kit('merge', 'T1', 1)
+
+        team = Team.objects.get(pk=self.team.pk)
+        self.assertEqual((team.upgrade_kits['T1']['quantity'], team.upgrade_kits['T2']['quantity']), (2, 1))
+        self.assertEqual(team.balance, 60000)
+
+    def test_refused_kit_exchange_is_reported(self):
+        team = Team.objects.get(pk=self.team.pk)
+        team.upgrade_kits['T1']['quantity'] = 2
+        Team.objects.filter(pk=self.team.pk).delete()
+
+        with self.assertRaises(ValidationError):
+            team.split_merge_kit('merge', 'T1', 1)
+
+    def test_plain_save_keeps_concurrent_adjustments(self):
+        stale, first = Team.objects.get(pk=self.team.pk), Team.objects.get(pk=self.team.pk)
+        first.adjust(LedgerEntry.KIT_GRANT, balance=5000, kits={'T1': 2})
+
+        stale.color = '#ffffff'
+        stale.save()
+
+        team = Team.objects.get(pk=self.team.pk)
+        self.assertEqual((team.color, team.balance, team.upgrade_kits['T1']['quantity']), ('#ffffff', 105000, 2))
+        self.assertEqual(team.version, first.version + 1)
+        self.assertEqual((stale.version, stale.upgrade_kits), (team.version, team.upgrade_kits))
+        with self.assertRaises(StaleTeamError):
+            first.adjust(LedgerEntry.KIT_EXCHANGE, kits={'T1': -1})
+        self.assertFalse(team.ledger_entries.filter(reason=LedgerEntry.ADJUSTMENT).exists())
+
+    def test_stale_save_of_kits_is_rejected(self):
+        stale = Team.objects.get(pk=self.team.pk)
+        Team.objects.get(pk=self.team.pk).adjust(LedgerEntry.KIT_GRANT, kits={'T1': 2})
+
+        stale.upgrade_kits['T2']['quantity'] = 1
+        with self.assertRaises(StaleTeamError):
+            stale.save()
+
+        self.assertEqual(Team.objects.get(pk=self.team.pk).upgrade_kits['T2']['quantity'], 0)
+
+
+class LedgerTests(TestCase):
+
+    def setUp(self):
+        manufacturer = Manufacturer.objects.create(name='Manufacturer1')
+        self.team = Team.objects.create(name='Team1', balance=100000)
+        self.team.manufacturers.add(manufacturer)
+        self.other = Team.objects.create(name='Team2', balance=5000)
+        self.tank = Tank.objects.create(name='M4', battle_rating=3.7, price=40000)
+        self.tank.manufacturers.add(manufacturer)
+
+    def test_entries_follow_balance(self):
+        self.team.purchase_tank(self.tank, user='commander')
+        self.team.sell_teamtank(self.team.teamtank_set.first(), user='commander')
+        self.team.money_transfer(self.team, self.other, 20000, user='commander')
+        self.team.balance += 1000
+        self.team.save()
+
+        self.assertEqual(
+            list(self.team.ledger_entries.order_by('id').values_list('reason', 'amount', 'balance_after')),
+            [(LedgerEntry.OPENING, 100000, 100000), (LedgerEntry.TANK_PURCHASE, -40000, 60000),
+             (LedgerEntry.TANK_SALE, 24000, 84000), (LedgerEntry.TRANSFER_OUT, -20000, 64000),
+             (LedgerEntry.ADJUSTMENT, 1000, 65000)],
+        )
+        self.assertEqual(self.team.ledger_entries.filter(tank=self.tank).count(), 2)
+        self.assertEqual(
+            list(self.other.ledger_entries.order_by('id').values_list('reason', 'amount', 'balance_after')),
+            [(LedgerEntry.OPENING, 5000, 5000), (LedgerEntry.TRANSFER_IN, 18000, 23000)],
+        )
+
+    def test_balance_at_and_totals(self):
+        self.team.purchase_tank(self.tank, user='commander')
+        self.team.purchase_tank(self.tank, user='commander')
+        first, second = self.team.ledger_entries.filter(reason=LedgerEntry.TANK_PURCHASE).order_by('id')
+        LedgerEntry.objects.filter(pk=first.pk).update(timestamp=datetime(2025, 3, 3, tzinfo=timezone.utc))
+        LedgerEntry.objects.filter(pk=second.pk).update(timestamp=datetime(2025, 3, 10, tzinfo=timezone.utc))
+        LedgerEntry.objects.filter(reason=LedgerEntry.OPENING).update(
+            timestamp=datetime(2025, 3, 1, tzinfo=timezone.utc)
+        )
+
+        self.assertEqual(balance_at(self.team, datetime(2025, 2, 1, tzinfo=timezone.utc)), 0)
+        self.assertEqual(balance_at(self.team, datetime(2025, 3, 5, tzinfo=timezone.utc)), 60000)
+        self.assertEqual(balance_at(self.team, now()), 20000)
+        self.assertEqual(
+            totals_by_reason(self.team, end=datetime(2025, 3, 5, tzinfo=timezone.utc)),
+            {LedgerEntry.OPENING: {'amount': 100000, 'score': 0},
+             LedgerEntry.TANK_PURCHASE: {'amount': -40000, 'score': 0}},
+        )
+
+
+class TeamChangeLogTests(TestCase):
+
+    def setUp(self):
+        manufacturer = Manufacturer.objects.create(name='Manufacturer1')
+        self.team = Team.objects.create(name='Team1', balance=100000)
+        self.team.manufacturers.add(manufacturer)
+        self.tank = Tank.objects.create(name='M4', battle_rating=3.7, price=40000)
+        self.tank.manufacturers.add(manufacturer)
+
+    def test_log_holds_only_touched_fields(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.team.purchase_tank(self.tank, user='commander')
+            self.team.add_upgrade_kit('T2', 2, user='commander')
+
+        purchase, kits = TeamLog.objects.order_by('id')
+        self.assertEqual(
+            purchase.description,
+            "Changes made by method: purchase_tank\nAdded Tanks: M4\nBalance Changed by: -40000\n"
+            "Total_money_spent Changed by: 40000",
+        )
+        self.assertEqual(
+            purchase.changes, {'balance': -40000, 'total_money_spent': 40000, 'tanks': {'added': [self.tank.pk]}}
+        )
+        self.assertIsNone(purchase.previous_value)
+        self.assertEqual(kits.description, "Changes made by method: add_upgrade_kit\n+2 T2 kit")
+        self.assertEqual(kits.changes, {'kits': {'T2': 2}})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.team.sell_teamtank(self.team.teamtank_set.get(), user='commander')
+        self.assertEqual(
+            TeamLog.objects.latest('id').description,
+            "Changes made by method: sell_teamtank\nRemoved Tanks: M4\nBalance Changed by: 24000",
+        )
+
+    def test_reverse_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.team.add_upgrade_kit('T1', 3, user='commander')
+            self.team.purchase_tank(self.tank, user='commander')
+
+        # money moved by another holder of the row survives the reversal
+        Team.objects.get(pk=self.team.pk).adjust(LedgerEntry.TRANSFER_IN, balance=5000)
+
+        for log in TeamLog.objects.order_by('-id'):
+            self.team.reverse_change(log)
+
+        team = Team.objects.get(pk=self.team.pk)
+        self.assertEqual((team.balance, team.total_money_spent, team.upgrade_kits['T1']['quantity']), (105000, 0, 0))
+        self.assertFalse(team.teamtank_set.exists())
+        self.assertEqual(
+            list(team.ledger_entries.filter(reason=LedgerEntry.CHANGE_REVERT).order_by('id').values_list('amount', 'kits')),
+            [(40000, {}), (0, {'T1': -3})],
+        )
+        self.assertFalse(team.ledger_entries.filter(reason=LedgerEntry.ADJUSTMENT).exists())
+
+    def test_bulk_sale_writes_logs_once_on_commit(self):
+        TeamTank.objects.bulk_create([TeamTank(team=self.team, tank=self.tank) for _ in range(5)])
+        admin = User.objects.create(username='admin')
+        admin.user_permissions.add(Permission.objects.get(codename='admin_permissions'))
+        client = APIClient()
+        client.force_authenticate(admin)
+
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/league/transactions/sell_tanks/', {
+                'team': self.team.name, 'tanks': [{'name': 'M4', 'quantity': 5}],
+            }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sum('INSERT INTO "sheets_teamlog"' in query['sql'] for query in queries), 1)
+        self.assertEqual(TeamLog.objects.filter(method_name='sell_teamtank').count(), 5)
+
+    def test_rolled_back_logs_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValidationError):
+                with deferred_logs():
+                    self.team.purchase_tank(self.tank, user='commander')
+                    self.team.purchase_tank(self.tank, user='commander')
+                    self.team.purchase_tank(self.tank, user='commander')
+
+            team = Team.objects.get(pk=self.team.pk)
+            with deferred_logs():
+                team.purchase_tank(self.tank, user='commander')
+                try:
+                    with deferred_logs():
+                        team.add_upgrade_kit('T1', 1, user='commander')
+                        raise ValueError
+                except ValueError:
+                    pass
+
+        self.assertEqual(list(TeamLog.objects.values_list('method_name', flat=True)), ['purchase_tank'])
+        self.assertEqual(Team.objects.get(pk=self.team.pk).balance, 60000)
+
+    def test_legacy_payloads_compact_and_archive(self):
+        previous = {'balance': 100000, 'tanks': ['M4'], 'manufacturers': ['Manufacturer1'],
+                    'upgrade_kits': {'T1': {'quantity': 1, 'price': 25000}}}
+        new = dict(previous, balance=60000, tanks=['M4', 'M4', 'Tiger'], upgrade_kits={'T1': {'quantity': 0}})
+        self.assertEqual(
+            state_changes(json.dumps(previous), json.dumps(new), tank_ids={'M4': self.tank.pk}),
+            {'balance': -40000, 'kits': {'T1': -1}, 'tanks': {'added': [self.tank.pk, 'Tiger']}},
+        )
+
+        log = TeamLog.objects.create(
+            team=self.team, field_name='balance', previous_value=previous, new_value=new, description='',
+            method_name='money_transfer_out',
+        )
+        TeamLog.objects.filter(pk=log.pk).update(timestamp=datetime(2025, 1, 1, tzinfo=timezone.utc))
+
+        report = archive_logs(datetime(2025, 2, 1, tzinfo=timezone.utc))
+
+        log = TeamLog.objects.get(pk=log.pk)
+        self.assertEqual(report['rows'], 1)
+        self.assertLess(report['bytes_after'], report['bytes_before'])
+        self.assertIsNone(log.previous_value)
+        self.assertEqual(log.payload(), (previous, new))
+        self.assertEqual(archive_logs(datetime(2025, 2, 1, tzinfo=timezone.utc))['rows'], 0)
+
+    def test_query_count_does_not_grow_with_garage(self):
+        self.tank.price = 100
+        self.tank.save()
+        other = Tank.objects.create(name='T-34', battle_rating=3.7, price=100)
+        other.manufacturers.set(self.tank.manufacturers.all())
+
+        def purchase_queries():
+            team = Team.objects.get(pk=self.team.pk)
+            with CaptureQueriesContext(connection) as queries:
+                team.purchase_tank(other, user='commander')
+            return len(queries)
+
+        purchase_queries()  # warms the manufacturer index
+        small = purchase_queries()
+        TeamTank.objects.bulk_create([TeamTank(team=self.team, tank=self.tank) for _ in range(40)])
+        self.assertEqual(purchase_queries(), small)
+
+
+class MoneyLogTests(TestCase):
+
+    def setUp(self):
+        self.teams = [Team.objects.create(name=f'Team{i}', balance=1000) for i in range(3)]
+        logs = [
+            TeamLog(team=team, field_name='balance', previous_value={}, new_value={}, description=f'{team.name} {i}',
+                    method_name='purchase_tank' if i % 2 else 'calc_rewards')
+            for team in self.teams for i in range(30)
+        ]
+        TeamLog.objects.bulk_create(logs)
+        # one shared timestamp per pair, so the id tie-breaker is exercised too
+        for log in TeamLog.objects.all():
+            TeamLog.objects.filter(pk=log.pk).update(
+                timestamp=datetime(2025, 3, 1, tzinfo=timezone.utc) + timedelta(hours=log.pk // 2)
+            )
+
+    def test_latest_per_team_applies_filters_first(self):
+        response = self.client.get('/api/league/transactions/money_log/', {
+            'per_team': 5, 'method_name': 'purchase_tank',
+        })
+
+        results = response.json()['results']
+        self.assertEqual(len(results), 15)
+        for team in self.teams:
+            expected = list(TeamLog.objects.filter(team=team, method_name='purchase_tank').order_by(
+                '-timestamp', '-id'
+            ).values_list('id', flat=True)[:5])
+            self.assertEqual([log['id'] for log in results if log['team'] == team.pk], expected)
+
+    def test_cursor_pages_walk_a_team_once(self):
+        team = self.teams[1]
+        seen = []
+        url, params = '/api/league/transactions/money_log/', {'team': team.pk, 'page_size': 7}
+        while url:
+            page = self.client.get(url, params).json()
+            seen.extend(log['id'] for log in page['results'])
+            url, params = page['next'], None
+
+        self.assertEqual(
+            seen, list(TeamLog.objects.filter(team=team).order_by('-timestamp', '-id').values_list('id', flat=True))
+        )
+
+    def test_query_count_is_flat(self):
+        # the first request also stores the version stamps
+        self.client.get('/api/league/transactions/money_log/')
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/league/transactions/money_log/', {'per_team': 5})
+        with CaptureQueriesContext(connection) as large:
+            self.client.get('/api/league/transactions/money_log/', {'per_team': 25})
+        self.assertEqual(len(small), len(large))
+
+        TeamLog.objects.bulk_create([
+            TeamLog(team=Team.objects.create(name=f'Extra{i}'), field_name='balance', description='extra')
+            for i in range(5)
+        ])
+        with CaptureQueriesContext(connection) as more_teams:
+            response = self.client.get('/api/league/transactions/money_log/', {'per_team': 5})
+        self.assertEqual(len(more_teams), len(small))
+        self.assertEqual(len(response.json()['results']), 3 * 5 + 5)
+
+
+class GarageSerializerTests(TestCase):
+
+    def add_teams(self, count):
+        tanks = [Tank.objects.create(name=f'Tank{Tank.objects.count()}', rank=rank) for rank in (1, 2, 3, 4)]
+        for i in range(count):
+            team = Team.objects.create(name=f'Team{Team.objects.count()}', balance=1000)
+            TeamTank.objects.create(team=team, tank=tanks[i % 2])
+            TeamTank.objects.create(team=team, tank=tanks[3], is_trad=True)
+            TeamTank.objects.create(team=team, tank=tanks[2])
+            Bounty.objects.create(team=team, value=100 * i)
+
+    def test_available_follows_highest_non_trad_rank(self):
+        self.add_teams(2)
+
+        teams = {team['name']: team for team in self.client.get('/api/league/teams/tanks/').json()}
+        for team in Team.objects.all():
+            highest = max(team_tank.tank.rank for team_tank in team.teamtank_set.filter(is_trad=False))
+            self.assertEqual(
+                {tank['id']: tank['available'] for tank in teams[team.name]['tanks']},
+                {team_tank.id: team_tank.tank.rank <= highest + 1 for team_tank in team.teamtank_set.all()},
+            )
+            self.assertEqual(teams[team.name]['bounty_value'], team.bounties.get().value)
+        self.assertEqual(self.client.get('/api/league/teams/Team0/').json()['tanks'], teams['Team0']['tanks'])
+
+    def test_query_count_is_flat(self):
+        self.add_teams(2)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/league/teams/tanks/')
+        self.add_teams(10)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get('/api/league/teams/tanks/')
+        self.assertEqual(len(small), len(large))
+
+
+class FlatQueriesMixin:
+    """Checks a GET costs the same number of queries after ``add_rows`` has added more rows."""
+
+    def assertQueriesFlat(self, url, expected, **params):
+        self.add_rows(2)
+        with self.assertNumQueries(expected):
+            self.client.get(url, params)
+        self.add_rows(6)
+        with self.assertNumQueries(expected):
+            return self.client.get(url, params).json()
+
+
+class MatchListQueryTests(FlatQueriesMixin, TestCase):
+
+    def add_rows(self, count):
+        tanks = [Tank.objects.create(name=f'Tank{Tank.objects.count()}', rank=rank) for rank in (1, 2, 4)]
+        for i in range(count):
+            match = Match.objects.create(
+                datetime=datetime(2025, 3, 5, 18, tzinfo=timezone.utc), mode='traditional', gamemode='annihilation',
+                best_of_number=3, map_selection='Advance to the Rhine', money_rules='none',
+            )
+            for side in ('team_1', 'team_2'):
+                team = Team.objects.create(name=f'Team{Team.objects.count()}', balance=1000)
+                Bounty.objects.create(team=team, value=100 * i, is_active=side == 'team_1')
+                team_match = TeamMatch.objects.create(match=match, team=team, side=side)
+                team_match.tanks.add(
+                    TeamTank.objects.create(team=team, tank=tanks[i % 2]),
+                    TeamTank.objects.create(team=team, tank=tanks[2], is_trad=True),
+                )
+
+    def test_detailed_matches(self):
+        data = self.assertQueriesFlat('/api/league/matches/detailed/', 3)
+        self.assertEqual(data, MatchSerializer(Match.objects.filter(was_played=False), many=True).data)
+
+    def test_filtered_matches(self):
+        data = self.assertQueriesFlat('/api/league/matches/filtered/', 4)
+        self.assertEqual(data['results'], MatchSerializer(Match.objects.all(), many=True).data)
+
+    def test_slim_matches(self):
+        data = self.assertQueriesFlat('/api/league/matches/', 3)
+        self.assertEqual(data, SlimMatchSerializer(Match.objects.filter(was_played=False), many=True).data)
+        second = sorted(data, key=lambda match: match['id'])[1]
+        self.assertEqual([team_match['team']['bounty_value'] for team_match in second['teammatch_set']], [100, None])
+
+
+class TeamSerializationTests(FlatQueriesMixin, TestCase):
+
+    def add_rows(self, count):
+        alliance = Alliance.objects.create(name=f'Alliance{Alliance.objects.count()}')
+        box = TankBox.objects.create(id=TankBox.objects.count() + 1, name=f'Box{TankBox.objects.count()}', tier=1)
+        for i in range(count):
+            manufacturer = Manufacturer.objects.create(name=f'Manufacturer{Manufacturer.objects.count()}')
+            for rank in (1, 2, 3):
+                manufacturer.tanks.add(Tank.objects.create(name=f'Tank{Tank.objects.count()}', rank=rank))
+            team = Team.objects.create(name=f'Team{Team.objects.count()}', balance=1000, alliance=alliance)
+            team.manufacturers.add(manufacturer)
+            TeamTank.objects.create(team=team, tank=manufacturer.tanks.first())
+            TeamBox.objects.create(team=team, box=box)
+            Bounty.objects.create(team=team, value=50 * i, is_active=bool(i % 2))
+
+    def test_team_detail(self):
+        self.assertQueriesFlat('/api/league/teams/Team1/', 6)
+        data = self.assertQueriesFlat('/api/league/teams/Team1/', 5, manufacturers='ids')
+
+        team = Team.objects.get(name='Team1')
+        self.assertEqual(data['manufacturers'], [team.manufacturers.get().id])
+        self.assertEqual(data['tank_boxes'][0]['box_name'], 'Box0')
+        self.assertEqual(data['alliance_name'], 'Alliance0')
+        self.assertTrue(data['has_bounty'])
+        nested = self.client.get('/api/league/teams/Team1/').content
+        self.assertLess(len(self.client.get('/api/league/teams/Team1/?manufacturers=ids').content), len(nested))
+
+    def test_team_and_alliance_lists(self):
+        teams = self.assertQueriesFlat('/api/league/teams/', 2)
+        self.assertEqual([team['bounty_value'] for team in teams[:4]], [None, 50, None, 50])
+        self.assertEqual(teams[0]['alliance_name'], 'Alliance0')
+
+        alliances = self.assertQueriesFlat('/api/league/alliances/', 3)
+        self.assertEqual(sum(len(alliance['teams']) for alliance in alliances), Team.objects.count())
+        self.assertEqual(self.assertQueriesFlat('/api/league/teams/tanks/', 3)[1]['bounty_value'], 50)
+
+
+class GroupedGarageTests(TestCase):
+
+    def setUp(self):
+        self.tanks = [Tank.objects.create(name=f'Tank{rank}', rank=rank, price=1000 * rank) for rank in (1, 2, 4)]
+        self.teams = [Team.objects.create(name=f'Team{i}', balance=1000) for i in range(2)]
+        for team in self.teams:
+            TeamTank.objects.bulk_create(
+                [TeamTank(team=team, tank=self.tanks[0], value=1000) for _ in range(Team.MAX_PER_TANK)]
+            )
+            TeamTank.objects.create(team=team, tank=self.tanks[1], from_auctions=True)
+            TeamTank.objects.create(team=team, tank=self.tanks[2], is_trad=True, is_upgradable=False, value=500)
+
+    def test_grouped_garage_holds_the_flat_one(self):
+        flat = self.client.get('/api/league/teams/Team0/').json()
+        response = self.client.get('/api/league/teams/Team0/', {'garage': 'grouped'})
+        grouped = response.json()
+
+        rows = []
+        for tank_id, group in grouped['tanks'].items():
+            self.assertEqual(group['count'], len(group['ids']))
+            tank = grouped['tank_catalog'][tank_id]
+            for team_tank_id in group['ids']:
+                rows.append({
+                    'id': team_tank_id, 'tank': tank, 'team': flat['id'], 'available': group['available'],
+                    'is_trad': team_tank_id in group.get('trad', []),
+                    'from_auctions': team_tank_id in group.get('from_auctions', []),
+                    'value': group.get('values', {}).get(str(team_tank_id), tank['price']),
+                })
+        self.assertEqual(sorted(rows, key=lambda row: row['id']), sorted(flat['tanks'], key=lambda row: row['id']))
+        trad_group = grouped['tanks'][str(self.tanks[2].id)]
+        self.assertEqual(trad_group['not_upgradable'], trad_group['ids'])
+        self.assertLess(len(response.content) * 4, len(self.client.get('/api/league/teams/Team0/').content))
+
+    def test_teams_with_tanks_share_one_catalog(self):
+        response = self.client.get('/api/league/teams/tanks/', {'garage': 'grouped'}).json()
+
+        self.assertEqual(set(response['tank_catalog']), {str(tank.id) for tank in self.tanks})
+        self.assertEqual([team['name'] for team in response['teams']], ['Team0', 'Team1'])
+        self.assertEqual(response['teams'][1]['tanks'][str(self.tanks[0].id)]['count'], Team.MAX_PER_TANK)
+        self.assertFalse(response['teams'][1]['tanks'][str(self.tanks[2].id)]['available'])
+
+
+class CachedResponseTests(TestCase):
+
+    def setUp(self):
+        # rolled back rows do not bump versions, so bodies cached by other tests would still look current
+        cache.clear()
+        self.tank = Tank.objects.create(name='M4', rank=1, price=1000)
+
+    def test_hits_skip_the_database(self):
+        first = self.client.get('/api/league/tanks/')
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get('/api/league/tanks/')
+        # nothing but the version stamps is read
+        self.assertTrue(all('sheets_modelversion' in query['sql'] for query in queries))
+
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second.json()[0]['name'], 'M4')
+
+    def test_writes_invalidate(self):
+        box = TankBox.objects.create(id=1, name='Shermans', tier=2)
+        manufacturer = Manufacturer.objects.create(name='Detroit')
+        alliance = Alliance.objects.create(name='Allies')
+        for url in ('/api/league/boxes/', '/api/league/manufacturers/', '/api/league/alliances/'):
+            self.client.get(url)
+
+        box.tanks.add(self.tank)
+        manufacturer.tanks.add(self.tank)
+        Team.objects.create(name='Team0', alliance=alliance)
+
+        self.assertEqual(self.client.get('/api/league/boxes/').json()[0]['tanks'][0]['name'], 'M4')
+        self.assertEqual(self.client.get('/api/league/manufacturers/').json()[0]['tanks'][0]['name'], 'M4')
+        self.assertEqual(self.client.get('/api/league/alliances/').json()[0]['teams'][0]['name'], 'Team0')
+
+    def test_query_string_is_part_of_the_key(self):
+        team = Team.objects.create(name='Team0')
+        Manufacturer.objects.create(name='Detroit').teams.add(team)
+        Manufacturer.objects.create(name='Coventry')
+
+        self.assertEqual(len(self.client.get('/api/league/manufacturers/').json()), 2)
+        self.assertEqual(len(self.client.get('/api/league/manufacturers/', {'team_name': 'Team0'}).json()), 1)
+        self.assertEqual(self.client.get('/api/league/manufacturers/', {'team_name': 'Nobody'}).status_code, 404)
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        manufacturer = Manufacturer.objects.create(name='Detroit')
+        self.team = Team.objects.create(name='Team0', balance=1000)
+        self.team.manufacturers.add(manufacturer)
+        self.tank = Tank.objects.create(name='M4', rank=1, price=1000)
+        self.tank.manufacturers.add(manufacturer)
+
+    def revalidate(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            not_modified = self.client.get(url, params, HTTP_IF_NONE_MATCH=response['ETag'])
+        # nothing but the version stamps is read
+        self.assertTrue(all('sheets_modelversion' in query['sql'] for query in queries))
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        return response['ETag']
+
+    def test_unchanged_resources_answer_304_without_building(self):
+        for url in ('/api/league/teams/', '/api/league/teams/tanks/', '/api/league/teams/Team0/',
+                    '/api/league/matches/', '/api/league/matches/detailed/', '/api/league/matches/filtered/',
+                    '/api/league/transactions/money_log/', '/api/league/tanks/', '/api/league/alliances/'):
+            self.revalidate(url)
+
+    def test_writes_change_the_tag(self):
+        team_tag = self.revalidate('/api/league/teams/Team0/')
+        log_tag = self.revalidate('/api/league/transactions/money_log/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.team.purchase_tank(self.tank, user='commander')
+
+        self.assertNotEqual(self.revalidate('/api/league/teams/Team0/'), team_tag)
+        self.assertNotEqual(self.revalidate('/api/league/transactions/money_log/'), log_tag)
+        stale = self.client.get('/api/league/teams/Team0/', HTTP_IF_NONE_MATCH=team_tag)
+        self.assertEqual(stale.json()['tanks'][0]['tank']['name'], 'M4')
+
+    def test_tag_follows_the_query_string(self):
+        self.assertNotEqual(
+            self.revalidate('/api/league/teams/Team0/'),
+            self.revalidate('/api/league/teams/Team0/', garage='grouped'),
+        )
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create(username='admin')
+        self.admin.user_permissions.add(Permission.objects.get(codename='admin_permissions'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+        tank = Tank.objects.create(name='M4', price=100000)
+        self.teams = [Team.objects.create(name=f'Team{i}', balance=1000) for i in range(2)]
+        for i in range(3):
+            match = Match.objects.create(
+                datetime=datetime(2025, 3, 5 + i, 18, tzinfo=timezone.utc), mode='traditional',
+                gamemode='annihilation', best_of_number=3, map_selection='Advance to the Rhine', money_rules='none',
+            )
+            TeamMatch.objects.create(match=match, team=self.teams[0], side='team_1')
+            TeamMatch.objects.create(match=match, team=self.teams[1], side='team_2')
+            if i:
+                result = MatchResult.objects.create(match=match, winning_side='team_1', round_score='2:1')
+                TankLost.objects.create(match_result=result, team=self.teams[1], tank=tank, quantity=i)
+        TeamLog.objects.bulk_create([
+            TeamLog(team=self.teams[i % 2], field_name='balance', previous_value={'balance': i},
+                    new_value={'balance': i + 1}, description=f'Log {i}', method_name='money_transfer_in')
+            for i in range(5)
+        ])
+
+    def content(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_team_log_csv(self):
+        response = self.client.get('/api/league/transactions/money_log/export/')
+
+        rows = list(csv.DictReader(io.StringIO(self.content(response))))
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual([row['description'] for row in rows], [f'Log {i}' for i in range(5)])
+        self.assertEqual(json.loads(rows[2]['new_value']), {'balance': 3})
+
+    def test_match_ndjson(self):
+        response = self.client.get('/api/league/matches/export/', {'output': 'ndjson', 'from_date': '2025-03-06'})
+
+        matches = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual(len(matches), 2)
+        self.assertEqual(matches[0]['team_1'], ['Team0'])
+        self.assertEqual(matches[1]['tanks_lost'], [{'team': 'Team1', 'tank': 'M4', 'quantity': 2}])
+
+    def test_requires_admin(self):
+        self.client.force_authenticate(User.objects.create(username='someone'))
+        self.assertEqual(self.client.get('/api/league/matches/export/').status_code, 403)
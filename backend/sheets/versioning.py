@@ -0,0 +1,112 @@
+import secrets
+import threading
+
+from django.db import connection, transaction
+
+_local = threading.local()
+
+
+def _label(model):
+    if isinstance(model, str):
+        return model.lower()
+    return model._meta.label_lower
+
+
+def _new_version():
+    # random rather than counted up, so no value seen before (or inside a rolled back transaction) comes back
+    return secrets.randbits(62)
+
+
+def _pending_versions():
+    """Versions bumped inside this thread's open transaction, which no other process can see yet."""
+    pending = getattr(_local, 'versions', None)
+    if pending is None or not connection.in_atomic_block:
+        # whatever an earlier transaction bumped has been committed to the table or rolled back with it
+        pending = _local.versions = {}
+    return pending
+
+
+def bump_version(*models):
+    """Invalidate everything derived from the given models, in every process, right away."""
+    from .models import ModelVersion
+
+    labels = sorted({_label(model) for model in models})
+    version = _new_version()
+    if ModelVersion.objects.filter(label__in=labels).update(version=version) < len(labels):
+        ModelVersion.objects.bulk_create(
+            [ModelVersion(label=label, version=version) for label in labels], ignore_conflicts=True
+        )
+
+
+def invalidate(*models):
+    """
+    Invalidate everything derived from the given models once the current transaction commits. Saves and
+    deletes reach this through the receivers in signals.py; queryset updates and bulk writes send no signals,
+    so code making them calls it itself.
+
+    Until then only this thread sees the change, as a throwaway version, so anything it rebuilds from its
+    uncommitted rows is never taken for current. The stored versions are written after the commit, so a
+    transaction holds no lock on them however many models it touches.
+    """
+    if not connection.in_atomic_block:
+        bump_version(*models)
+        return
+
+    pending = _pending_versions()
+    labels = [_label(model) for model in models]
+    for label in labels:
+        pending[label] = _new_version()
+
+    def committed():
+        bump_version(*labels)
+        for label in labels:
+            pending.pop(label, None)
+
+    transaction.on_commit(committed)
+
+
+def get_versions(*models):
+    from .models import ModelVersion
+
+    labels = [_label(model) for model in models]
+    pending = _pending_versions()
+    stored_labels = {label for label in labels if label not in pending}
+    stored = {}
+    if stored_labels:
+        stored = dict(ModelVersion.objects.filter(label__in=stored_labels).values_list('label', 'version'))
+        missing = stored_labels - set(stored)
+        if missing:
+            # a model nothing has bumped yet gets a fresh value, so nothing built against an earlier
+            # table (a restored database, a rolled back test) can be mistaken as current
+            ModelVersion.objects.bulk_create(
+                [ModelVersion(label=label, version=_new_version()) for label in missing], ignore_conflicts=True
+            )
+            stored.update(ModelVersion.objects.filter(label__in=missing).values_list('label', 'version'))
+    return tuple(pending[label] if label in pending else stored[label] for label in labels)
+
+
+class VersionedSnapshot:
+    """
+    Process-wide read-only value rebuilt whenever one of the models it depends on changes.
+    """
+
+    def __init__(self, models, builder):
+        self.models = tuple(models)
+        self.builder = builder
+        self._lock = threading.Lock()
+        self._version = None
+        self._value = None
+
+    def get(self):
+        version = get_versions(*self.models)
+        if self._value is not None and self._version == version:
+            return self._value
+
+        with self._lock:
+            if self._value is None or self._version != version:
+                self._value = self.builder()
+                self._version = version
+            return self._value
+
+    def invalidate(self):
+        bump_version(*self.models)
@@ -1,6 +1,8 @@
 import copy
 
 from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 from django.shortcuts import render, get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
@@ -10,23 +12,34 @@ from rest_framework.views import APIView
 from rest_framework.generics import ListAPIView
 from django.contrib.auth.mixins import PermissionRequiredMixin
 import requests
-from django.db.models import F, Window
-from django.db.models.functions import RowNumber
 
-from .discord import format_match_message, format_match_result_message, format_match_calc_message, send_transaction_log
+from .discord import format_match_message, format_match_result_message, send_transaction_log, \
+    send_calc_notification, queue_calc_notifications
 from .filters import TeamLogFilter, MatchFilter
+from .exports import TEAM_LOG_FIELDS, MATCH_FIELDS, team_log_rows, match_rows, stream_rows
+from .graph import get_interchange_index
+from .caching import CachedResponseMixin, ConditionalGetMixin
+from .pagination import TeamLogCursorPagination
+from .teamlogs import deferred_logs
+from .pricing import rebalance_prices
+from .rewards import calculate_pending_rewards
 from .models import Team, Manufacturer, Tank, Match, MatchResult, TankBox, TeamMatch, TeamLog, ImportTank, \
-    ImportCriteria, TeamBox, TeamTank, UpgradePath, get_upgrade_tree, UpgradeTree, InterchangeGroup, \
-    get_interchange_graph, Interchange, Alliance
+    ImportCriteria, TeamBox, TeamTank, UpgradePath, get_upgrade_tree, UpgradeTree, InterchangeGroup, Alliance, \
+    Interchange, Bounty
 from .serializers import TeamSerializer, ManufacturerSerializer, TankSerializer, MatchSerializer, SlimMatchSerializer, \
     MatchResultSerializer, TankBoxSerializer, TankBoxCreateSerializer, SlimTeamSerializer, TeamMatchSerializer, \
     TeamLogSerializer, SlimTeamSerializerWithTanks, ImportTankSerializer, ImportCriteriaSerializer, \
-    UpgradePathSerializer, UpgradeTreeSerializer, InterchangeGroupSerializer, InterchangeSerializer, AllianceSerializer
+    UpgradePathSerializer, UpgradeTreeSerializer, InterchangeGroupSerializer, AllianceSerializer
+
+# what MatchSerializer output is built from
+MATCH_MODELS = (Match, TeamMatch, TeamMatch.tanks.through, TeamTank, Tank, Team)
+
 
+class AllTeamsView(ConditionalGetMixin, APIView):
+    cache_models = (Team, Alliance, Bounty)
 
-class AllTeamsView(APIView):
     def get(self, request):
-        teams = Team.objects.all()
+        teams = SlimTeamSerializer.eager_load(Team.objects.all())
         serializer = SlimTeamSerializer(teams, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -39,17 +52,38 @@ class AllTeamsView(APIView):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
-class AllTeamsWithTanksView(APIView):
+class AllTeamsWithTanksView(ConditionalGetMixin, APIView):
+    cache_models = (Team, TeamTank, Tank, Bounty)
+
     def get(self, request):
-        teams = Team.objects.all()
-        serializer = SlimTeamSerializerWithTanks(teams, many=True)
+        # ?garage=grouped groups each garage by tank id and sends the tanks once, as tank_catalog
+        grouped = request.query_params.get('garage') == 'grouped'
+        teams = SlimTeamSerializerWithTanks.eager_load(Team.objects.all())
+        serializer = SlimTeamSerializerWithTanks(teams, many=True, context={'grouped_garage': grouped})
+        if grouped:
+            data = serializer.data
+            return Response({'tank_catalog': serializer.context.get('tank_catalog', {}), 'teams': data},
+                            status=status.HTTP_200_OK)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class TeamDetailView(APIView):
+class TeamDetailView(ConditionalGetMixin, APIView):
+    cache_models = (
+        Team, TeamTank, Tank, TeamBox, TankBox, Manufacturer, Team.manufacturers.through,
+        Tank.manufacturers.through, Alliance, Bounty,
+    )
+
     def get(self, request, name):
-        team = Team.objects.get(name=name)
-        serializer = TeamSerializer(team)
+        # ?manufacturers=ids lists manufacturer ids instead of every manufacturer's tank catalog,
+        # ?garage=grouped groups the garage by tank id and sends the tanks once, as tank_catalog
+        manufacturer_ids = request.query_params.get('manufacturers') == 'ids'
+        grouped = request.query_params.get('garage') == 'grouped'
+        team = TeamSerializer.eager_load(Team.objects.all(), manufacturer_ids).get(name=name)
+        serializer = TeamSerializer(team, context={'manufacturer_ids': manufacturer_ids, 'grouped_garage': grouped})
+        if grouped:
+            data = serializer.data
+            return Response({**data, 'tank_catalog': serializer.context.get('tank_catalog', {})},
+                            status=status.HTTP_200_OK)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def patch(self, request, name):
@@ -73,7 +107,9 @@ class TeamDetailView(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class AllTanksView(APIView):
+class AllTanksView(CachedResponseMixin, APIView):
+    cache_models = (Tank,)
+
     def get(self, request):
         tanks = Tank.objects.all()
         serializer = TankSerializer(tanks, many=True)
@@ -114,6 +150,20 @@ class TankDetailView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class TankRebalanceView(APIView):
+    def post(self, request):
+        if not request.user.has_perm('user.admin_permissions'):
+            return Response(status=status.HTTP_403_FORBIDDEN)
+        prices = request.data.get('prices')
+        if not isinstance(prices, dict) or not prices:
+            return Response({'error': 'prices must map tank names to their new price'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            report = rebalance_prices(prices)
+        except (ValueError, TypeError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_200_OK)
+
+
 class PurchaseTankView(APIView):
     def post(self, request):
         user = request.user
@@ -131,10 +181,11 @@ class PurchaseTankView(APIView):
             initial_balance = team.balance
 
             purchased_names = []
-            for tank_name in tanks:
-                tank = Tank.objects.get(name=tank_name)
-                team.purchase_tank(tank, user=request.user)
-                purchased_names.append(tank.name)
+            with deferred_logs():
+                for tank_name in tanks:
+                    tank = Tank.objects.get(name=tank_name)
+                    team.purchase_tank(tank, user=request.user)
+                    purchased_names.append(tank.name)
 
             team.refresh_from_db()
             cost = initial_balance - team.balance
@@ -172,10 +223,11 @@ class SellTankView(APIView):
             initial_balance = team.balance
             sold_names = []
 
-            for tank_id in tanks:
-                t = TeamTank.objects.get(pk=tank_id)
-                sold_names.append(t.tank.name)
-                team.sell_teamtank(t, user=request.user)
+            with deferred_logs():
+                for tank_id in tanks:
+                    t = TeamTank.objects.get(pk=tank_id)
+                    sold_names.append(t.tank.name)
+                    team.sell_teamtank(t, user=request.user)
 
             # Calculate gain and log
             team.refresh_from_db()
@@ -213,11 +265,12 @@ class SellTanksView(APIView):
             initial_balance = team.balance
             sold_summary = []
 
-            for tank in tanks:
-                for i in range(tank['quantity']):
-                    tanka = Tank.objects.get(name=tank['name'])
-                    team.sell_tank(tanka, user=request.user)
-                sold_summary.append(f"{tank['quantity']}x {tank['name']}")
+            with deferred_logs():
+                for tank in tanks:
+                    for i in range(tank['quantity']):
+                        tanka = Tank.objects.get(name=tank['name'])
+                        team.sell_tank(tanka, user=request.user)
+                    sold_summary.append(f"{tank['quantity']}x {tank['name']}")
 
             team.refresh_from_db()
             gain = team.balance - initial_balance
@@ -329,14 +382,20 @@ class AllUpgradesView(APIView):
         team_name = request.headers['team']
         tank = request.headers['tank']
         team = Team.objects.get(name=team_name)
-        tank = TeamTank.objects.get(pk=tank)
+        tank = TeamTank.objects.select_related('tank').get(pk=tank)
 
-        all_upgrades = team.get_possible_upgrades(tank)
+        if request.query_params.get('pareto', '').lower() == 'true':
+            all_upgrades = team.get_upgrade_frontier(tank)
+        else:
+            all_upgrades = team.get_possible_upgrades(tank)
 
         return Response(all_upgrades, status=status.HTTP_200_OK)
 
 
-class UpgradeTreeView(APIView):
+class UpgradeTreeView(CachedResponseMixin, APIView):
+    cache_models = (Tank, UpgradePath)
+    cache_headers = ('tank',)
+
     def get(self, request):
         tank = request.headers['tank']
         all_upgrades = get_upgrade_tree(start_tank_name=tank)
@@ -356,6 +415,16 @@ class AllDirectUpgradesView(APIView):
         return Response(all_upgrades, status=status.HTTP_200_OK)
 
 
+class GarageUpgradesView(APIView):
+    def get(self, request):
+        team_name = request.headers.get('team') or request.query_params.get('team')
+        team = get_object_or_404(Team, name=team_name)
+
+        garage_upgrades = team.get_garage_upgrades()
+
+        return Response(garage_upgrades, status=status.HTTP_200_OK)
+
+
 class DirectUpgradeTankView(APIView):
     def post(self, request):
         user = request.user
@@ -581,7 +650,14 @@ class ManufacturerDetailView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class ManufacturerListView(APIView):
+class ManufacturerListView(CachedResponseMixin, APIView):
+    cache_models = (Manufacturer, Tank, Tank.manufacturers.through)
+
+    def get_cache_models(self, request):
+        if request.query_params.get('team_name'):
+            return self.cache_models + (Team, Team.manufacturers.through)
+        return self.cache_models
+
     def get(self, request):
         team_name = request.query_params.get('team_name', None)
 
@@ -603,7 +679,9 @@ class ManufacturerListView(APIView):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
-class TankBoxView(APIView):
+class TankBoxView(CachedResponseMixin, APIView):
+    cache_models = (TankBox, TankBox.tanks.through, Tank)
+
     def get(self, request):
         box = TankBox.objects.all()
         serializer = TankBoxSerializer(box, many=True)
@@ -619,16 +697,20 @@ class TankBoxView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class AllMatchesViewSlim(APIView):
+class AllMatchesViewSlim(ConditionalGetMixin, APIView):
+    cache_models = (Match, TeamMatch, Team, Alliance, Bounty)
+
     def get(self, request):
-        matches = Match.objects.filter(was_played=False)
+        matches = SlimMatchSerializer.eager_load(Match.objects.filter(was_played=False))
         serializer = SlimMatchSerializer(matches, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class AllMatchesView(APIView):
+class AllMatchesView(ConditionalGetMixin, APIView):
+    cache_models = MATCH_MODELS
+
     def get(self, request):
-        matches = Match.objects.filter(was_played=False)
+        matches = MatchSerializer.eager_load(Match.objects.filter(was_played=False))
         serializer = MatchSerializer(matches, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -671,9 +753,11 @@ class AllMatchesView(APIView):
             print(f"Error sending Discord webhook: {e}")
 
 
-class ArchivedAllMatchesView(APIView):
+class ArchivedAllMatchesView(ConditionalGetMixin, APIView):
+    cache_models = MATCH_MODELS
+
     def get(self, request):
-        matches = Match.objects.all()
+        matches = MatchSerializer.eager_load(Match.objects.all())
         serializer = MatchSerializer(matches, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -684,16 +768,19 @@ class ArchivedAllMatchesView(APIView):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
-class MatchFilteredView(ListAPIView):
-    queryset = Match.objects.all()
+class MatchFilteredView(ConditionalGetMixin, ListAPIView):
+    cache_models = MATCH_MODELS + (MatchResult,)
+    queryset = MatchSerializer.eager_load(Match.objects.all())
     serializer_class = MatchSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = MatchFilter
 
 
-class MatchView(APIView):
+class MatchView(ConditionalGetMixin, APIView):
+    cache_models = MATCH_MODELS
+
     def get(self, request, pk):
-        match = Match.objects.get(pk=pk)
+        match = MatchSerializer.eager_load(Match.objects.all()).get(pk=pk)
         serializer = MatchSerializer(match)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -864,48 +951,33 @@ class CalcTestView(APIView):
         if not match_result.is_calced:
             rewards = match_result.calculate_rewards(request.user)
             try:
-                if match_result.match.webhook_id_calc:
-                    self.edit_discord_notification(match_result.match, rewards)
-                else:
-                    self.send_discord_notification(match_result.match, rewards)
+                send_calc_notification(match_result.match, rewards)
             except Exception as e:
                 pass
             return Response(status=status.HTTP_200_OK)
         else:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-    def send_discord_notification(self, match, rewards):
-        webhook_url = settings.DISCORD_WEBHOOK_URL_CALC + '?wait=true'
-        if not webhook_url:
-            return
-
-        message = format_match_calc_message(match, rewards)
 
-        try:
-            response = requests.post(webhook_url, json={"content": message})
-            response_data = response.json()
-            match.webhook_id_calc = response_data.get("id")
-            match.channel_id_calc = response_data.get("channel_id")
-            match.save()
-
-        except Exception as e:
-            print(f"Error sending Discord webhook: {e}")
-
-
-    def edit_discord_notification(self, match, rewards):
-        webhook_url = settings.DISCORD_WEBHOOK_URL_CALC
-        if not webhook_url or not match.webhook_id_calc:
-            return
+class CalcPendingView(APIView):
+    def post(self, request):
+        if not request.user.has_perm('user.admin_permissions'):
+            return Response(status=status.HTTP_403_FORBIDDEN)
+        report = calculate_pending_rewards(request.user)
+        queue_calc_notifications(report.pop('notifications'))
+        return Response(report, status=status.HTTP_200_OK)
 
-        message_url = f"{webhook_url}/messages/{match.webhook_id_calc}"
-        message = format_match_calc_message(match, rewards)
 
-        try:
-            response = requests.patch(message_url, json={"content": message})
-            if response.status_code not in [200, 204]:
-                print(f"Error editing Discord webhook: {response.status_code} - {response.text}")
-        except Exception as e:
-            print(f"Error editing Discord webhook: {e}")
+class CalcPreviewView(APIView):
+    def get(self, request, pk):
+        user = request.user
+        if not any([user.has_perm('user.admin_permissions'), user.has_perm('user.judge_permissions'), user.has_perm('user.commander_permissions')]):
+            return Response(status=status.HTTP_403_FORBIDDEN)
+        match_result = get_object_or_404(MatchResult, match__pk=pk)
+        rewards = match_result.preview_rewards()
+        if rewards is None:
+            return Response({'no_show': True}, status=status.HTTP_200_OK)
+        return Response(rewards, status=status.HTTP_200_OK)
 
 
 class CalcRevertView(APIView):
@@ -920,20 +992,50 @@ class CalcRevertView(APIView):
         else:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-class TeamLogFilteredView(ListAPIView):
-    queryset = TeamLog.objects.all()
+class TeamLogFilteredView(ConditionalGetMixin, ListAPIView):
+    """With ``team`` or ``cursor``, one team's log in keyset pages; without, every team's latest entries at once."""
+    cache_models = (TeamLog, Team)
+    queryset = TeamLog.objects.select_related('team')
     serializer_class = TeamLogSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = TeamLogFilter
+    pagination_class = TeamLogCursorPagination
 
-    def get_queryset(self):
-        return TeamLog.objects.annotate(
-            row_number=Window(
-                expression=RowNumber(),
-                partition_by=[F('team')],
-                order_by=F('timestamp').desc()
-            )
-        ).filter(row_number__lte=100)
+    def list(self, request, *args, **kwargs):
+        if 'team' in request.query_params or 'cursor' in request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        try:
+            per_team = int(request.query_params.get('per_team', self.paginator.page_size))
+        except ValueError:
+            return Response({'error': 'per_team must be a number.'}, status=status.HTTP_400_BAD_REQUEST)
+        per_team = min(max(per_team, 1), self.paginator.max_page_size)
+
+        ordering = self.paginator.ordering
+        logs = self.filter_queryset(self.get_queryset()).annotate(
+            team_rank=Window(RowNumber(), partition_by=F('team_id'), order_by=ordering)
+        ).filter(team_rank__lte=per_team).order_by('team_id', *ordering)
+        return Response({'next': None, 'previous': None, 'results': self.get_serializer(logs, many=True).data})
+
+
+class TeamLogExportView(APIView):
+    def get(self, request):
+        if not request.user.has_perm('user.admin_permissions'):
+            return Response(status=status.HTTP_403_FORBIDDEN)
+        logs = TeamLogFilter(request.query_params, queryset=TeamLog.objects.all())
+        if not logs.is_valid():
+            return Response(logs.errors, status=status.HTTP_400_BAD_REQUEST)
+        return stream_rows(team_log_rows(logs.qs), TEAM_LOG_FIELDS, request.query_params.get('output'), 'team_logs')
+
+
+class MatchExportView(APIView):
+    def get(self, request):
+        if not request.user.has_perm('user.admin_permissions'):
+            return Response(status=status.HTTP_403_FORBIDDEN)
+        matches = MatchFilter(request.query_params, queryset=Match.objects.all())
+        if not matches.is_valid():
+            return Response(matches.errors, status=status.HTTP_400_BAD_REQUEST)
+        return stream_rows(match_rows(matches.qs), MATCH_FIELDS, request.query_params.get('output'), 'matches')
 
 
 class ActiveImportCriteriaView(APIView):
@@ -1006,35 +1108,51 @@ class PurchaseImportTankView(APIView):
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class UpgradeTreeListView(APIView):
+class UpgradeTreeListView(CachedResponseMixin, APIView):
+    cache_models = (UpgradeTree, Tank)
+
     def get(self, request):
         trees = UpgradeTree.objects.all()
         serializer = UpgradeTreeSerializer(trees, many=True)
         return Response(serializer.data)
 
 
-class InterchangeListView(APIView):
+class InterchangeListView(CachedResponseMixin, APIView):
+    cache_models = (InterchangeGroup, Interchange, Tank)
+
     def get(self, request):
-        groups = InterchangeGroup.objects.all()
+        groups = InterchangeGroup.objects.select_related('root_tank')
         serializer = InterchangeGroupSerializer(groups, many=True)
-        return Response(serializer.data)
+
+        if request.query_params.get('edges', '').lower() != 'true':
+            return Response(serializer.data)
+
+        index = get_interchange_index()
+        labels = {index.component(group['value']): group for group in serializer.data}
+        all_groups = []
+        for group in index.groups():
+            label = labels.get(group['component'], {})
+            all_groups.append({'label': label.get('label'), 'value': label.get('value'), **group})
+        return Response(all_groups)
 
 
 class InterchangeDetailView(APIView):
     def get(self, request):
-        tank_name = request.headers.get('tank')
+        tank_name = request.query_params.get('tank') or request.headers.get('tank')
 
+        index = get_interchange_index()
         if tank_name:
-            graph_edges = get_interchange_graph(start_tank_name=tank_name)
+            graph_edges = index.component_edges(tank_name)
         else:
-            graph_edges = Interchange.objects.all()
+            graph_edges = index.edge_list
+
+        return Response(graph_edges, status=status.HTTP_200_OK)
 
-        serializer = InterchangeSerializer(graph_edges, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
 
+class AllianceListView(CachedResponseMixin, APIView):
+    cache_models = (Alliance, Team, Bounty)
 
-class AllianceListView(APIView):
     def get(self, request):
-        alliances = Alliance.objects.all()
+        alliances = AllianceSerializer.eager_load(Alliance.objects.all())
         serializer = AllianceSerializer(alliances, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file